@@ -1,201 +1,377 @@
-from flask import Flask, request, jsonify, render_template_string
-import psycopg2
-from psycopg2.extras import RealDictCursor
+from flask import Flask, Response, request, jsonify, render_template_string
+from werkzeug.datastructures import MultiDict
+from psycopg2.extras import RealDictCursor, execute_values
 import json
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import os
+import base64
+import importlib.util
+import threading
+import requests
+from db import ConnectionPool
+import dashboard_rollup
+import data_export
+import price_rollup
+import data_version
+import metrics
+import product_ingest
+from response_cache import ResponseCache
+from change_feed import ChangeFeed
+from job_queue import JobQueue, QueueFull
 
 app = Flask(__name__)
 
-# Database connection
-def get_db_connection():
-    return psycopg2.connect(
-        host="localhost",
-        database="product_research",
-        user="postgres",
-        password="postgres",  # Replace with your PostgreSQL password
-        cursor_factory=RealDictCursor
-    )
+# Pooled database connections (settings in db.DB_SETTINGS)
+db_pool = ConnectionPool(
+    name='api_server',
+    maxconn=int(os.environ.get('API_DB_POOL_SIZE', 10)),
+    cursor_factory=RealDictCursor
+)
+
+# Request latency per route, SQL timing and pool counters on /metrics
+metrics.instrument_app(app, 'api_server')
+metrics.register_pool(db_pool)
+
+def get_data_version():
+    with db_pool.cursor() as cursor:
+        return data_version.current_version(cursor)
+
+# Serialized dashboard responses, reused until the data version changes
+# (see data_version.py) or the TTL runs out
+response_cache = ResponseCache(
+    version_source=get_data_version,
+    ttl=float(os.environ.get('API_RESPONSE_CACHE_TTL', 30))
+)
 
 @app.route('/')
 def dashboard():
     with open('dashboard.html', 'r') as f:
         return f.read()
 
+def build_dashboard_stats():
+    # Aggregates are maintained by triggers (see dashboard_rollup.py)
+    with db_pool.cursor() as cursor:
+        totals, price_trend, category_data = dashboard_rollup.read_stats(cursor)
+    
+    total_products = totals['total_products']
+    total_reviews = totals['total_reviews']
+    avg_rating = totals['rating_sum'] / totals['rating_count'] if totals['rating_count'] else 0
+    
+    sentiment_data = {
+        'positive': totals['positive_reviews'],
+        'neutral': totals['neutral_reviews'],
+        'negative': totals['negative_reviews'],
+        'total': totals['labeled_reviews']
+    }
+    
+    positive_percentage = 0
+    if sentiment_data['total'] > 0:
+        positive_percentage = (sentiment_data['positive'] / sentiment_data['total']) * 100
+    
+    return {
+        'totalProducts': total_products,
+        'totalReviews': total_reviews,
+        'avgRating': float(avg_rating),
+        'positiveSentiment': positive_percentage,
+        'sentimentData': {
+            'positive': sentiment_data['positive'],
+            'neutral': sentiment_data['neutral'],
+            'negative': sentiment_data['negative']
+        },
+        'priceData': {
+            'labels': [item['month'].strftime('%b') for item in price_trend],
+            'values': [float(item['avg_price']) if item['avg_price'] else 0 for item in price_trend]
+        },
+        'categoryData': {
+            'labels': [item['category'] for item in category_data],
+            'values': [item['count'] for item in category_data]
+        }
+    }
+
 @app.route('/api/dashboard/stats')
+@response_cache.cached()
 def get_dashboard_stats():
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Get basic stats
-        cursor.execute("SELECT COUNT(*) as total_products FROM products")
-        total_products = cursor.fetchone()['total_products']
-        
-        cursor.execute("SELECT COUNT(*) as total_reviews FROM reviews")
-        total_reviews = cursor.fetchone()['total_reviews']
-        
-        cursor.execute("SELECT AVG(rating) as avg_rating FROM reviews WHERE rating IS NOT NULL")
-        avg_rating = cursor.fetchone()['avg_rating'] or 0
-        
-        # Sentiment analysis
-        cursor.execute("""
-            SELECT 
-                COUNT(CASE WHEN sentiment_label = 'positive' THEN 1 END) as positive,
-                COUNT(CASE WHEN sentiment_label = 'neutral' THEN 1 END) as neutral,
-                COUNT(CASE WHEN sentiment_label = 'negative' THEN 1 END) as negative,
-                COUNT(*) as total
-            FROM reviews WHERE sentiment_label IS NOT NULL
-        """)
-        sentiment_data = cursor.fetchone()
-        
-        positive_percentage = 0
-        if sentiment_data['total'] > 0:
-            positive_percentage = (sentiment_data['positive'] / sentiment_data['total']) * 100
-        
-        # Price trend data (last 6 months)
-        cursor.execute("""
-            SELECT 
-                DATE_TRUNC('month', recorded_at) as month,
-                AVG(price) as avg_price
-            FROM price_history 
-            WHERE recorded_at >= NOW() - INTERVAL '6 months'
-            GROUP BY DATE_TRUNC('month', recorded_at)
-            ORDER BY month
-        """)
-        price_trend = cursor.fetchall()
-        
-        # Category distribution
-        cursor.execute("""
-            SELECT category, COUNT(*) as count
-            FROM products 
-            WHERE category IS NOT NULL
-            GROUP BY category
-            ORDER BY count DESC
-            LIMIT 10
-        """)
-        category_data = cursor.fetchall()
-        
-        cursor.close()
-        conn.close()
-        
-        return jsonify({
-            'totalProducts': total_products,
-            'totalReviews': total_reviews,
-            'avgRating': float(avg_rating),
-            'positiveSentiment': positive_percentage,
-            'sentimentData': {
-                'positive': sentiment_data['positive'],
-                'neutral': sentiment_data['neutral'],
-                'negative': sentiment_data['negative']
-            },
-            'priceData': {
-                'labels': [item['month'].strftime('%b') for item in price_trend],
-                'values': [float(item['avg_price']) if item['avg_price'] else 0 for item in price_trend]
-            },
-            'categoryData': {
-                'labels': [item['category'] for item in category_data],
-                'values': [item['count'] for item in category_data]
-            }
-        })
+        return jsonify(build_dashboard_stats())
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Sort keys for /api/dashboard/products and the columns they order by
+PRODUCT_SORT_KEYS = {
+    'updated_at': 'p.updated_at',
+    'price': 'p.price',
+    'name': 'p.name',
+    'id': 'p.id'
+}
+MAX_PAGE_SIZE = 100
+
+def encode_cursor(sort, order, value, product_id):
+    payload = json.dumps([sort, order, None if value is None else str(value), product_id])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor_token):
+    padded = cursor_token + '=' * (-len(cursor_token) % 4)
+    sort, order, value, product_id = json.loads(base64.urlsafe_b64decode(padded))
+    return sort, order, value, int(product_id)
+
+def keyset_condition(column, order, value, product_id):
+    # Continue after (value, id) in "column <order> NULLS LAST, id <order>" order.
+    # A non-NULL value is a plain row comparison the (column, id) index can
+    # seek to; the NULL tail is read by a separate query (see below)
+    op = '<' if order == 'desc' else '>'
+    if value is None:
+        return f"({column} IS NULL AND p.id {op} %s)", [product_id]
+    return f"({column}, p.id) {op} (%s, %s)", [value, product_id]
+
+def select_product_rows(cursor, column, conditions, params, order_by, limit):
+    where = ('WHERE ' + ' AND '.join(conditions)) if conditions else ''
+    
+    # Review aggregates come from the per-product rollup, so only the
+    # rows on this page are touched (see dashboard_rollup.py)
+    cursor.execute(f"""
+        SELECT 
+            p.id, p.name, p.price, p.image_url, p.category, {column} as sort_value,
+            r.rating_sum / NULLIF(r.rating_count, 0) as avg_rating,
+            COALESCE(r.review_count, 0) as review_count,
+            r.sentiment_sum / NULLIF(r.sentiment_count, 0) as avg_sentiment
+        FROM products p
+        LEFT JOIN product_review_rollup r ON r.product_id = p.id
+        {where}
+        ORDER BY {order_by}
+        LIMIT %s
+    """, params + [limit])
+    return cursor.fetchall()
+
+def query_dashboard_products(args):
+    """Return (rows, next cursor) for one page; ValueError on bad parameters"""
+    sort = args.get('sort', 'updated_at')
+    order = args.get('order', 'desc').lower()
+    
+    if sort not in PRODUCT_SORT_KEYS or order not in ('asc', 'desc'):
+        raise ValueError(f'sort must be one of {sorted(PRODUCT_SORT_KEYS)} and order asc or desc')
+    
+    try:
+        limit = min(max(int(args.get('limit', 20)), 1), MAX_PAGE_SIZE)
+        min_price = args.get('min_price', type=float)
+        max_price = args.get('max_price', type=float)
+        min_rating = args.get('min_rating', type=float)
+        after = decode_cursor(args['cursor']) if args.get('cursor') else None
+    except (ValueError, TypeError):
+        raise ValueError('Invalid pagination parameters')
+    
+    if after and after[:2] != (sort, order):
+        raise ValueError('Cursor does not match the requested sort')
+    
+    column = PRODUCT_SORT_KEYS[sort]
+    conditions = []
+    params = []
+    
+    if args.get('category'):
+        conditions.append("p.category = %s")
+        params.append(args['category'])
+    if min_price is not None:
+        conditions.append("p.price >= %s")
+        params.append(min_price)
+    if max_price is not None:
+        conditions.append("p.price <= %s")
+        params.append(max_price)
+    if min_rating is not None:
+        conditions.append("r.rating_sum / NULLIF(r.rating_count, 0) >= %s")
+        params.append(min_rating)
+    
+    direction = 'DESC' if order == 'desc' else 'ASC'
+    page_conditions = list(conditions)
+    page_params = list(params)
+    if after:
+        condition, cursor_params = keyset_condition(column, order, after[2], after[3])
+        page_conditions.append(condition)
+        page_params.extend(cursor_params)
+    
+    with db_pool.cursor() as cursor:
+        order_by = f"{column} {direction} NULLS LAST, p.id {direction}"
+        products = select_product_rows(cursor, column, page_conditions, page_params, order_by, limit + 1)
+        
+        # After a non-NULL cursor the row comparison stops at the last
+        # non-NULL value; the NULL sort values follow in id order
+        if after and after[2] is not None and sort != 'id' and len(products) <= limit:
+            products += select_product_rows(
+                cursor, column, conditions + [f"{column} IS NULL"], list(params),
+                order_by, limit + 1 - len(products)
+            )
+    
+    next_cursor = None
+    if len(products) > limit:
+        products = products[:limit]
+        last = products[-1]
+        sort_value = last['sort_value']
+        if isinstance(sort_value, datetime):
+            sort_value = sort_value.isoformat()
+        next_cursor = encode_cursor(sort, order, sort_value, last['id'])
+    
+    # Convert to list of dictionaries and handle None values
+    result = []
+    for product in products:
+        result.append({
+            'id': product['id'],
+            'name': product['name'],
+            'price': float(product['price']) if product['price'] else None,
+            'image_url': product['image_url'],
+            'category': product['category'],
+            'avg_rating': float(product['avg_rating']) if product['avg_rating'] else 0,
+            'review_count': product['review_count'],
+            'avg_sentiment': float(product['avg_sentiment']) if product['avg_sentiment'] else 0
+        })
+    
+    return result, next_cursor
+
 @app.route('/api/dashboard/products')
+@response_cache.cached()
 def get_dashboard_products():
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT 
-                p.id, p.name, p.price, p.image_url, p.category,
-                AVG(r.rating) as avg_rating,
-                COUNT(r.id) as review_count,
-                AVG(r.sentiment_score) as avg_sentiment
-            FROM products p
-            LEFT JOIN reviews r ON p.id = r.product_id
-            GROUP BY p.id, p.name, p.price, p.image_url, p.category
-            ORDER BY p.updated_at DESC
-            LIMIT 20
-        """)
+        try:
+            result, next_cursor = query_dashboard_products(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        products = cursor.fetchall()
-        
-        cursor.close()
-        conn.close()
-        
-        # Convert to list of dictionaries and handle None values
-        result = []
-        for product in products:
-            result.append({
-                'id': product['id'],
-                'name': product['name'],
-                'price': float(product['price']) if product['price'] else None,
-                'image_url': product['image_url'],
-                'category': product['category'],
-                'avg_rating': float(product['avg_rating']) if product['avg_rating'] else 0,
-                'review_count': product['review_count'],
-                'avg_sentiment': float(product['avg_sentiment']) if product['avg_sentiment'] else 0
-            })
-        
-        return jsonify(result)
+        # The body stays a plain list for existing clients; the next page is
+        # requested with ?cursor=<X-Next-Cursor>
+        response = jsonify(result)
+        if next_cursor:
+            response.headers['X-Next-Cursor'] = next_cursor
+        return response
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def build_dashboard_events(tables):
+    """Dashboard payloads affected by changes to `tables` (None means all)"""
+    events = {}
+    if tables is None or tables & {'products', 'reviews', 'price_history'}:
+        events['stats'] = build_dashboard_stats()
+    if tables is None or tables & {'products', 'reviews'}:
+        events['products'] = query_dashboard_products(MultiDict())[0]
+    events['changed'] = {
+        'tables': sorted(tables or data_version.TRACKED_TABLES),
+        'version': get_data_version()
+    }
+    return events
+
+# Pushes dashboard updates to every /api/dashboard/events stream; each
+# change is computed once per process, not once per viewer
+change_feed = ChangeFeed(
+    data_version.CHANGE_CHANNEL,
+    build_dashboard_events,
+    debounce=float(os.environ.get('API_EVENTS_DEBOUNCE', 0.5)),
+    heartbeat=float(os.environ.get('API_EVENTS_HEARTBEAT', 15))
+)
+
+@app.route('/api/dashboard/events')
+def dashboard_events():
+    """Server-sent events: `stats`, `products` (first page) and `changed`"""
+    try:
+        subscriber = change_feed.subscribe()
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    return Response(
+        change_feed.stream(subscriber),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/api/product/<int:product_id>')
+@response_cache.cached()
 def get_product_details(product_id):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Get product details
-        cursor.execute("""
-            SELECT p.*, 
-                   AVG(r.rating) as avg_rating,
-                   COUNT(r.id) as review_count,
-                   AVG(r.sentiment_score) as avg_sentiment
-            FROM products p
-            LEFT JOIN reviews r ON p.id = r.product_id
-            WHERE p.id = %s
-            GROUP BY p.id
-        """, (product_id,))
-        
-        product = cursor.fetchone()
-        
-        if not product:
-            return jsonify({'error': 'Product not found'}), 404
-        
-        # Get recent reviews
-        cursor.execute("""
-            SELECT reviewer_name, rating, review_text, sentiment_label, 
-                   sentiment_score, review_date
-            FROM reviews
-            WHERE product_id = %s
-            ORDER BY scraped_at DESC
-            LIMIT 10
-        """, (product_id,))
+        with db_pool.cursor() as cursor:
+            # Get product details
+            cursor.execute("""
+                SELECT p.*, 
+                       AVG(r.rating) as avg_rating,
+                       COUNT(r.id) as review_count,
+                       AVG(r.sentiment_score) as avg_sentiment
+                FROM products p
+                LEFT JOIN reviews r ON p.id = r.product_id
+                WHERE p.id = %s
+                GROUP BY p.id
+            """, (product_id,))
+            
+            product = cursor.fetchone()
+            
+            if not product:
+                return jsonify({'error': 'Product not found'}), 404
+            
+            # Get recent reviews
+            cursor.execute("""
+                SELECT reviewer_name, rating, review_text, sentiment_label, 
+                       sentiment_score, review_date
+                FROM reviews
+                WHERE product_id = %s
+                ORDER BY scraped_at DESC
+                LIMIT 10
+            """, (product_id,))
+            
+            reviews = cursor.fetchall()
+            
+            # Get price history
+            cursor.execute("""
+                SELECT price, recorded_at
+                FROM price_history
+                WHERE product_id = %s
+                ORDER BY recorded_at DESC
+                LIMIT 30
+            """, (product_id,))
+            
+            price_history = cursor.fetchall()
         
-        reviews = cursor.fetchall()
+        return jsonify({
+            'product': dict(product),
+            'reviews': [dict(review) for review in reviews],
+            'priceHistory': [dict(ph) for ph in price_history]
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+PRICE_RESOLUTIONS = ['auto', 'raw'] + price_rollup.RESOLUTIONS
+MAX_PRICE_POINTS = 5000
+
+def naive_utc(value):
+    # The timestamp columns are plain TIMESTAMP, so an explicit offset is
+    # converted to UTC and dropped rather than compared against naive values
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+@app.route('/api/product/<int:product_id>/price_history')
+@response_cache.cached()
+def get_price_history(product_id):
+    """Price history over ?start=&end= (ISO dates) at ?resolution=auto|raw|day|week|month"""
+    try:
+        resolution = request.args.get('resolution', 'auto')
+        if resolution not in PRICE_RESOLUTIONS:
+            return jsonify({'error': f'resolution must be one of {PRICE_RESOLUTIONS}'}), 400
         
-        # Get price history
-        cursor.execute("""
-            SELECT price, recorded_at
-            FROM price_history
-            WHERE product_id = %s
-            ORDER BY recorded_at DESC
-            LIMIT 30
-        """, (product_id,))
+        try:
+            end = naive_utc(datetime.fromisoformat(request.args['end'])) if request.args.get('end') else datetime.now()
+            start = naive_utc(datetime.fromisoformat(request.args['start'])) if request.args.get('start') else datetime.min
+            max_points = min(max(int(request.args.get('max_points', 500)), 1), MAX_PRICE_POINTS)
+        except ValueError:
+            return jsonify({'error': 'start and end must be ISO dates, max_points an integer'}), 400
         
-        price_history = cursor.fetchall()
+        if start > end:
+            return jsonify({'error': 'start must not be after end'}), 400
         
-        cursor.close()
-        conn.close()
+        # Long ranges are read from the day/week/month rollups (see price_rollup.py)
+        with db_pool.cursor() as cursor:
+            resolution, points = price_rollup.read_history(
+                cursor, product_id, start, end, resolution, max_points
+            )
         
         return jsonify({
-            'product': dict(product),
-            'reviews': [dict(review) for review in reviews],
-            'priceHistory': [dict(ph) for ph in price_history]
+            'product_id': product_id,
+            'resolution': resolution,
+            'start': None if start == datetime.min else start.isoformat(),
+            'end': end.isoformat(),
+            'points': points
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -205,34 +381,131 @@ def add_product():
     try:
         data = request.json
         
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        with db_pool.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO products (name, brand, category, price, url, description)
+                VALUES (%s, %s, %s, %s, %s, %s)
+                RETURNING id
+            """, (
+                data.get('name'),
+                data.get('brand'),
+                data.get('category'),
+                data.get('price'),
+                data.get('url'),
+                data.get('description')
+            ))
+            
+            product_id = cursor.fetchone()['id']
         
-        cursor.execute("""
-            INSERT INTO products (name, brand, category, price, url, description)
-            VALUES (%s, %s, %s, %s, %s, %s)
-            RETURNING id
-        """, (
-            data.get('name'),
-            data.get('brand'),
-            data.get('category'),
-            data.get('price'),
-            data.get('url'),
-            data.get('description')
-        ))
+        response_cache.invalidate()
         
-        product_id = cursor.fetchone()['id']
+        return jsonify({'id': product_id, 'message': 'Product added successfully'})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Rows per multi-row upsert in /api/products/bulk
+BULK_BATCH_SIZE = int(os.environ.get('API_BULK_BATCH_SIZE', 1000))
+
+@app.route('/api/products/bulk', methods=['POST'])
+def bulk_add_products():
+    """Upsert products from an NDJSON or CSV body on (source, source_id)"""
+    try:
+        data_format = request.args.get('format') or (
+            'csv' if request.mimetype in ('text/csv', 'application/csv') else 'ndjson'
+        )
+        if data_format not in ('ndjson', 'csv'):
+            return jsonify({'error': 'format must be ndjson or csv'}), 400
         
-        conn.commit()
-        cursor.close()
-        conn.close()
+        reader = product_ingest.read_csv if data_format == 'csv' else product_ingest.read_ndjson
         
-        return jsonify({'id': product_id, 'message': 'Product added successfully'})
+        # The body is read as a stream, one batch at a time, and each batch
+        # is committed as it is written
+        with db_pool.connection() as conn:
+            loader = product_ingest.BulkLoader(conn, batch_size=BULK_BATCH_SIZE)
+            try:
+                for line_no, row in reader(request.stream):
+                    loader.add(line_no, row)
+                loader.flush()
+            finally:
+                # Batches written before a failure are already committed
+                if loader.inserted or loader.updated:
+                    response_cache.invalidate()
+        
+        return jsonify(loader.summary())
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+ML_SERVICE_URL = os.environ.get('ML_SERVICE_URL', 'http://127.0.0.1:5000')
+ML_CONNECT_TIMEOUT = float(os.environ.get('ML_CONNECT_TIMEOUT', 5))
+ML_READ_TIMEOUT = float(os.environ.get('ML_READ_TIMEOUT', 120))
+
+# Analysis runs in the background so a slow insight run never holds an
+# API request thread; concurrent requests for one product share a job
+analysis_jobs = JobQueue(
+    workers=int(os.environ.get('API_ANALYSIS_WORKERS', 4)),
+    max_pending=int(os.environ.get('API_ANALYSIS_MAX_PENDING', 100)),
+    result_ttl=float(os.environ.get('API_ANALYSIS_RESULT_TTL', 600))
+)
+
+# Keep-alive connections to the ML service, one per analysis worker
+ml_session = metrics.instrument_session(requests.Session(), pool_maxsize=analysis_jobs.workers + 1)
+
+def call_ml_service(path, payload):
+    response = ml_session.post(
+        f"{ML_SERVICE_URL}{path}",
+        json=payload,
+        timeout=(ML_CONNECT_TIMEOUT, ML_READ_TIMEOUT)
+    )
+    if response.status_code != 200:
+        raise RuntimeError(f"ML service returned {response.status_code} for {path}")
+    return response.json()
+
+def run_analysis(product_id):
+    insights = call_ml_service('/generate_insights', {'product_id': product_id})
+    
+    # Save insights to database
+    with db_pool.cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO product_analytics 
+            (product_id, avg_rating, total_reviews, recommendation_score, analyzed_at)
+            VALUES (%s, %s, %s, %s, NOW())
+            ON CONFLICT (product_id) DO UPDATE SET
+            avg_rating = EXCLUDED.avg_rating,
+            total_reviews = EXCLUDED.total_reviews,
+            recommendation_score = EXCLUDED.recommendation_score,
+            analyzed_at = EXCLUDED.analyzed_at
+        """, (
+            product_id,
+            insights.get('avg_rating', 0),
+            insights.get('review_count', 0),
+            insights.get('avg_sentiment', 0)
+        ))
+    
+    response_cache.invalidate()
+    
+    return insights
+
+def job_response(job, created=None):
+    data = job.to_dict()
+    if created is not None:
+        data['deduplicated'] = not created
+    status_code = 200 if job.done.is_set() else 202
+    response = jsonify(data)
+    response.status_code = status_code
+    response.headers['Location'] = f"/api/analysis/jobs/{job.id}"
+    return response
+
+def wait_seconds():
+    # Optional long-poll: ?wait=<seconds>, capped at 60
+    try:
+        return min(max(float(request.args.get('wait', 0)), 0), 60)
+    except ValueError:
+        return 0
+
 @app.route('/api/analysis/generate', methods=['POST'])
 def generate_analysis():
+    """Insights for one product. With "async": true in the body the run is
+    only queued; poll or stream /api/analysis/jobs/<job_id> for the result"""
     try:
         data = request.json
         product_id = data.get('product_id')
@@ -240,44 +513,171 @@ def generate_analysis():
         if not product_id:
             return jsonify({'error': 'Product ID is required'}), 400
         
-        # Call ML service to generate insights
-        import requests
-        response = requests.post('http://127.0.0.1:5000/generate_insights', 
-                               json={'product_id': product_id})
+        try:
+            product_id = int(product_id)
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Product ID must be an integer'}), 400
         
-        if response.status_code == 200:
-            insights = response.json()
-            
-            # Save insights to database
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                INSERT INTO product_analytics 
-                (product_id, avg_rating, total_reviews, recommendation_score, analyzed_at)
-                VALUES (%s, %s, %s, %s, NOW())
-                ON CONFLICT (product_id) DO UPDATE SET
-                avg_rating = EXCLUDED.avg_rating,
-                total_reviews = EXCLUDED.total_reviews,
-                recommendation_score = EXCLUDED.recommendation_score,
-                analyzed_at = EXCLUDED.analyzed_at
-            """, (
-                product_id,
-                insights.get('avg_rating', 0),
-                insights.get('review_count', 0),
-                insights.get('avg_sentiment', 0)
-            ))
-            
-            conn.commit()
-            cursor.close()
-            conn.close()
-            
-            return jsonify(insights)
-        else:
+        try:
+            job, created = analysis_jobs.submit(('analysis', product_id), run_analysis, product_id)
+        except QueueFull as e:
+            return jsonify({'error': str(e)}), 429
+        
+        if data.get('async'):
+            job.done.wait(wait_seconds())
+            return job_response(job, created)
+        
+        # Synchronous callers get the insights themselves, as before jobs
+        # existed; a run that outlasts the ML timeouts is handed out as a job
+        if job.done.wait(ML_CONNECT_TIMEOUT + ML_READ_TIMEOUT + 5):
+            if job.status == 'failed':
+                return jsonify({'error': 'Failed to generate insights'}), 500
+            return jsonify(job.result)
+        return job_response(job, created)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/analysis/jobs/<job_id>')
+def get_analysis_job(job_id):
+    job = analysis_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found or expired'}), 404
+    
+    job.done.wait(wait_seconds())
+    return job_response(job)
+
+@app.route('/api/analysis/jobs/<job_id>/events')
+def stream_analysis_job(job_id):
+    """Server-sent events: `status` now, then `done` when the job finishes"""
+    job = analysis_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found or expired'}), 404
+    
+    def events():
+        yield f"event: status\ndata: {json.dumps(job.to_dict())}\n\n"
+        while not job.done.wait(15):
+            yield ": keepalive\n\n"
+        yield f"event: done\ndata: {json.dumps(job.to_dict())}\n\n"
+    
+    return Response(events(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+@app.route('/api/analysis/jobs/stats')
+def get_analysis_job_stats():
+    return jsonify(analysis_jobs.stats())
+
+@app.route('/api/analysis/generate_batch', methods=['POST'])
+def generate_analysis_batch():
+    try:
+        data = request.json
+        product_ids = data.get('product_ids')
+        
+        if not product_ids:
+            return jsonify({'error': 'Product IDs are required'}), 400
+        
+        try:
+            if not isinstance(product_ids, list):
+                raise TypeError
+            product_ids = [int(product_id) for product_id in product_ids]
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Product IDs must be a list of integers'}), 400
+        
+        # One ML call computes insights for the whole set
+        try:
+            result = call_ml_service('/generate_insights_batch', {'product_ids': product_ids})
+        except (RuntimeError, requests.RequestException):
             return jsonify({'error': 'Failed to generate insights'}), 500
+        
+        insights = result.get('insights', {})
+        
+        if insights:
+            with db_pool.cursor() as cursor:
+                execute_values(cursor, """
+                    INSERT INTO product_analytics 
+                    (product_id, avg_rating, total_reviews, recommendation_score, analyzed_at)
+                    VALUES %s
+                    ON CONFLICT (product_id) DO UPDATE SET
+                    avg_rating = EXCLUDED.avg_rating,
+                    total_reviews = EXCLUDED.total_reviews,
+                    recommendation_score = EXCLUDED.recommendation_score,
+                    analyzed_at = EXCLUDED.analyzed_at
+                """, [
+                    (
+                        int(product_id),
+                        item.get('avg_rating', 0),
+                        item.get('review_count', 0),
+                        item.get('avg_sentiment', 0)
+                    )
+                    for product_id, item in insights.items()
+                ], template="(%s, %s, %s, %s, NOW())")
             
+            response_cache.invalidate()
+        
+        return jsonify(result)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Each running export holds a pooled connection until the download ends
+EXPORT_CHUNK_SIZE = int(os.environ.get('API_EXPORT_CHUNK_SIZE', 5000))
+export_slots = threading.BoundedSemaphore(int(os.environ.get('API_EXPORT_CONCURRENCY', 2)))
+
+@app.route('/api/export/<dataset>')
+def export_dataset(dataset):
+    """Stream products, reviews or price_history as ?format=ndjson|csv|parquet"""
+    try:
+        if dataset not in data_export.DATASETS:
+            return jsonify({'error': f'dataset must be one of {sorted(data_export.DATASETS)}'}), 404
+        
+        data_format = request.args.get('format', 'ndjson')
+        if data_format not in data_export.FORMATS:
+            return jsonify({'error': f'format must be one of {sorted(data_export.FORMATS)}'}), 400
+        
+        if data_format == 'parquet' and importlib.util.find_spec('pyarrow') is None:
+            return jsonify({'error': 'Parquet export requires pyarrow'}), 501
+        
+        try:
+            filters = {
+                'category': request.args.get('category'),
+                'source': request.args.get('source'),
+                'since': naive_utc(datetime.fromisoformat(request.args['since'])) if request.args.get('since') else None,
+                'until': naive_utc(datetime.fromisoformat(request.args['until'])) if request.args.get('until') else None
+            }
+        except ValueError:
+            return jsonify({'error': 'since and until must be ISO dates'}), 400
+        
+        if not export_slots.acquire(blocking=False):
+            return jsonify({'error': 'Too many exports running, retry later'}), 429
+        
+        # The query runs here, so its errors get a status code; only the
+        # fetch loop runs while the body streams
+        try:
+            stream = data_export.ExportStream(db_pool, dataset, data_format, filters, EXPORT_CHUNK_SIZE)
+        except Exception:
+            export_slots.release()
+            raise
+        
+        mimetype, extension = data_export.FORMATS[data_format]
+        response = Response(
+            stream,
+            mimetype=mimetype,
+            headers={'Content-Disposition': f'attachment; filename="{dataset}.{extension}"'}
+        )
+        # Runs when the download finishes or the client goes away
+        response.call_on_close(export_slots.release)
+        return response
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/db/stats')
+def get_db_stats():
+    return jsonify(db_pool.stats())
+
+@app.route('/api/cache/stats')
+def get_cache_stats():
+    return jsonify(response_cache.stats())
+
+@app.route('/api/events/stats')
+def get_events_stats():
+    return jsonify(change_feed.stats())
+
 if __name__ == '__main__':
     app.run(host='127.0.0.1', port=8000, debug=True)
\ No newline at end of file
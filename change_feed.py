@@ -0,0 +1,186 @@
+import json
+import select
+import threading
+import time
+
+import psycopg2
+
+from db import DB_SETTINGS
+
+
+class Subscriber:
+    """One connected client; keeps only the latest payload per event name"""
+
+    def __init__(self):
+        self.pending = {}
+        self.closed = False
+        self._ready = threading.Condition()
+
+    def push(self, events):
+        with self._ready:
+            self.pending.update(events)
+            self._ready.notify()
+
+    def wait(self, timeout):
+        with self._ready:
+            if not self.pending and not self.closed:
+                self._ready.wait(timeout)
+            events, self.pending = self.pending, {}
+            return events
+
+    def close(self):
+        with self._ready:
+            self.closed = True
+            self._ready.notify()
+
+
+class ChangeFeed:
+    """Fans database change notifications out to server-sent event streams.
+
+    One thread per process LISTENs on `channel`; the payload of each NOTIFY
+    is the name of the table that changed. Bursts of notifications are
+    collapsed for `debounce` seconds, then `build_events(tables)` runs once
+    and only the events whose payload differs from what was last sent are
+    pushed to every subscriber. A slow client never queues more than one
+    payload per event name.
+    """
+
+    def __init__(self, channel, build_events, debounce=0.5, max_delay=2.0, heartbeat=15.0):
+        self.channel = channel
+        self.build_events = build_events
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.heartbeat = heartbeat
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._initial_lock = threading.Lock()
+        self._thread = None
+        self._last_events = {}
+        self.notifications = 0
+        self.broadcasts = 0
+        self.reconnects = 0
+        self.last_error = None
+
+    def subscribe(self):
+        subscriber = Subscriber()
+        with self._lock:
+            self._subscribers.add(subscriber)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._listen, name='change-feed', daemon=True)
+                self._thread.start()
+        try:
+            with self._initial_lock:
+                with self._lock:
+                    current = dict(self._last_events)
+                if current:
+                    subscriber.push(current)
+                else:
+                    # First client of this process: build and send the initial state
+                    self._refresh(None, force=True)
+        except Exception:
+            # The caller never gets the subscriber, so it could not unsubscribe
+            self.unsubscribe(subscriber)
+            raise
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        subscriber.close()
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def stream(self, subscriber):
+        """Generator of text/event-stream chunks for one subscriber"""
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                events = subscriber.wait(self.heartbeat)
+                if subscriber.closed:
+                    return
+                if not events:
+                    # Comment line keeps proxies from closing an idle stream
+                    yield ": keepalive\n\n"
+                    continue
+                for name, payload in events.items():
+                    yield f"event: {name}\ndata: {payload}\n\n"
+        finally:
+            self.unsubscribe(subscriber)
+
+    def _refresh(self, tables, force=False):
+        events = {
+            name: json.dumps(data, default=str)
+            for name, data in self.build_events(tables).items()
+        }
+        with self._lock:
+            changed = {
+                name: payload for name, payload in events.items()
+                if force or self._last_events.get(name) != payload
+            }
+            self._last_events.update(events)
+            subscribers = list(self._subscribers)
+            if changed:
+                self.broadcasts += 1
+        if changed:
+            for subscriber in subscribers:
+                subscriber.push(changed)
+        return changed
+
+    def _listen(self):
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(**DB_SETTINGS)
+                conn.autocommit = True
+                with conn.cursor() as cursor:
+                    cursor.execute(f"LISTEN {self.channel}")
+                # Changes may have been missed while disconnected
+                if self.reconnects:
+                    self._refresh(None)
+                self._drain(conn)
+            except Exception as e:
+                self.last_error = str(e)
+                self.reconnects += 1
+                time.sleep(5)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+    def _drain(self, conn):
+        while True:
+            if not select.select([conn], [], [], self.heartbeat)[0]:
+                continue
+            tables = self._collect(conn)
+            if not tables:
+                continue
+
+            # Wait for the burst to settle, but not longer than max_delay
+            started = time.monotonic()
+            while time.monotonic() - started < self.max_delay:
+                if not select.select([conn], [], [], self.debounce)[0]:
+                    break
+                tables |= self._collect(conn)
+
+            try:
+                self._refresh(tables)
+            except Exception as e:
+                self.last_error = str(e)
+
+    def _collect(self, conn):
+        conn.poll()
+        tables = set()
+        while conn.notifies:
+            tables.add(conn.notifies.pop(0).payload)
+            self.notifications += 1
+        return tables
+
+    def stats(self):
+        with self._lock:
+            return {
+                'channel': self.channel,
+                'subscribers': len(self._subscribers),
+                'listening': self._thread is not None and self._thread.is_alive(),
+                'notifications': self.notifications,
+                'broadcasts': self.broadcasts,
+                'reconnects': self.reconnects,
+                'last_error': self.last_error,
+                'events': sorted(self._last_events)
+            }
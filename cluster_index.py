@@ -0,0 +1,135 @@
+import threading
+
+from scipy.sparse import vstack
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+
+class CategoryIndex:
+    """Cached TF-IDF rows and cluster model for one category"""
+
+    def __init__(self):
+        self.vectorizer = None
+        self.kmeans = None
+        self.n_clusters = 0
+        self.hashes = {}       # product id -> description hash
+        self.rows = {}         # product id -> 1 x n_features TF-IDF row
+        self.info = {}         # product id -> (name, price)
+        self.labels = {}       # product id -> cluster id
+        self.changes_since_fit = 0
+        self.lock = threading.Lock()
+
+
+class ClusterIndex:
+    """Per-category vector index with incremental mini-batch clustering.
+
+    Callers pass the current (id, name, price, description_hash) rows for a
+    category and a loader for descriptions; only new or changed products are
+    re-vectorized, and an unchanged category returns its cached assignments.
+    """
+
+    def __init__(self, max_features=100, refit_ratio=0.3):
+        self.max_features = max_features
+        # Refit vocabulary and clusters from scratch once this share of the
+        # category has changed since the last full fit
+        self.refit_ratio = refit_ratio
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def _get_index(self, category):
+        with self._lock:
+            index = self._indexes.get(category)
+            if index is None:
+                index = self._indexes[category] = CategoryIndex()
+            return index
+
+    def clusters(self, category, rows, load_descriptions):
+        index = self._get_index(category)
+        with index.lock:
+            current = {r[0]: r for r in rows}
+            changed = [pid for pid, r in current.items() if index.hashes.get(pid) != r[3]]
+            removed = [pid for pid in index.hashes if pid not in current]
+
+            # Name/price edits only affect the response, not the vectors
+            for pid, r in current.items():
+                index.info[pid] = (r[1], r[2])
+            for pid in removed:
+                for store in (index.hashes, index.rows, index.info, index.labels):
+                    store.pop(pid, None)
+
+            n_clusters = min(5, len(current) // 2)
+            if not changed and not removed and n_clusters == index.n_clusters:
+                return self._groups(index), 0
+
+            index.changes_since_fit += len(changed) + len(removed)
+            full_refit = (
+                index.kmeans is None
+                or n_clusters != index.n_clusters
+                or index.changes_since_fit > self.refit_ratio * len(current)
+            )
+
+            if full_refit:
+                self._refit(index, current, load_descriptions, n_clusters)
+            else:
+                self._update(index, current, changed, load_descriptions)
+
+            return self._groups(index), len(changed)
+
+    def _refit(self, index, current, load_descriptions, n_clusters):
+        ids = list(current)
+        descriptions = load_descriptions(ids)
+
+        index.vectorizer = TfidfVectorizer(max_features=self.max_features, stop_words='english')
+        matrix = index.vectorizer.fit_transform([descriptions.get(pid) or '' for pid in ids])
+
+        index.kmeans = MiniBatchKMeans(n_clusters=n_clusters, random_state=42, n_init=3)
+        labels = index.kmeans.fit_predict(matrix)
+
+        index.n_clusters = n_clusters
+        index.changes_since_fit = 0
+        index.rows = {pid: matrix[i] for i, pid in enumerate(ids)}
+        index.hashes = {pid: current[pid][3] for pid in ids}
+        index.labels = {pid: int(labels[i]) for i, pid in enumerate(ids)}
+
+    def _update(self, index, current, changed, load_descriptions):
+        if changed:
+            descriptions = load_descriptions(changed)
+            new_rows = index.vectorizer.transform([descriptions.get(pid) or '' for pid in changed])
+            for i, pid in enumerate(changed):
+                index.rows[pid] = new_rows[i]
+                index.hashes[pid] = current[pid][3]
+            # Warm-started update: move the existing centroids toward the new rows
+            index.kmeans.partial_fit(new_rows)
+
+        ids = list(index.rows)
+        labels = index.kmeans.predict(vstack([index.rows[pid] for pid in ids]))
+        index.labels = {pid: int(labels[i]) for i, pid in enumerate(ids)}
+
+    def _groups(self, index):
+        cluster_groups = {}
+        for pid, cluster_id in index.labels.items():
+            name, price = index.info[pid]
+            cluster_groups.setdefault(cluster_id, []).append({
+                'id': pid,
+                'name': name,
+                'price': float(price) if price else 0
+            })
+        return cluster_groups
+
+    def invalidate(self, category=None):
+        with self._lock:
+            if category is None:
+                self._indexes.clear()
+            else:
+                self._indexes.pop(category, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                category: {
+                    'products': len(index.rows),
+                    'n_clusters': index.n_clusters,
+                    'changes_since_fit': index.changes_since_fit
+                }
+                for category, index in self._indexes.items()
+            }
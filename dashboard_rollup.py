@@ -0,0 +1,424 @@
+"""Incrementally maintained aggregates behind /api/dashboard/stats.
+
+Statement-level triggers with transition tables keep three small tables
+current as products, reviews and price_history rows are written, whether
+the write comes from api_server, the n8n workflow or psql:
+
+    dashboard_rollup    product/review counts, rating sum/count and
+                        sentiment label counts, as deltas spread over
+                        DASHBOARD_SHARDS rows and summed when read
+    category_rollup     products per category
+    price_month_rollup  price sum/count per calendar month
+    product_review_rollup
+                        per-product review count, rating and sentiment
+                        sums, used to filter and annotate product pages
+
+Every writer used to update the same dashboard_rollup row, so concurrent
+transactions queued on its row lock until the first one committed. Each
+backend now adds its deltas to the shard row picked by its pid, and
+read_stats sums the shards; a rebuild collapses them back into shard 0.
+
+TRUNCATE fires no row triggers, so TRUNCATE_TRIGGERS clears the rollup
+rows that depend on a truncated table (and zeroes its dashboard columns).
+
+Run `python dashboard_rollup.py` once to install the triggers and backfill
+the rollups from the existing rows; run it again to rebuild them.
+"""
+import psycopg2
+
+from db import DB_SETTINGS
+
+
+# Concurrent writers land on different dashboard_rollup rows unless their
+# backend pids collide modulo this
+DASHBOARD_SHARDS = 16
+
+ROLLUP_SCHEMA = """
+-- The single-row layout (id = 1) is replaced by shard rows; the rebuild
+-- below refills them from the base tables
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM information_schema.columns
+               WHERE table_name = 'dashboard_rollup' AND column_name = 'id') THEN
+        DROP TABLE dashboard_rollup;
+    END IF;
+END;
+$$;
+
+CREATE TABLE IF NOT EXISTS dashboard_rollup (
+    shard SMALLINT PRIMARY KEY,
+    total_products BIGINT NOT NULL DEFAULT 0,
+    total_reviews BIGINT NOT NULL DEFAULT 0,
+    rating_sum NUMERIC NOT NULL DEFAULT 0,
+    rating_count BIGINT NOT NULL DEFAULT 0,
+    positive_reviews BIGINT NOT NULL DEFAULT 0,
+    neutral_reviews BIGINT NOT NULL DEFAULT 0,
+    negative_reviews BIGINT NOT NULL DEFAULT 0,
+    labeled_reviews BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS category_rollup (
+    category TEXT PRIMARY KEY,
+    product_count BIGINT NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS price_month_rollup (
+    month DATE PRIMARY KEY,
+    price_sum NUMERIC NOT NULL DEFAULT 0,
+    price_count BIGINT NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS product_review_rollup (
+    product_id INTEGER PRIMARY KEY,
+    review_count BIGINT NOT NULL DEFAULT 0,
+    rating_sum NUMERIC NOT NULL DEFAULT 0,
+    rating_count BIGINT NOT NULL DEFAULT 0,
+    sentiment_sum NUMERIC NOT NULL DEFAULT 0,
+    sentiment_count BIGINT NOT NULL DEFAULT 0
+);
+
+CREATE OR REPLACE FUNCTION dashboard_shard() RETURNS SMALLINT AS $$
+    SELECT (pg_backend_pid() %% %(shards)s)::SMALLINT;
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION rollup_products() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO dashboard_rollup (shard, total_products)
+        SELECT dashboard_shard(), COUNT(*) FROM new_rows
+        ON CONFLICT (shard) DO UPDATE
+        SET total_products = dashboard_rollup.total_products + EXCLUDED.total_products, updated_at = NOW();
+
+        INSERT INTO category_rollup (category, product_count)
+        SELECT category, COUNT(*) FROM new_rows WHERE category IS NOT NULL GROUP BY category
+        ON CONFLICT (category) DO UPDATE
+        SET product_count = category_rollup.product_count + EXCLUDED.product_count;
+
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO dashboard_rollup (shard, total_products)
+        SELECT dashboard_shard(), -COUNT(*) FROM old_rows
+        ON CONFLICT (shard) DO UPDATE
+        SET total_products = dashboard_rollup.total_products + EXCLUDED.total_products, updated_at = NOW();
+
+        UPDATE category_rollup c SET product_count = c.product_count - d.n
+        FROM (SELECT category, COUNT(*) AS n FROM old_rows WHERE category IS NOT NULL GROUP BY category) d
+        WHERE c.category = d.category;
+
+    ELSE
+        -- Only rows whose category actually changed move between buckets
+        INSERT INTO category_rollup (category, product_count)
+        SELECT category, SUM(delta) FROM (
+            SELECT n.category, 1 AS delta
+            FROM old_rows o JOIN new_rows n ON n.id = o.id
+            WHERE o.category IS DISTINCT FROM n.category
+            UNION ALL
+            SELECT o.category, -1 AS delta
+            FROM old_rows o JOIN new_rows n ON n.id = o.id
+            WHERE o.category IS DISTINCT FROM n.category
+        ) moved
+        WHERE category IS NOT NULL
+        GROUP BY category
+        ON CONFLICT (category) DO UPDATE
+        SET product_count = category_rollup.product_count + EXCLUDED.product_count;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION rollup_reviews() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO dashboard_rollup AS r
+            (shard, total_reviews, rating_sum, rating_count,
+             positive_reviews, neutral_reviews, negative_reviews, labeled_reviews)
+        SELECT dashboard_shard(),
+               CASE WHEN TG_OP = 'INSERT' THEN COUNT(*) ELSE 0 END,
+               COALESCE(SUM(rating), 0),
+               COUNT(rating),
+               COUNT(*) FILTER (WHERE sentiment_label = 'positive'),
+               COUNT(*) FILTER (WHERE sentiment_label = 'neutral'),
+               COUNT(*) FILTER (WHERE sentiment_label = 'negative'),
+               COUNT(sentiment_label)
+        FROM new_rows
+        ON CONFLICT (shard) DO UPDATE SET
+            total_reviews = r.total_reviews + EXCLUDED.total_reviews,
+            rating_sum = r.rating_sum + EXCLUDED.rating_sum,
+            rating_count = r.rating_count + EXCLUDED.rating_count,
+            positive_reviews = r.positive_reviews + EXCLUDED.positive_reviews,
+            neutral_reviews = r.neutral_reviews + EXCLUDED.neutral_reviews,
+            negative_reviews = r.negative_reviews + EXCLUDED.negative_reviews,
+            labeled_reviews = r.labeled_reviews + EXCLUDED.labeled_reviews,
+            updated_at = NOW();
+
+        INSERT INTO product_review_rollup
+            (product_id, review_count, rating_sum, rating_count, sentiment_sum, sentiment_count)
+        SELECT product_id,
+               CASE WHEN TG_OP = 'INSERT' THEN COUNT(*) ELSE 0 END,
+               COALESCE(SUM(rating), 0), COUNT(rating),
+               COALESCE(SUM(sentiment_score), 0), COUNT(sentiment_score)
+        FROM new_rows
+        WHERE product_id IS NOT NULL
+        GROUP BY product_id
+        ON CONFLICT (product_id) DO UPDATE SET
+            review_count = product_review_rollup.review_count + EXCLUDED.review_count,
+            rating_sum = product_review_rollup.rating_sum + EXCLUDED.rating_sum,
+            rating_count = product_review_rollup.rating_count + EXCLUDED.rating_count,
+            sentiment_sum = product_review_rollup.sentiment_sum + EXCLUDED.sentiment_sum,
+            sentiment_count = product_review_rollup.sentiment_count + EXCLUDED.sentiment_count;
+    END IF;
+
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        INSERT INTO dashboard_rollup AS r
+            (shard, total_reviews, rating_sum, rating_count,
+             positive_reviews, neutral_reviews, negative_reviews, labeled_reviews)
+        SELECT dashboard_shard(),
+               CASE WHEN TG_OP = 'DELETE' THEN -COUNT(*) ELSE 0 END,
+               -COALESCE(SUM(rating), 0),
+               -COUNT(rating),
+               -COUNT(*) FILTER (WHERE sentiment_label = 'positive'),
+               -COUNT(*) FILTER (WHERE sentiment_label = 'neutral'),
+               -COUNT(*) FILTER (WHERE sentiment_label = 'negative'),
+               -COUNT(sentiment_label)
+        FROM old_rows
+        ON CONFLICT (shard) DO UPDATE SET
+            total_reviews = r.total_reviews + EXCLUDED.total_reviews,
+            rating_sum = r.rating_sum + EXCLUDED.rating_sum,
+            rating_count = r.rating_count + EXCLUDED.rating_count,
+            positive_reviews = r.positive_reviews + EXCLUDED.positive_reviews,
+            neutral_reviews = r.neutral_reviews + EXCLUDED.neutral_reviews,
+            negative_reviews = r.negative_reviews + EXCLUDED.negative_reviews,
+            labeled_reviews = r.labeled_reviews + EXCLUDED.labeled_reviews,
+            updated_at = NOW();
+
+        UPDATE product_review_rollup p SET
+            review_count = p.review_count - CASE WHEN TG_OP = 'DELETE' THEN d.n ELSE 0 END,
+            rating_sum = p.rating_sum - d.rating_sum,
+            rating_count = p.rating_count - d.rating_count,
+            sentiment_sum = p.sentiment_sum - d.sentiment_sum,
+            sentiment_count = p.sentiment_count - d.sentiment_count
+        FROM (
+            SELECT product_id,
+                   COUNT(*) AS n,
+                   COALESCE(SUM(rating), 0) AS rating_sum,
+                   COUNT(rating) AS rating_count,
+                   COALESCE(SUM(sentiment_score), 0) AS sentiment_sum,
+                   COUNT(sentiment_score) AS sentiment_count
+            FROM old_rows
+            WHERE product_id IS NOT NULL
+            GROUP BY product_id
+        ) d
+        WHERE p.product_id = d.product_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION rollup_price_history() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO price_month_rollup (month, price_sum, price_count)
+        SELECT DATE_TRUNC('month', recorded_at)::date, COALESCE(SUM(price), 0), COUNT(price)
+        FROM new_rows
+        WHERE recorded_at IS NOT NULL
+        GROUP BY 1
+        ON CONFLICT (month) DO UPDATE SET
+            price_sum = price_month_rollup.price_sum + EXCLUDED.price_sum,
+            price_count = price_month_rollup.price_count + EXCLUDED.price_count;
+    END IF;
+
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        UPDATE price_month_rollup m SET
+            price_sum = m.price_sum - d.price_sum,
+            price_count = m.price_count - d.price_count
+        FROM (
+            SELECT DATE_TRUNC('month', recorded_at)::date AS month,
+                   COALESCE(SUM(price), 0) AS price_sum,
+                   COUNT(price) AS price_count
+            FROM old_rows
+            WHERE recorded_at IS NOT NULL
+            GROUP BY 1
+        ) d
+        WHERE m.month = d.month;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS products_rollup_insert ON products;
+DROP TRIGGER IF EXISTS products_rollup_update ON products;
+DROP TRIGGER IF EXISTS products_rollup_delete ON products;
+CREATE TRIGGER products_rollup_insert AFTER INSERT ON products
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_products();
+CREATE TRIGGER products_rollup_update AFTER UPDATE ON products
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_products();
+CREATE TRIGGER products_rollup_delete AFTER DELETE ON products
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_products();
+
+DROP TRIGGER IF EXISTS reviews_rollup_insert ON reviews;
+DROP TRIGGER IF EXISTS reviews_rollup_update ON reviews;
+DROP TRIGGER IF EXISTS reviews_rollup_delete ON reviews;
+CREATE TRIGGER reviews_rollup_insert AFTER INSERT ON reviews
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_reviews();
+CREATE TRIGGER reviews_rollup_update AFTER UPDATE ON reviews
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_reviews();
+CREATE TRIGGER reviews_rollup_delete AFTER DELETE ON reviews
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_reviews();
+
+DROP TRIGGER IF EXISTS price_history_rollup_insert ON price_history;
+DROP TRIGGER IF EXISTS price_history_rollup_update ON price_history;
+DROP TRIGGER IF EXISTS price_history_rollup_delete ON price_history;
+CREATE TRIGGER price_history_rollup_insert AFTER INSERT ON price_history
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_price_history();
+CREATE TRIGGER price_history_rollup_update AFTER UPDATE ON price_history
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_price_history();
+CREATE TRIGGER price_history_rollup_delete AFTER DELETE ON price_history
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_price_history();
+""" % {'shards': DASHBOARD_SHARDS}
+
+# A truncated table has no rows left to subtract; clear what it fed instead.
+# TRUNCATE ... CASCADE fires these for every table it empties.
+TRUNCATE_TRIGGERS = """
+CREATE OR REPLACE FUNCTION rollup_truncate() RETURNS trigger AS $$
+BEGIN
+    IF TG_TABLE_NAME = 'products' THEN
+        UPDATE dashboard_rollup SET total_products = 0, updated_at = NOW();
+        DELETE FROM category_rollup;
+
+    ELSIF TG_TABLE_NAME = 'reviews' THEN
+        UPDATE dashboard_rollup
+        SET total_reviews = 0, rating_sum = 0, rating_count = 0,
+            positive_reviews = 0, neutral_reviews = 0, negative_reviews = 0,
+            labeled_reviews = 0, updated_at = NOW();
+        DELETE FROM product_review_rollup;
+
+    ELSE
+        DELETE FROM price_month_rollup;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS products_rollup_truncate ON products;
+DROP TRIGGER IF EXISTS reviews_rollup_truncate ON reviews;
+DROP TRIGGER IF EXISTS price_history_rollup_truncate ON price_history;
+CREATE TRIGGER products_rollup_truncate AFTER TRUNCATE ON products
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_truncate();
+CREATE TRIGGER reviews_rollup_truncate AFTER TRUNCATE ON reviews
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_truncate();
+CREATE TRIGGER price_history_rollup_truncate AFTER TRUNCATE ON price_history
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_truncate();
+"""
+
+# Recompute every rollup from the base tables. Writers are blocked for the
+# duration so no trigger update is lost between the scan and the swap.
+REBUILD_SQL = """
+LOCK TABLE products, reviews, price_history IN SHARE MODE;
+
+DELETE FROM dashboard_rollup;
+INSERT INTO dashboard_rollup
+    (shard, total_products, total_reviews, rating_sum, rating_count,
+     positive_reviews, neutral_reviews, negative_reviews, labeled_reviews)
+SELECT 0,
+       (SELECT COUNT(*) FROM products),
+       COUNT(*),
+       COALESCE(SUM(rating), 0),
+       COUNT(rating),
+       COUNT(*) FILTER (WHERE sentiment_label = 'positive'),
+       COUNT(*) FILTER (WHERE sentiment_label = 'neutral'),
+       COUNT(*) FILTER (WHERE sentiment_label = 'negative'),
+       COUNT(sentiment_label)
+FROM reviews;
+
+DELETE FROM product_review_rollup;
+INSERT INTO product_review_rollup
+    (product_id, review_count, rating_sum, rating_count, sentiment_sum, sentiment_count)
+SELECT product_id, COUNT(*),
+       COALESCE(SUM(rating), 0), COUNT(rating),
+       COALESCE(SUM(sentiment_score), 0), COUNT(sentiment_score)
+FROM reviews
+WHERE product_id IS NOT NULL
+GROUP BY product_id;
+
+DELETE FROM category_rollup;
+INSERT INTO category_rollup (category, product_count)
+SELECT category, COUNT(*) FROM products WHERE category IS NOT NULL GROUP BY category;
+
+DELETE FROM price_month_rollup;
+INSERT INTO price_month_rollup (month, price_sum, price_count)
+SELECT DATE_TRUNC('month', recorded_at)::date, COALESCE(SUM(price), 0), COUNT(price)
+FROM price_history
+WHERE recorded_at IS NOT NULL
+GROUP BY 1;
+"""
+
+
+def install(cursor):
+    cursor.execute(ROLLUP_SCHEMA)
+    install_truncate_triggers(cursor)
+    rebuild(cursor)
+
+
+def install_truncate_triggers(cursor):
+    cursor.execute(TRUNCATE_TRIGGERS)
+
+
+def rebuild(cursor):
+    cursor.execute(REBUILD_SQL)
+
+
+def read_stats(cursor):
+    """Dashboard stats from the rollups; every query reads a handful of rows"""
+    # At most DASHBOARD_SHARDS rows; COALESCE covers a table with none yet
+    cursor.execute("""
+        SELECT COALESCE(SUM(total_products), 0)::BIGINT AS total_products,
+               COALESCE(SUM(total_reviews), 0)::BIGINT AS total_reviews,
+               COALESCE(SUM(rating_sum), 0) AS rating_sum,
+               COALESCE(SUM(rating_count), 0)::BIGINT AS rating_count,
+               COALESCE(SUM(positive_reviews), 0)::BIGINT AS positive_reviews,
+               COALESCE(SUM(neutral_reviews), 0)::BIGINT AS neutral_reviews,
+               COALESCE(SUM(negative_reviews), 0)::BIGINT AS negative_reviews,
+               COALESCE(SUM(labeled_reviews), 0)::BIGINT AS labeled_reviews
+        FROM dashboard_rollup
+    """)
+    totals = cursor.fetchone()
+
+    # Whole calendar months covering the last six months
+    cursor.execute("""
+        SELECT month, price_sum / NULLIF(price_count, 0) as avg_price
+        FROM price_month_rollup
+        WHERE month >= DATE_TRUNC('month', NOW() - INTERVAL '6 months')::date
+        ORDER BY month
+    """)
+    price_trend = cursor.fetchall()
+
+    cursor.execute("""
+        SELECT category, product_count as count
+        FROM category_rollup
+        WHERE product_count > 0
+        ORDER BY product_count DESC
+        LIMIT 10
+    """)
+    category_data = cursor.fetchall()
+
+    return totals, price_trend, category_data
+
+
+if __name__ == '__main__':
+    conn = psycopg2.connect(**DB_SETTINGS)
+    try:
+        with conn.cursor() as cursor:
+            install(cursor)
+        conn.commit()
+        print("Dashboard rollups installed and rebuilt")
+    finally:
+        conn.close()
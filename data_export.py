@@ -0,0 +1,249 @@
+"""Streaming exports of products, reviews and price history.
+
+Rows are read through a server-side (named) cursor `chunk_size` at a time
+and each chunk is encoded and handed to the HTTP response before the next
+one is fetched, so memory use does not grow with the table. Parquet output
+needs pyarrow and writes one row group per chunk.
+
+The query is executed and its first chunk fetched when an ExportStream is
+created, so a failing query or an unavailable database is reported as an
+error status instead of a 200 whose body stops part way.
+"""
+import csv
+import io
+import json
+import uuid
+from datetime import datetime
+from decimal import Decimal
+
+import psycopg2
+
+
+# Column name and type for each dataset; the types drive the CSV/JSON
+# conversions and the Parquet schema
+DATASETS = {
+    'products': {
+        'from': "products p",
+        'columns': [
+            ('p.id', 'id', 'int'), ('p.name', 'name', 'text'), ('p.brand', 'brand', 'text'),
+            ('p.category', 'category', 'text'), ('p.price', 'price', 'decimal'),
+            ('p.url', 'url', 'text'), ('p.image_url', 'image_url', 'text'),
+            ('p.description', 'description', 'text'), ('p.source', 'source', 'text'),
+            ('p.source_id', 'source_id', 'text'), ('p.created_at', 'created_at', 'timestamp'),
+            ('p.updated_at', 'updated_at', 'timestamp')
+        ],
+        'time_column': 'p.updated_at',
+        'order_by': 'p.id'
+    },
+    'reviews': {
+        'from': "reviews r JOIN products p ON p.id = r.product_id",
+        'columns': [
+            ('r.id', 'id', 'int'), ('r.product_id', 'product_id', 'int'),
+            ('r.reviewer_name', 'reviewer_name', 'text'), ('r.rating', 'rating', 'int'),
+            ('r.review_text', 'review_text', 'text'), ('r.sentiment_score', 'sentiment_score', 'decimal'),
+            ('r.sentiment_label', 'sentiment_label', 'text'), ('r.review_date', 'review_date', 'text'),
+            ('r.scraped_at', 'scraped_at', 'timestamp')
+        ],
+        'time_column': 'r.scraped_at',
+        'order_by': 'r.id'
+    },
+    'price_history': {
+        'from': "price_history ph JOIN products p ON p.id = ph.product_id",
+        'columns': [
+            ('ph.id', 'id', 'int'), ('ph.product_id', 'product_id', 'int'),
+            ('ph.price', 'price', 'decimal'), ('ph.recorded_at', 'recorded_at', 'timestamp')
+        ],
+        'time_column': 'ph.recorded_at',
+        'order_by': 'ph.id'
+    }
+}
+
+FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet')
+}
+
+
+def build_query(dataset, category=None, source=None, since=None, until=None):
+    spec = DATASETS[dataset]
+    conditions = []
+    params = []
+    if category:
+        conditions.append("p.category = %s")
+        params.append(category)
+    if source:
+        conditions.append("p.source = %s")
+        params.append(source)
+    if since:
+        conditions.append(f"{spec['time_column']} >= %s")
+        params.append(since)
+    if until:
+        conditions.append(f"{spec['time_column']} < %s")
+        params.append(until)
+
+    where = ('WHERE ' + ' AND '.join(conditions)) if conditions else ''
+    select = ', '.join(column for column, _, _ in spec['columns'])
+    return f"SELECT {select} FROM {spec['from']} {where} ORDER BY {spec['order_by']}", params
+
+
+def _json_value(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+class NdjsonEncoder:
+    def __init__(self, columns):
+        self.names = [name for _, name, _ in columns]
+
+    def header(self):
+        return b''
+
+    def encode(self, rows):
+        return ''.join(
+            json.dumps(dict(zip(self.names, map(_json_value, row)))) + '\n'
+            for row in rows
+        ).encode('utf-8')
+
+    def footer(self):
+        return b''
+
+
+class CsvEncoder:
+    def __init__(self, columns):
+        self.names = [name for _, name, _ in columns]
+
+    def _write(self, rows):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        return buffer.getvalue().encode('utf-8')
+
+    def header(self):
+        return self._write([self.names])
+
+    def encode(self, rows):
+        return self._write([[_json_value(value) for value in row] for row in rows])
+
+    def footer(self):
+        return b''
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands back what was written since the last take()"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def take(self):
+        data, self._chunks = b''.join(self._chunks), []
+        return data
+
+
+class ParquetEncoder:
+    def __init__(self, columns):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        types = {
+            'int': pa.int64(),
+            'text': pa.string(),
+            'decimal': pa.float64(),
+            'timestamp': pa.timestamp('us')
+        }
+        self.pa = pa
+        self.kinds = [kind for _, _, kind in columns]
+        self.schema = pa.schema([(name, types[kind]) for _, name, kind in columns])
+        self.sink = _ChunkSink()
+        self.writer = pq.ParquetWriter(self.sink, self.schema, compression='snappy')
+
+    def header(self):
+        return b''
+
+    def encode(self, rows):
+        arrays = []
+        for index, kind in enumerate(self.kinds):
+            values = [row[index] for row in rows]
+            if kind == 'decimal':
+                values = [None if value is None else float(value) for value in values]
+            arrays.append(self.pa.array(values, type=self.schema.field(index).type))
+        self.writer.write_table(self.pa.Table.from_arrays(arrays, schema=self.schema))
+        return self.sink.take()
+
+    def footer(self):
+        self.writer.close()
+        return self.sink.take()
+
+
+ENCODERS = {
+    'ndjson': NdjsonEncoder,
+    'csv': CsvEncoder,
+    'parquet': ParquetEncoder
+}
+
+
+class ExportStream:
+    """Iterable of encoded export chunks; holds one pooled connection until closed.
+
+    close() runs when iteration ends and when the WSGI server closes the
+    response, so the connection goes back to the pool even if the client
+    disconnects before the first chunk.
+    """
+
+    def __init__(self, db_pool, dataset, data_format, filters, chunk_size=5000):
+        sql, params = build_query(dataset, **filters)
+        self.encoder = ENCODERS[data_format](DATASETS[dataset]['columns'])
+        self.chunk_size = chunk_size
+        self.db_pool = db_pool
+        self.conn = db_pool.getconn()
+        self.cursor = None
+        try:
+            # Plain tuples regardless of the pool's cursor_factory
+            self.cursor = self.conn.cursor(
+                name=f"export_{uuid.uuid4().hex}",
+                cursor_factory=psycopg2.extensions.cursor
+            )
+            self.cursor.itersize = chunk_size
+            self.cursor.execute(sql, params)
+            self.first_rows = self.cursor.fetchmany(chunk_size)
+        except Exception:
+            self.close()
+            raise
+
+    def __iter__(self):
+        try:
+            yield self.encoder.header()
+            rows = self.first_rows
+            while rows:
+                yield self.encoder.encode(rows)
+                rows = self.cursor.fetchmany(self.chunk_size)
+            yield self.encoder.footer()
+        finally:
+            self.close()
+
+    def close(self):
+        if self.conn is None:
+            return
+        conn, self.conn = self.conn, None
+        try:
+            if self.cursor is not None:
+                self.cursor.close()
+        except psycopg2.Error:
+            pass
+        finally:
+            # putconn rolls back the read-only transaction
+            self.db_pool.putconn(conn)
@@ -0,0 +1,64 @@
+"""Database-wide data version used to invalidate cached API responses.
+
+Every INSERT, UPDATE or DELETE statement on the tracked tables advances
+the `data_version_seq` sequence from a statement-level trigger. Sequences
+are not transactional, so writers never wait on each other for it and
+readers get the current version with a single-row read.
+
+The same trigger sends a NOTIFY on CHANGE_CHANNEL with the table name as
+payload; it is delivered when the transaction commits, once per table.
+
+Run `python data_version.py` once to install the sequence and triggers.
+"""
+import psycopg2
+
+from db import DB_SETTINGS
+
+
+TRACKED_TABLES = ['products', 'reviews', 'price_history', 'product_analytics']
+
+CHANGE_CHANNEL = 'data_changed'
+
+DATA_VERSION_SCHEMA = """
+CREATE SEQUENCE IF NOT EXISTS data_version_seq;
+
+CREATE OR REPLACE FUNCTION bump_data_version() RETURNS trigger AS $$
+BEGIN
+    PERFORM nextval('data_version_seq');
+    PERFORM pg_notify('data_changed', TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+TRIGGER_TEMPLATE = """
+DROP TRIGGER IF EXISTS {table}_data_version ON {table};
+CREATE TRIGGER {table}_data_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table}
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version();
+"""
+
+
+def install(cursor):
+    cursor.execute(DATA_VERSION_SCHEMA)
+    for table in TRACKED_TABLES:
+        cursor.execute(TRIGGER_TEMPLATE.format(table=table))
+
+
+def current_version(cursor):
+    cursor.execute("SELECT last_value, is_called FROM data_version_seq")
+    row = cursor.fetchone()
+    if isinstance(row, dict):
+        return row['last_value'] if row['is_called'] else 0
+    return row[0] if row[1] else 0
+
+
+if __name__ == '__main__':
+    conn = psycopg2.connect(**DB_SETTINGS)
+    try:
+        with conn.cursor() as cursor:
+            install(cursor)
+        conn.commit()
+        print("Data version triggers installed")
+    finally:
+        conn.close()
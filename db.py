@@ -0,0 +1,219 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import pool as pg_pool
+
+import metrics
+
+
+# Connection settings shared by all services; override per environment
+DB_SETTINGS = {
+    'host': os.environ.get('DB_HOST', 'localhost'),
+    'port': int(os.environ.get('DB_PORT', 5432)),
+    'database': os.environ.get('DB_NAME', 'product_research'),
+    'user': os.environ.get('DB_USER', 'postgres'),
+    'password': os.environ.get('DB_PASSWORD', 'postgres'),  # Replace with your PostgreSQL password
+}
+
+
+class PoolTimeout(pg_pool.PoolError):
+    pass
+
+
+class TimedCursorMixin:
+    """Reports each execute() to metrics.sql_duration, labelled by pool"""
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        failed = False
+        try:
+            return super().execute(query, vars)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            metrics.observe_sql(getattr(self.connection, 'pool_name', 'direct'), query, started, failed)
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        failed = False
+        try:
+            return super().executemany(query, vars_list)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            metrics.observe_sql(getattr(self.connection, 'pool_name', 'direct'), query, started, failed)
+
+
+_timed_cursor_classes = {}
+
+def timed_cursor_class(base):
+    cls = _timed_cursor_classes.get(base)
+    if cls is None:
+        cls = _timed_cursor_classes[base] = type('Timed' + base.__name__, (TimedCursorMixin, base), {})
+    return cls
+
+
+class TimedConnection(psycopg2.extensions.connection):
+    """Connection whose cursors, whatever their cursor_factory, are timed"""
+
+    def cursor(self, *args, **kwargs):
+        base = kwargs.get('cursor_factory') or self.cursor_factory or psycopg2.extensions.cursor
+        kwargs['cursor_factory'] = timed_cursor_class(base)
+        return super().cursor(*args, **kwargs)
+
+
+class ConnectionPool:
+    """Bounded, thread-safe psycopg2 pool with health checks and wait-time stats.
+
+    Use `with pool.cursor() as cursor:` for ordinary statements (commits on
+    success, rolls back on error) or `with pool.connection() as conn:` when
+    the caller needs the connection itself, e.g. for a named cursor. The
+    connection always goes back to the pool when the block exits.
+    """
+
+    def __init__(self, name='default', minconn=1, maxconn=10, timeout=10,
+                 check_after=30, **connect_kwargs):
+        self.name = name
+        self.maxconn = maxconn
+        self.timeout = timeout
+        # Idle connections older than this are pinged before reuse
+        self.check_after = check_after
+        self.connect_kwargs = dict(DB_SETTINGS, **connect_kwargs)
+        self.connect_kwargs.setdefault('connection_factory', TimedConnection)
+        self._pool = None
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        self._minconn = minconn
+        self._last_used = {}
+
+        self.checkouts = 0
+        self.timeouts = 0
+        self.reconnects = 0
+        self.in_use = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _get_pool(self):
+        # Created lazily so importing a service never needs a live database
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = pg_pool.ThreadedConnectionPool(
+                        self._minconn, self.maxconn, **self.connect_kwargs
+                    )
+        return self._pool
+
+    def _healthy(self, conn):
+        if conn.closed:
+            return False
+        idle = time.monotonic() - self._last_used.get(id(conn), 0)
+        if idle < self.check_after:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self.timeouts += 1
+            raise PoolTimeout(f"Timed out waiting for a '{self.name}' database connection")
+
+        try:
+            pool = self._get_pool()
+            # Every idle connection may have gone stale (e.g. after a database
+            # restart); the pool holds at most maxconn of them, after that it
+            # has to open a new one
+            for _ in range(self.maxconn + 1):
+                conn = pool.getconn()
+                if self._healthy(conn):
+                    break
+                pool.putconn(conn, close=True)
+                self._last_used.pop(id(conn), None)
+                with self._lock:
+                    self.reconnects += 1
+            else:
+                raise psycopg2.OperationalError(f"No healthy '{self.name}' database connection")
+            conn.pool_name = self.name
+        except Exception:
+            self._slots.release()
+            raise
+
+        waited = time.monotonic() - started
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+        return conn
+
+    def putconn(self, conn):
+        try:
+            broken = bool(conn.closed)
+            if not broken and conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    broken = True
+            self._last_used[id(conn)] = time.monotonic()
+            self._get_pool().putconn(conn, close=broken)
+            if conn.closed:
+                # Discarded, or closed by the pool above minconn idle connections;
+                # its id may be reused by a later connection
+                self._last_used.pop(id(conn), None)
+        finally:
+            with self._lock:
+                self.in_use -= 1
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        conn = self.getconn()
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    @contextmanager
+    def cursor(self, commit=True, **cursor_kwargs):
+        with self.connection() as conn:
+            cursor = conn.cursor(**cursor_kwargs)
+            try:
+                yield cursor
+                if commit:
+                    conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'name': self.name,
+                'max_connections': self.maxconn,
+                'in_use': self.in_use,
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'reconnects': self.reconnects,
+                'wait_avg_ms': round(self.wait_total / self.checkouts * 1000, 3) if self.checkouts else 0,
+                'wait_max_ms': round(self.wait_max * 1000, 3)
+            }
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
+            self._last_used.clear()
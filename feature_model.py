@@ -0,0 +1,196 @@
+import atexit
+import hashlib
+import json
+import math
+import os
+import threading
+from collections import Counter
+
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+
+class SeenFilter:
+    """Fixed-size Bloom filter of document keys (two probes per key).
+
+    Memory and file size stay at `bits` / 8 bytes however many documents
+    arrive; a false positive only means one new document is not counted
+    in the document frequencies.
+    """
+
+    def __init__(self, bits=1 << 25):
+        self.bits = bits
+        self.array = bytearray(bits // 8)
+
+    def _positions(self, key):
+        value = int(key, 16)
+        return value % self.bits, (value >> 32) % self.bits
+
+    def __contains__(self, key):
+        return all(self.array[p >> 3] & (1 << (p & 7)) for p in self._positions(key))
+
+    def add(self, key):
+        for p in self._positions(key):
+            self.array[p >> 3] |= 1 << (p & 7)
+
+    def to_bytes(self):
+        return bytes(self.array)
+
+    @classmethod
+    def from_bytes(cls, data):
+        seen = cls(len(data) * 8)
+        seen.array[:] = data
+        return seen
+
+
+class IncrementalTfidf:
+    """Corpus-wide TF-IDF model whose vocabulary and document frequencies grow as reviews arrive"""
+
+    def __init__(self, path=None, max_terms=200000, save_every=500):
+        self.path = path
+        self.max_terms = max_terms
+        self.save_every = save_every
+        # Same tokenization the per-request TfidfVectorizer used
+        self.analyzer = TfidfVectorizer(stop_words='english', ngram_range=(1, 2)).build_analyzer()
+        self.doc_freq = Counter()
+        self.n_docs = 0
+        self.seen = SeenFilter()
+        self._unsaved = 0
+        self._lock = threading.Lock()
+        # Saves run on a background thread (and once more at exit), never
+        # on the request thread that crossed save_every
+        self._save_lock = threading.Lock()
+        self._save_requested = threading.Event()
+        self._saver = None
+
+        if path:
+            if os.path.exists(path):
+                self.load()
+            atexit.register(self.save)
+
+    @staticmethod
+    def _doc_key(text):
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+    def update(self, documents):
+        """Add unseen documents to the document-frequency model; returns how many were new"""
+        added = 0
+        with self._lock:
+            for text in documents:
+                if not text:
+                    continue
+                key = self._doc_key(text)
+                if key in self.seen:
+                    continue
+                self.seen.add(key)
+                self.doc_freq.update(set(self.analyzer(text)))
+                self.n_docs += 1
+                added += 1
+
+            if len(self.doc_freq) > self.max_terms:
+                self._prune()
+
+            self._unsaved += added
+            should_save = self.path and self._unsaved >= self.save_every
+
+        if should_save:
+            self._request_save()
+        return added
+
+    def _request_save(self):
+        if self._saver is None:
+            with self._lock:
+                if self._saver is None:
+                    self._saver = threading.Thread(target=self._save_loop, name='feature-model-saver', daemon=True)
+                    self._saver.start()
+        self._save_requested.set()
+
+    def _save_loop(self):
+        while True:
+            self._save_requested.wait()
+            self._save_requested.clear()
+            try:
+                self.save()
+            except Exception as e:
+                print(f"Feature model save failed: {e}")
+
+    def _prune(self):
+        # Keep the most common terms; rare n-grams carry little weight anyway
+        keep = int(self.max_terms * 0.8)
+        self.doc_freq = Counter(dict(self.doc_freq.most_common(keep)))
+
+    def idf(self, term):
+        # Smoothed IDF, matching TfidfVectorizer(smooth_idf=True)
+        return math.log((1 + self.n_docs) / (1 + self.doc_freq.get(term, 0))) + 1
+
+    def top_features(self, documents, top_n=10):
+        """Score the terms of a product's reviews against the corpus IDF"""
+        term_counts = Counter()
+        for text in documents:
+            if text:
+                term_counts.update(self.analyzer(text))
+
+        if not term_counts:
+            return []
+
+        with self._lock:
+            weights = {term: count * self.idf(term) for term, count in term_counts.items()}
+
+        norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+        ranked = sorted(weights.items(), key=lambda x: x[1], reverse=True)[:top_n]
+        return [(term, weight / norm) for term, weight in ranked]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'documents': self.n_docs,
+                'terms': len(self.doc_freq),
+                'max_terms': self.max_terms,
+                'unsaved_documents': self._unsaved,
+                'path': self.path
+            }
+
+    def reset(self):
+        with self._lock:
+            self.doc_freq = Counter()
+            self.n_docs = 0
+            self.seen = SeenFilter(self.seen.bits)
+            self._unsaved = 0
+
+    def save(self):
+        """Write the model to `path` and the seen filter to `path`.seen"""
+        if not self.path:
+            return
+        with self._save_lock:
+            # Only the snapshot is taken under the model lock; encoding and
+            # writing happen outside it
+            with self._lock:
+                state = {
+                    'n_docs': self.n_docs,
+                    'doc_freq': dict(self.doc_freq)
+                }
+                seen = self.seen.to_bytes()
+                self._unsaved = 0
+            with open(self.path + '.seen.tmp', 'wb') as f:
+                f.write(seen)
+            os.replace(self.path + '.seen.tmp', self.path + '.seen')
+            with open(self.path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(state, f)
+            os.replace(self.path + '.tmp', self.path)
+
+    def load(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        seen = None
+        if os.path.exists(self.path + '.seen'):
+            with open(self.path + '.seen', 'rb') as f:
+                seen = SeenFilter.from_bytes(f.read())
+        with self._lock:
+            self.n_docs = state.get('n_docs', 0)
+            self.doc_freq = Counter(state.get('doc_freq', {}))
+            if seen is None:
+                # Files written before the filter kept a plain list of keys
+                seen = SeenFilter()
+                for key in state.get('seen', []):
+                    seen.add(key)
+            self.seen = seen
+            self._unsaved = 0
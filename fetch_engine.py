@@ -0,0 +1,225 @@
+"""Asynchronous page fetcher shared by the scraper_service handlers.
+
+One asyncio loop in a background thread owns a keep-alive aiohttp session.
+Handlers submit URLs and wait on the returned future; politeness is the
+scheduler's job: every host has a token bucket (requests per second plus a
+burst) and a concurrency limit, and a global semaphore caps open requests.
+A request waiting for its host's next token costs a timer on the loop, not
+a sleeping thread.
+"""
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeout
+from urllib.parse import urlsplit
+
+import metrics
+
+
+class FetchError(Exception):
+    status_code = 502
+
+
+class HostBusy(FetchError):
+    """The host's rate limit would delay this request longer than allowed"""
+    status_code = 429
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Reservation-style token bucket; only used from the engine's loop thread"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def reserve(self):
+        """Take a token and return how long to wait before using it"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def refund(self):
+        self.tokens += 1
+
+
+class FetchResult:
+    def __init__(self, url, status, headers, body, elapsed):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.elapsed = elapsed
+
+    def header(self, name):
+        """Case-insensitive response header lookup"""
+        name = name.lower()
+        for key, value in self.headers.items():
+            if key.lower() == name:
+                return value
+        return None
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            raise FetchError(f"{self.status} error fetching {self.url}")
+
+
+class Host:
+    def __init__(self, rate, burst, concurrency):
+        self.bucket = TokenBucket(rate, burst)
+        self.slots = asyncio.Semaphore(concurrency)
+        self.requests = 0
+        self.errors = 0
+        self.waited = 0.0
+        self.in_flight = 0
+
+
+class FetchEngine:
+    """Rate-limited concurrent fetches on a private event loop.
+
+    `host_rate` is in requests per second per host (`host_rates` overrides
+    it for specific hosts); a request that would have to wait longer than
+    `max_delay` for its token raises HostBusy instead of queueing.
+    """
+
+    def __init__(self, max_concurrency=20, host_rate=0.5, host_burst=2, host_concurrency=2,
+                 timeout=10, max_delay=30, jitter=0.5, host_rates=None):
+        self.max_concurrency = max_concurrency
+        self.host_rate = host_rate
+        self.host_burst = host_burst
+        self.host_concurrency = host_concurrency
+        self.timeout = timeout
+        self.max_delay = max_delay
+        # Random extra delay for throttled requests so they do not arrive on a fixed beat
+        self.jitter = jitter
+        self.host_rates = host_rates or {}
+        self._hosts = {}
+        self._loop = None
+        self._session = None
+        self._slots = None
+        self._lock = threading.Lock()
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name='fetch-engine', daemon=True)
+                thread.start()
+                self._loop = loop
+            return self._loop
+
+    def _host(self, host):
+        state = self._hosts.get(host)
+        if state is None:
+            rate = self.host_rates.get(host, self.host_rate)
+            state = self._hosts[host] = Host(rate, self.host_burst, self.host_concurrency)
+        return state
+
+    async def _get_session(self):
+        if self._session is None:
+            import aiohttp
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.max_concurrency,
+                    limit_per_host=self.host_concurrency,
+                    ttl_dns_cache=300
+                ),
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        return self._session
+
+    async def _fetch(self, url, headers, max_delay):
+        session = await self._get_session()
+        host_name = urlsplit(url).netloc
+        host = self._host(host_name)
+
+        delay = host.bucket.reserve()
+        if delay > max_delay:
+            host.bucket.refund()
+            raise HostBusy(f"Rate limit for {host_name} reached, retry later", retry_after=delay)
+        if delay:
+            delay += random.uniform(0, self.jitter)
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                # The caller gave up before its turn; the token was never used
+                host.bucket.refund()
+                raise
+            host.waited += delay
+
+        async with self._slots, host.slots:
+            host.requests += 1
+            host.in_flight += 1
+            started = time.perf_counter()
+            status = 'error'
+            try:
+                async with session.get(url, headers=headers, allow_redirects=True) as response:
+                    body = await response.read()
+                    status = str(response.status)
+                    return FetchResult(
+                        str(response.url), response.status, dict(response.headers),
+                        body, time.perf_counter() - started
+                    )
+            except asyncio.TimeoutError:
+                host.errors += 1
+                raise FetchError(f"Timed out fetching {url}")
+            except Exception as e:
+                host.errors += 1
+                raise FetchError(f"Error fetching {url}: {e}")
+            finally:
+                host.in_flight -= 1
+                metrics.outbound_duration.observe((host_name, 'GET', status), time.perf_counter() - started)
+
+    def submit(self, url, headers=None, max_delay=None):
+        """Schedule a fetch; returns a concurrent.futures.Future of a FetchResult.
+
+        `max_delay` overrides the engine's limit on the wait for a token,
+        e.g. for batches whose caller is prepared to wait longer.
+        """
+        if max_delay is None:
+            max_delay = self.max_delay
+        return asyncio.run_coroutine_threadsafe(self._fetch(url, headers, max_delay), self._ensure_loop())
+
+    def fetch(self, url, headers=None):
+        future = self.submit(url, headers)
+        try:
+            # Token wait, jitter and the request itself are all bounded
+            return future.result(timeout=self.max_delay + self.jitter + self.timeout + 5)
+        except FutureTimeout:
+            future.cancel()
+            raise FetchError(f"Timed out fetching {url}")
+
+    def stats(self):
+        hosts = dict(self._hosts)
+        return {
+            'max_concurrency': self.max_concurrency,
+            'host_rate': self.host_rate,
+            'host_burst': self.host_burst,
+            'host_concurrency': self.host_concurrency,
+            'hosts': {
+                name: {
+                    'requests': host.requests,
+                    'errors': host.errors,
+                    'in_flight': host.in_flight,
+                    'waited_seconds': round(host.waited, 3),
+                    'tokens': round(host.bucket.tokens, 3)
+                }
+                for name, host in hosts.items()
+            }
+        }
+
+    def close(self):
+        if self._loop is None:
+            return
+        if self._session is not None:
+            asyncio.run_coroutine_threadsafe(self._session.close(), self._loop).result(timeout=5)
+        self._loop.call_soon_threadsafe(self._loop.stop)
@@ -402,6 +402,20 @@ class IndianProductScraper:
         print(f"Generated {len(curl_statements)} curl statements in {output_file}")
         return output_file
     
+    def generate_bulk_file(self, output_file='indian_products.ndjson'):
+        """Write all products as NDJSON for a single /api/products/bulk request"""
+        if not self.products:
+            print("No products found. Adding sample products...")
+            self.add_sample_products()
+        
+        with open(output_file, 'w', encoding='utf-8') as f:
+            for product in self.products:
+                f.write(json.dumps(product, ensure_ascii=False) + "\n")
+        
+        print(f"Wrote {len(self.products)} products to {output_file}")
+        print(f'Load them with: curl.exe -X POST http://127.0.0.1:8000/api/products/bulk -H "Content-Type: application/x-ndjson" --data-binary @{output_file}')
+        return output_file
+    
     def run_scraper(self, num_products=20):
         """Main method to run the scraper"""
         categories = ['Electronics', 'Fashion', 'Home', 'Sports', 'Beauty']
@@ -426,6 +440,7 @@ class IndianProductScraper:
         
         # Generate curl statements
         output_file = self.generate_curl_statements()
+        self.generate_bulk_file()
         
         print(f"\nScraping completed!")
         print(f"Total products collected: {len(self.products)}")
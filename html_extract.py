@@ -0,0 +1,418 @@
+"""Product and review extraction for scraper_service with pluggable parsers.
+
+Each source has a profile of CSS selectors per field (name, price, ...),
+tried in order until one matches; sources without a profile use
+`generic`. An Extractor compiles a profile once for a backend:
+
+- selectolax: lexbor's C parser; selectors are handed to lexbor as strings
+- lxml: libxml2 parser; selectors are compiled to XPath with cssselect
+- bs4: BeautifulSoup's html.parser with soupsieve-compiled selectors; only
+  the elements the selectors can start from (and their subtrees) are built
+
+The backend is chosen by SCRAPER_PARSER, or the fastest one installed.
+`python html_extract.py --bench DIR` times every installed backend on a
+directory of saved pages (DIR/<source>/*.html picks that source's profile)
+and counts pages whose records differ from the bs4 output.
+"""
+import hashlib
+import importlib.util
+import json
+import os
+import re
+import sys
+import threading
+import time
+from urllib.parse import urljoin
+
+
+# Bump when a change to the extraction code alters the records it produces;
+# profile changes are picked up by Extractor.version on their own
+EXTRACTOR_VERSION = 1
+
+PROFILES = {
+    'generic': {
+        'product': {
+            'name': ['h1', '.product-title', '#product-title', '.title'],
+            'price': ['.price', '.product-price', '.current-price', '[data-testid="price"]'],
+            'description': ['.description', '.product-description', '.product-details'],
+            'image': ['.product-image img', '.main-image img', 'img[data-testid="product-image"]']
+        },
+        'review_items': ['.review', '.review-item', '[data-testid="review"]'],
+        'review': {
+            'reviewer_name': ['.reviewer-name, .review-author, .name'],
+            'rating': ['.rating, .stars, [data-testid="rating"]'],
+            'review_text': ['.review-text, .review-content, .comment'],
+            'review_date': ['.review-date, .date']
+        },
+        'next_page': ['a[rel="next"]', 'link[rel="next"]', '.pagination .next a', 'a.next']
+    },
+    'amazon': {
+        'product': {
+            'name': ['#productTitle'],
+            'price': ['.a-price .a-offscreen', '#priceblock_ourprice', '#priceblock_dealprice'],
+            'description': ['#feature-bullets', '#productDescription'],
+            'image': ['#landingImage', '#imgTagWrapperId img']
+        },
+        'review_items': ['[data-hook="review"]'],
+        'review': {
+            'reviewer_name': ['.a-profile-name'],
+            'rating': ['[data-hook="review-star-rating"], [data-hook="cmps-review-star-rating"]'],
+            'review_text': ['[data-hook="review-body"]'],
+            'review_date': ['[data-hook="review-date"]']
+        },
+        'next_page': ['li.a-last a']
+    }
+}
+
+# Fastest first; `auto` picks the first one that is installed
+BACKEND_ORDER = ['selectolax', 'lxml', 'bs4']
+BACKEND_MODULES = {'selectolax': 'selectolax', 'lxml': 'lxml', 'bs4': 'bs4'}
+
+PRICE_PATTERN = re.compile(r'[\d,]+\.?\d*')
+RATING_PATTERN = re.compile(r'(\d+)')
+
+
+def _normalize(text):
+    return ' '.join(text.split())
+
+
+class SelectolaxBackend:
+    name = 'selectolax'
+
+    def __init__(self):
+        from selectolax.lexbor import LexborHTMLParser
+        self._parser = LexborHTMLParser
+
+    def compile(self, selector):
+        return selector
+
+    def parse(self, body, scope):
+        return self._parser(body)
+
+    def first(self, node, selector):
+        return node.css_first(selector)
+
+    def all(self, node, selector, limit):
+        return node.css(selector)[:limit]
+
+    def text(self, element):
+        return _normalize(element.text(deep=True))
+
+    def attr(self, element, name):
+        return element.attributes.get(name)
+
+
+class LxmlBackend:
+    name = 'lxml'
+
+    def __init__(self):
+        import lxml.html
+        from lxml.cssselect import CSSSelector
+        self._html = lxml.html
+        self._selector = CSSSelector
+
+    def compile(self, selector):
+        return self._selector(selector, translator='html')
+
+    def parse(self, body, scope):
+        try:
+            return self._html.document_fromstring(body)
+        except Exception:
+            # Empty or unparseable page: an empty document matches nothing
+            return self._html.document_fromstring('<html></html>')
+
+    def first(self, node, selector):
+        found = selector(node)
+        return found[0] if found else None
+
+    def all(self, node, selector, limit):
+        return selector(node)[:limit]
+
+    def text(self, element):
+        return _normalize(element.text_content())
+
+    def attr(self, element, name):
+        return element.get(name)
+
+
+# First compound of a selector: tag, #id, .classes and [attr] / [attr="value"]
+_COMPOUND = re.compile(
+    r'^(?P<tag>[a-zA-Z][\w-]*)?'
+    r'(?P<rest>(?:#[\w-]+|\.[\w-]+|\[[\w-]+(?:="[^"]*")?\])*)'
+    r'(?=[\s>+~]|$)'
+)
+_PART = re.compile(r'#([\w-]+)|\.([\w-]+)|\[([\w-]+)(?:="([^"]*)")?\]')
+
+
+def _compound_matcher(selector):
+    """Predicate on (tag name, attrs) for the first compound, or None if unsupported"""
+    match = _COMPOUND.match(selector.strip())
+    if not match or not (match.group('tag') or match.group('rest')):
+        return None
+    tag = match.group('tag')
+    tag = tag.lower() if tag else None
+    parts = _PART.findall(match.group('rest'))
+
+    def matches(name, attrs):
+        if tag and name != tag:
+            return False
+        for id_value, class_name, attr_name, attr_value in parts:
+            if id_value and attrs.get('id') != id_value:
+                return False
+            if class_name:
+                classes = attrs.get('class') or []
+                if isinstance(classes, str):
+                    classes = classes.split()
+                if class_name not in classes:
+                    return False
+            if attr_name and (attr_name not in attrs or (attr_value and attrs[attr_name] != attr_value)):
+                return False
+        return True
+    return matches
+
+
+class SoupBackend:
+    name = 'bs4'
+
+    def __init__(self):
+        import soupsieve
+        from bs4 import BeautifulSoup, SoupStrainer
+        self._compile = soupsieve.compile
+        self._soup = BeautifulSoup
+        self._strainer = SoupStrainer
+
+    def compile(self, selector):
+        return self._compile(selector)
+
+    def strainer(self, selectors):
+        """SoupStrainer keeping only elements a selector can start from, or None"""
+        matchers = []
+        for selector in selectors:
+            for alternative in selector.split(','):
+                matcher = _compound_matcher(alternative)
+                if matcher is None:
+                    return None
+                matchers.append(matcher)
+        return self._strainer(lambda name, attrs: any(matcher(name, attrs) for matcher in matchers))
+
+    def parse(self, body, scope):
+        return self._soup(body, 'html.parser', parse_only=scope)
+
+    def first(self, node, selector):
+        return selector.select_one(node)
+
+    def all(self, node, selector, limit):
+        return selector.select(node, limit=limit)
+
+    def text(self, element):
+        return _normalize(element.get_text())
+
+    def attr(self, element, name):
+        return element.get(name)
+
+
+BACKENDS = {
+    'selectolax': SelectolaxBackend,
+    'lxml': LxmlBackend,
+    'bs4': SoupBackend
+}
+
+
+def available_backends():
+    return [name for name in BACKEND_ORDER if importlib.util.find_spec(BACKEND_MODULES[name]) is not None]
+
+
+def resolve_backend(name=None):
+    name = name or os.environ.get('SCRAPER_PARSER', 'auto')
+    if name == 'auto':
+        return available_backends()[0]
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown parser backend {name!r}; choose from {', '.join(BACKEND_ORDER)}")
+    return name
+
+
+def profile_for(source):
+    """The source's profile merged field by field over the generic one"""
+    generic = PROFILES['generic']
+    specific = PROFILES.get((source or 'generic').lower(), {})
+    return {
+        'product': dict(generic['product'], **specific.get('product', {})),
+        'review_items': specific.get('review_items', generic['review_items']),
+        'review': dict(generic['review'], **specific.get('review', {})),
+        'next_page': specific.get('next_page', generic['next_page'])
+    }
+
+
+class Extractor:
+    """One profile compiled for one backend; safe to share between threads"""
+
+    def __init__(self, backend, profile):
+        self.backend = backend
+        # Identifies the records this extractor produces, e.g. for cache keys
+        fingerprint = hashlib.sha256(json.dumps(profile, sort_keys=True).encode('utf-8')).hexdigest()
+        self.version = f"{EXTRACTOR_VERSION}-{fingerprint[:12]}"
+        compile_all = lambda selectors: [backend.compile(selector) for selector in selectors]
+        self.product_fields = {field: compile_all(selectors) for field, selectors in profile['product'].items()}
+        self.review_items = compile_all(profile['review_items'])
+        self.review_fields = {field: compile_all(selectors) for field, selectors in profile['review'].items()}
+        self.next_page = compile_all(profile['next_page'])
+
+        product_selectors = [s for selectors in profile['product'].values() for s in selectors]
+        review_selectors = profile['review_items'] + profile['next_page']
+        strainer = getattr(backend, 'strainer', None)
+        self.product_scope = strainer(product_selectors) if strainer else None
+        self.review_scope = strainer(review_selectors) if strainer else None
+
+    def _first(self, node, selectors):
+        for selector in selectors:
+            element = self.backend.first(node, selector)
+            if element is not None:
+                return element
+        return None
+
+    def product(self, body, url):
+        """name, price, description and image_url found on a product page"""
+        backend = self.backend
+        doc = backend.parse(body, self.product_scope)
+        fields = self.product_fields
+        product_data = {}
+
+        element = self._first(doc, fields['name'])
+        if element is not None:
+            product_data['name'] = backend.text(element)
+
+        element = self._first(doc, fields['price'])
+        if element is not None:
+            price_match = PRICE_PATTERN.search(backend.text(element).replace(',', ''))
+            if price_match:
+                product_data['price'] = float(price_match.group())
+
+        element = self._first(doc, fields['description'])
+        if element is not None:
+            product_data['description'] = backend.text(element)[:500]
+
+        element = self._first(doc, fields['image'])
+        if element is not None:
+            img_src = backend.attr(element, 'src') or backend.attr(element, 'data-src')
+            if img_src:
+                product_data['image_url'] = urljoin(url, img_src)
+
+        return product_data
+
+    def reviews(self, body, max_reviews):
+        """Up to max_reviews reviews from the first review selector that yields any"""
+        return self._reviews(self.backend.parse(body, self.review_scope), max_reviews)
+
+    def review_page(self, body, url, max_reviews):
+        """(reviews, absolute URL of the next review page or None)"""
+        doc = self.backend.parse(body, self.review_scope)
+        next_url = None
+        element = self._first(doc, self.next_page)
+        if element is not None:
+            href = self.backend.attr(element, 'href')
+            if href:
+                next_url = urljoin(url, href)
+        return self._reviews(doc, max_reviews), next_url
+
+    def _reviews(self, doc, max_reviews):
+        backend = self.backend
+        reviews = []
+
+        for item_selector in self.review_items:
+            for review_elem in backend.all(doc, item_selector, max_reviews):
+                review_data = {}
+                for field, selectors in self.review_fields.items():
+                    element = self._first(review_elem, selectors)
+                    if element is None:
+                        continue
+                    text = backend.text(element)
+                    if field == 'rating':
+                        rating_match = RATING_PATTERN.search(text)
+                        if rating_match:
+                            review_data['rating'] = int(rating_match.group(1))
+                    else:
+                        review_data[field] = text
+
+                if review_data.get('review_text'):
+                    reviews.append(review_data)
+
+            if reviews:
+                break
+
+        return reviews
+
+
+_extractors = {}
+_backends = {}
+_lock = threading.Lock()
+
+
+def get_extractor(source=None, backend=None):
+    """Compiled extractor for a source, cached per (backend, source)"""
+    backend_name = resolve_backend(backend)
+    key = (backend_name, (source or 'generic').lower())
+    extractor = _extractors.get(key)
+    if extractor is None:
+        with _lock:
+            if backend_name not in _backends:
+                _backends[backend_name] = BACKENDS[backend_name]()
+            extractor = _extractors.setdefault(key, Extractor(_backends[backend_name], profile_for(key[1])))
+    return extractor
+
+
+def load_corpus(directory):
+    """(source, url, body) for every .html file; a subdirectory names the source"""
+    pages = []
+    for root, _, files in os.walk(directory):
+        relative = os.path.relpath(root, directory)
+        source = 'generic' if relative == '.' else relative.split(os.sep)[0]
+        for file_name in sorted(files):
+            if file_name.endswith(('.html', '.htm')):
+                with open(os.path.join(root, file_name), 'rb') as f:
+                    pages.append((source, f"https://{source}.example/{file_name}", f.read()))
+    return pages
+
+
+def bench(pages, backends, rounds=3, max_reviews=50):
+    """Best-of-rounds pages per second per backend, and pages whose records
+    differ from the first backend's"""
+    results = {}
+    for backend_name in backends:
+        outputs = []
+        best = None
+        for _ in range(rounds):
+            started = time.perf_counter()
+            outputs = [
+                (get_extractor(source, backend_name).product(body, url),
+                 get_extractor(source, backend_name).reviews(body, max_reviews))
+                for source, url, body in pages
+            ]
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        results[backend_name] = {'seconds': best, 'pages_per_second': len(pages) / best if best else 0.0,
+                                 'outputs': outputs}
+
+    reference = results[backends[0]]['outputs']
+    for result in results.values():
+        result['mismatches'] = sum(1 for a, b in zip(result['outputs'], reference) if a != b)
+    for result in results.values():
+        del result['outputs']
+    return results
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3 or sys.argv[1] != '--bench':
+        print("usage: python html_extract.py --bench CORPUS_DIR [backend ...]")
+        sys.exit(2)
+    pages = load_corpus(sys.argv[2])
+    if not pages:
+        print(f"No .html files under {sys.argv[2]}")
+        sys.exit(1)
+    backends = sys.argv[3:] or available_backends()
+    # bs4 (the old html.parser path) goes first so the others are compared against it
+    backends = sorted(backends, key=lambda name: name != 'bs4')
+    total_bytes = sum(len(body) for _, _, body in pages)
+    print(f"{len(pages)} pages, {total_bytes / 1024:.0f} KiB; product + reviews extraction per page")
+    for backend_name, result in bench(pages, backends).items():
+        print(f"{backend_name:>10}: {result['pages_per_second']:8.1f} pages/s"
+              f"  ({result['seconds']:.3f}s)  {result['mismatches']} pages differ from {backends[0]}")
@@ -0,0 +1,127 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class QueueFull(Exception):
+    """Too many jobs are queued or running; the client should retry later"""
+
+
+class Job:
+    def __init__(self, key):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.status = 'queued'
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.done = threading.Event()
+
+    def to_dict(self):
+        data = {
+            'job_id': self.id,
+            'status': self.status,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+        if self.status == 'done':
+            data['result'] = self.result
+        elif self.status == 'failed':
+            data['error'] = self.error
+        return data
+
+
+class JobQueue:
+    """Background jobs on a bounded thread pool, merged by key while in flight.
+
+    submit() with the key of a job that is still queued or running returns
+    that job instead of starting another. Finished jobs stay readable for
+    `result_ttl` seconds (and at most `max_finished` of them are kept).
+    """
+
+    def __init__(self, workers=4, max_pending=100, result_ttl=600, max_finished=10000):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self.max_finished = max_finished
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job')
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._in_flight = {}
+        self._finished = OrderedDict()
+        self.submitted = 0
+        self.merged = 0
+        self.rejected = 0
+        self.failed = 0
+
+    def submit(self, key, fn, *args):
+        """Return (job, created); created is False when merged into a running job"""
+        with self._lock:
+            job = self._in_flight.get(key)
+            if job is not None:
+                self.merged += 1
+                return job, False
+            if len(self._in_flight) >= self.max_pending:
+                self.rejected += 1
+                raise QueueFull(f"{len(self._in_flight)} jobs pending, retry later")
+
+            self._prune()
+            job = Job(key)
+            self._jobs[job.id] = job
+            self._in_flight[key] = job
+            self.submitted += 1
+
+        self._executor.submit(self._run, job, fn, args)
+        return job, True
+
+    def _run(self, job, fn, args):
+        job.status = 'running'
+        job.started_at = time.time()
+        try:
+            job.result = fn(*args)
+            job.status = 'done'
+        except Exception as e:
+            job.error = str(e)
+            job.status = 'failed'
+            with self._lock:
+                self.failed += 1
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                self._in_flight.pop(job.key, None)
+                self._finished[job.id] = job
+            job.done.set()
+
+    def _prune(self):
+        cutoff = time.time() - self.result_ttl
+        while self._finished:
+            job_id, job = next(iter(self._finished.items()))
+            if job.finished_at >= cutoff and len(self._finished) < self.max_finished:
+                break
+            self._finished.popitem(last=False)
+            self._jobs.pop(job_id, None)
+
+    def get(self, job_id):
+        with self._lock:
+            # Expired results are not served, even when no new jobs arrive
+            self._prune()
+            return self._jobs.get(job_id)
+
+    def stats(self):
+        with self._lock:
+            self._prune()
+            return {
+                'workers': self.workers,
+                'max_pending': self.max_pending,
+                'pending': len(self._in_flight),
+                'retained': len(self._jobs),
+                'submitted': self.submitted,
+                'merged': self.merged,
+                'rejected': self.rejected,
+                'failed': self.failed
+            }
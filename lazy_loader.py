@@ -0,0 +1,51 @@
+import threading
+import time
+
+
+class LazyResources:
+    """Named resources (heavy imports, models) built on first use.
+
+    Each loader runs once; its wall time is recorded so the service can
+    report where startup and warm-up time went.
+    """
+
+    def __init__(self):
+        self._loaders = {}
+        self._values = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self.timings = {}
+
+    def register(self, name, loader):
+        self._loaders[name] = loader
+        self._locks[name] = threading.Lock()
+
+    def get(self, name):
+        if name in self._values:
+            return self._values[name]
+        with self._locks[name]:
+            if name not in self._values:
+                started = time.perf_counter()
+                value = self._loaders[name]()
+                with self._lock:
+                    self.timings[name] = round(time.perf_counter() - started, 4)
+                    self._values[name] = value
+        return self._values[name]
+
+    def loaded(self, name):
+        return name in self._values
+
+    def warm(self, names=None):
+        for name in names or list(self._loaders):
+            self.get(name)
+        return {name: self.timings.get(name) for name in names or list(self._loaders)}
+
+    def report(self):
+        with self._lock:
+            return {
+                name: {
+                    'loaded': name in self._values,
+                    'load_seconds': self.timings.get(name)
+                }
+                for name in self._loaders
+            }
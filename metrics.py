@@ -0,0 +1,310 @@
+"""In-process metrics shared by the three services, exposed at /metrics.
+
+instrument_app() records per-route request counts, latency histograms and
+in-flight requests; db.ConnectionPool times every SQL statement through
+`sql_duration`; instrument_session() times outbound HTTP calls made with a
+requests.Session. Everything is rendered in the Prometheus text format.
+
+Process pool workers buffer their SQL timings and send them, with their
+connection pool counters, back to the parent with each result, where
+record_remote() adds them to this registry.
+"""
+import bisect
+import threading
+import time
+from urllib.parse import urlsplit
+
+from flask import Response, g, request
+from requests.adapters import HTTPAdapter
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = dict(self._values)
+        return self.header() + [
+            f"{self.name}{_labels(self.labelnames, labels)} {value}"
+            for labels, value in sorted(values.items())
+        ]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def dec(self, labels=(), amount=1):
+        self.inc(labels, -amount)
+
+
+class GaugeFunction(Metric):
+    """Gauge read from `fn()` -> {label values tuple: value} at scrape time"""
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames, fn):
+        super().__init__(name, documentation, labelnames)
+        self.fn = fn
+
+    def render(self):
+        try:
+            values = self.fn()
+        except Exception:
+            values = {}
+        return self.header() + [
+            f"{self.name}{_labels(self.labelnames, labels)} {value}"
+            for labels, value in sorted(values.items())
+        ]
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self):
+        with self._lock:
+            values = {labels: (list(counts), total, count) for labels, (counts, total, count) in self._values.items()}
+        lines = self.header()
+        for labels, (counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        with self._lock:
+            # Re-registering a name (e.g. a module imported twice) reuses it
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._add(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._add(Gauge(name, documentation, labelnames))
+
+    def gauge_function(self, name, documentation, labelnames, fn):
+        with self._lock:
+            self._metrics[name] = GaugeFunction(name, documentation, labelnames, fn)
+            return self._metrics[name]
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+http_requests = REGISTRY.counter(
+    'http_requests_total', 'HTTP requests handled', ['service', 'method', 'route', 'status'])
+http_duration = REGISTRY.histogram(
+    'http_request_duration_seconds', 'Time to produce the HTTP response', ['service', 'method', 'route'])
+http_in_flight = REGISTRY.gauge(
+    'http_requests_in_flight', 'HTTP requests being handled', ['service', 'route'])
+http_exceptions = REGISTRY.counter(
+    'http_request_exceptions_total', 'Exceptions that escaped a view', ['service', 'route', 'exception'])
+sql_duration = REGISTRY.histogram(
+    'db_query_duration_seconds', 'SQL statement execution time', ['pool', 'operation'])
+sql_errors = REGISTRY.counter(
+    'db_query_errors_total', 'SQL statements that raised', ['pool', 'operation'])
+outbound_duration = REGISTRY.histogram(
+    'http_client_request_duration_seconds', 'Outbound HTTP calls, until the response headers arrive',
+    ['target', 'method', 'status'])
+
+
+def sql_operation(query):
+    """First keyword of a statement (SELECT, INSERT, ...) as a low-cardinality label"""
+    if isinstance(query, bytes):
+        query = query[:32].decode('utf-8', 'ignore')
+    words = str(query)[:32].split(None, 1)
+    return words[0].upper() if words else 'EMPTY'
+
+
+# Process pool workers have a registry of their own that is never scraped.
+# After buffer_sql() their SQL timings are kept here instead, and
+# take_sql_timings() hands them over to be shipped back with a task result
+_sql_buffer = None
+
+
+def buffer_sql():
+    global _sql_buffer
+    _sql_buffer = []
+
+
+def take_sql_timings():
+    global _sql_buffer
+    if _sql_buffer is None:
+        return []
+    timings, _sql_buffer = _sql_buffer, []
+    return timings
+
+
+def observe_sql(pool, query, started, failed=False):
+    labels = (pool, sql_operation(query))
+    elapsed = time.perf_counter() - started
+    if _sql_buffer is not None:
+        _sql_buffer.append((labels, elapsed, failed))
+        return
+    record_sql(labels, elapsed, failed)
+
+
+def record_sql(labels, elapsed, failed=False):
+    sql_duration.observe(labels, elapsed)
+    if failed:
+        sql_errors.inc(labels)
+
+
+def instrument_app(app, service, registry=REGISTRY):
+    """Time every request of `app` per route and serve /metrics"""
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_route = request.url_rule.rule if request.url_rule else 'unmatched'
+        g.metrics_started = time.perf_counter()
+        http_in_flight.inc((service, g.metrics_route))
+
+    @app.after_request
+    def _record_status(response):
+        g.metrics_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def _stop_timer(exc):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return
+        route = g.pop('metrics_route')
+        status = g.pop('metrics_status', 500)
+        http_in_flight.dec((service, route))
+        http_duration.observe((service, request.method, route), time.perf_counter() - started)
+        http_requests.inc((service, request.method, route, str(status)))
+        if exc is not None:
+            http_exceptions.inc((service, route, type(exc).__name__))
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+
+_pools = []
+# Latest counters of pools living in worker processes: {(pool name, pid): stats}
+_remote_pools = {}
+_remote_lock = threading.Lock()
+POOL_FIELDS = ['in_use', 'checkouts', 'timeouts', 'reconnects']
+
+
+def _pool_stats():
+    values = {}
+    for db_pool in _pools:
+        stats = db_pool.stats()
+        values.update({(db_pool.name, field): stats[field] for field in POOL_FIELDS})
+    with _remote_lock:
+        remote = list(_remote_pools.items())
+    # Worker pools are summed over the worker processes that reported them
+    for (name, _), stats in remote:
+        for field in POOL_FIELDS:
+            values[(name, field)] = values.get((name, field), 0) + stats[field]
+    return values
+
+
+def _register_pool_gauge():
+    REGISTRY.gauge_function('db_pool_connections', 'Connection pool counters', ['pool', 'field'], _pool_stats)
+
+
+def register_pool(db_pool):
+    """Expose a db.ConnectionPool's connection counters on /metrics"""
+    _pools.append(db_pool)
+    _register_pool_gauge()
+
+
+def record_remote(telemetry):
+    """Record what a pool worker sent back with a task result (see ml_workers.telemetry)"""
+    for labels, elapsed, failed in telemetry['sql']:
+        record_sql(tuple(labels), elapsed, failed)
+    pool = telemetry.get('pool')
+    if pool:
+        with _remote_lock:
+            first = not _remote_pools
+            _remote_pools[(pool['name'], telemetry['pid'])] = pool
+        if first:
+            _register_pool_gauge()
+
+
+class TimedAdapter(HTTPAdapter):
+    def send(self, request, **kwargs):
+        target = urlsplit(request.url).netloc
+        started = time.perf_counter()
+        status = 'error'
+        try:
+            response = super().send(request, **kwargs)
+            status = str(response.status_code)
+            return response
+        finally:
+            outbound_duration.observe((target, request.method, status), time.perf_counter() - started)
+
+
+def instrument_session(session, **adapter_kwargs):
+    """Mount timing adapters on a requests.Session; returns the session"""
+    adapter = TimedAdapter(**adapter_kwargs)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
@@ -0,0 +1,320 @@
+"""Versioned schema for the product research database.
+
+`python migrations.py` applies every migration newer than the version
+recorded in `schema_migrations`, each in its own transaction. The
+trigger-maintained objects (dashboard and price rollups, data-version
+triggers) are migrations too: they are installed and backfilled once, and
+a change to them ships as a new migration. Running it against a database
+created from the old schema script only adds what is missing.
+
+`python migrations.py --rebuild` recomputes the dashboard and price rollups
+from the base tables. It holds a SHARE lock on products, reviews and
+price_history while it runs, so writers wait; use it only when a rollup
+has drifted.
+
+`python migrations.py --check` EXPLAINs the hot queries with sequential
+scans disabled and exits non-zero if any of them can still only be served
+by a Seq Scan, i.e. no index covers it.
+"""
+import json
+import sys
+
+import psycopg2
+
+import dashboard_rollup
+import data_version
+import price_rollup
+from db import DB_SETTINGS
+
+
+# Serializes concurrent `python migrations.py` runs
+MIGRATION_LOCK_ID = 8_164_231
+
+BASE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    id SERIAL PRIMARY KEY,
+    name VARCHAR(500),
+    brand VARCHAR(200),
+    category VARCHAR(200),
+    price DECIMAL(10, 2),
+    url TEXT,
+    image_url TEXT,
+    description TEXT,
+    source VARCHAR(100),
+    source_id VARCHAR(200),
+    created_at TIMESTAMP DEFAULT NOW(),
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+ALTER TABLE products ADD COLUMN IF NOT EXISTS source VARCHAR(100);
+ALTER TABLE products ADD COLUMN IF NOT EXISTS source_id VARCHAR(200);
+
+CREATE TABLE IF NOT EXISTS reviews (
+    id SERIAL PRIMARY KEY,
+    product_id INTEGER REFERENCES products(id) ON DELETE CASCADE,
+    reviewer_name VARCHAR(200),
+    rating INTEGER,
+    review_text TEXT,
+    sentiment_score DECIMAL(4, 2),
+    sentiment_label VARCHAR(20),
+    review_date VARCHAR(100),
+    scraped_at TIMESTAMP DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS price_history (
+    id SERIAL PRIMARY KEY,
+    product_id INTEGER REFERENCES products(id) ON DELETE CASCADE,
+    price DECIMAL(10, 2),
+    recorded_at TIMESTAMP DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS product_analytics (
+    id SERIAL PRIMARY KEY,
+    product_id INTEGER UNIQUE REFERENCES products(id) ON DELETE CASCADE,
+    avg_rating DECIMAL(3, 2),
+    total_reviews INTEGER,
+    recommendation_score DECIMAL(4, 2),
+    analyzed_at TIMESTAMP DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS search_trends (
+    id SERIAL PRIMARY KEY,
+    keyword VARCHAR(200) NOT NULL,
+    category VARCHAR(200),
+    search_volume INTEGER,
+    trend_score DECIMAL(5, 2),
+    recorded_at TIMESTAMP DEFAULT NOW()
+);
+"""
+
+HOT_QUERY_INDEXES = """
+-- Latest reviews of a product (product page, insights)
+CREATE INDEX IF NOT EXISTS reviews_product_scraped_idx
+    ON reviews (product_id, scraped_at DESC);
+
+-- Price history of a product in time order (product page, forecasts);
+-- INCLUDE lets the forecasts read prices from the index alone
+CREATE INDEX IF NOT EXISTS price_history_product_recorded_idx
+    ON price_history (product_id, recorded_at) INCLUDE (price);
+
+-- Dashboard product pages (default sort is updated_at DESC NULLS LAST, id)
+-- and the n8n "not updated in 24 hours" scan
+CREATE INDEX IF NOT EXISTS products_updated_idx
+    ON products (updated_at DESC NULLS LAST, id DESC);
+CREATE INDEX IF NOT EXISTS products_price_idx
+    ON products (price, id);
+CREATE INDEX IF NOT EXISTS products_name_idx
+    ON products (name, id);
+
+-- Category filters; clustering only reads products with a description
+CREATE INDEX IF NOT EXISTS products_category_idx
+    ON products (category);
+CREATE INDEX IF NOT EXISTS products_category_described_idx
+    ON products (category) WHERE description IS NOT NULL;
+
+-- Upsert key for /api/products/bulk
+CREATE UNIQUE INDEX IF NOT EXISTS products_source_key
+    ON products (source, source_id);
+
+ANALYZE products;
+ANALYZE reviews;
+ANALYZE price_history;
+"""
+
+PRICE_FORECASTS = """
+CREATE TABLE IF NOT EXISTS price_forecasts (
+    product_id INTEGER PRIMARY KEY REFERENCES products(id) ON DELETE CASCADE,
+    trend VARCHAR(20) NOT NULL,
+    predicted_price DECIMAL(10, 2),
+    slope DOUBLE PRECISION,
+    confidence DOUBLE PRECISION,
+    forecast_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+"""
+
+# Keyset pages seek with (column, id) row comparisons in both directions;
+# a btree only serves "DESC NULLS LAST" from an index declared that way
+PRODUCT_SORT_INDEXES = """
+CREATE INDEX IF NOT EXISTS products_updated_asc_idx
+    ON products (updated_at, id);
+CREATE INDEX IF NOT EXISTS products_price_desc_idx
+    ON products (price DESC NULLS LAST, id DESC);
+CREATE INDEX IF NOT EXISTS products_name_desc_idx
+    ON products (name DESC NULLS LAST, id DESC);
+
+ANALYZE products;
+"""
+
+def rollup_truncate_triggers(cursor):
+    """Databases that installed the rollups before TRUNCATE was handled"""
+    dashboard_rollup.install_truncate_triggers(cursor)
+    price_rollup.install_truncate_trigger(cursor)
+
+
+# (version, name, SQL or a function taking a cursor); never edit an applied
+# migration, add a new one
+MIGRATIONS = [
+    (1, 'base_schema', BASE_SCHEMA),
+    (2, 'hot_query_indexes', HOT_QUERY_INDEXES),
+    (3, 'price_forecasts', PRICE_FORECASTS),
+    (4, 'product_sort_indexes', PRODUCT_SORT_INDEXES),
+    (5, 'dashboard_rollup', dashboard_rollup.install),
+    (6, 'price_rollup', price_rollup.install),
+    (7, 'data_version', data_version.install),
+    (8, 'rollup_truncate_triggers', rollup_truncate_triggers),
+]
+
+# Queries that must be able to use an index: (name, SQL, params)
+HOT_QUERIES = [
+    ('latest_reviews', """
+        SELECT reviewer_name, rating, review_text, sentiment_label, sentiment_score, review_date
+        FROM reviews WHERE product_id = %s ORDER BY scraped_at DESC LIMIT 10
+    """, (1,)),
+    ('product_price_history', """
+        SELECT price, recorded_at FROM price_history
+        WHERE product_id = %s ORDER BY recorded_at DESC LIMIT 30
+    """, (1,)),
+    ('forecast_price_history', """
+        SELECT product_id, recorded_at, price FROM price_history
+        WHERE product_id = ANY(%s) AND price IS NOT NULL ORDER BY product_id, recorded_at
+    """, ([1, 2, 3],)),
+    ('dashboard_products', """
+        SELECT p.id FROM products p
+        ORDER BY p.updated_at DESC NULLS LAST, p.id DESC LIMIT 21
+    """, ()),
+    ('dashboard_products_after', """
+        SELECT p.id FROM products p
+        WHERE (p.updated_at, p.id) < (%s, %s)
+        ORDER BY p.updated_at DESC NULLS LAST, p.id DESC LIMIT 21
+    """, ('2024-01-01', 100)),
+    ('dashboard_products_price_desc_after', """
+        SELECT p.id FROM products p
+        WHERE (p.price, p.id) < (%s, %s)
+        ORDER BY p.price DESC NULLS LAST, p.id DESC LIMIT 21
+    """, ('99.99', 100)),
+    ('dashboard_products_price_asc_after', """
+        SELECT p.id FROM products p
+        WHERE (p.price, p.id) > (%s, %s)
+        ORDER BY p.price ASC NULLS LAST, p.id ASC LIMIT 21
+    """, ('99.99', 100)),
+    ('dashboard_products_null_tail', """
+        SELECT p.id FROM products p
+        WHERE p.price IS NULL
+        ORDER BY p.price DESC NULLS LAST, p.id DESC LIMIT 21
+    """, ()),
+    ('category_products', """
+        SELECT id, name, price FROM products WHERE category = %s AND description IS NOT NULL
+    """, ('Electronics',)),
+    ('stale_products', """
+        SELECT url, id FROM products WHERE updated_at < NOW() - INTERVAL '24 hours' LIMIT 10
+    """, ()),
+    ('product_by_source', """
+        SELECT id FROM products WHERE source = %s AND source_id = %s
+    """, ('Samsung', 'SAM_M32_128')),
+]
+
+
+def current_version(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            applied_at TIMESTAMP NOT NULL DEFAULT NOW()
+        )
+    """)
+    cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")
+    return cursor.fetchone()[0]
+
+
+def migrate(conn):
+    """Apply pending migrations; returns the names of the ones applied"""
+    applied = []
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+    try:
+        with conn.cursor() as cursor:
+            version = current_version(cursor)
+        conn.commit()
+
+        for number, name, sql in MIGRATIONS:
+            if number <= version:
+                continue
+            with conn.cursor() as cursor:
+                if callable(sql):
+                    sql(cursor)
+                else:
+                    cursor.execute(sql)
+                cursor.execute(
+                    "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                    (number, name)
+                )
+            conn.commit()
+            applied.append(name)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+        conn.commit()
+    return applied
+
+
+def rebuild(conn):
+    """Recompute the dashboard and price rollups; writers wait until it commits"""
+    try:
+        with conn.cursor() as cursor:
+            dashboard_rollup.rebuild(cursor)
+            price_rollup.rebuild(cursor)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def seq_scans(plan):
+    """Relations read by a Seq Scan anywhere in an EXPLAIN (FORMAT JSON) plan"""
+    found = []
+    if plan.get('Node Type') == 'Seq Scan':
+        found.append(plan.get('Relation Name'))
+    for child in plan.get('Plans', []):
+        found.extend(seq_scans(child))
+    return found
+
+
+def check_plans(conn):
+    """Return {query name: [relations still seq-scanned]} for failing hot queries"""
+    failures = {}
+    with conn.cursor() as cursor:
+        # With seq scans priced out the planner only picks one when no index
+        # can serve the query, so the result does not depend on table size
+        cursor.execute("SET LOCAL enable_seqscan = off")
+        for name, sql, params in HOT_QUERIES:
+            cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            scanned = seq_scans(plan[0]['Plan'])
+            if scanned:
+                failures[name] = scanned
+    conn.rollback()
+    return failures
+
+
+if __name__ == '__main__':
+    conn = psycopg2.connect(**DB_SETTINGS)
+    try:
+        if '--check' in sys.argv:
+            failures = check_plans(conn)
+            for name, relations in failures.items():
+                print(f"{name}: sequential scan on {', '.join(relations)}")
+            if failures:
+                sys.exit(1)
+            print(f"All {len(HOT_QUERIES)} hot queries can use an index")
+        elif '--rebuild' in sys.argv:
+            rebuild(conn)
+            print("Dashboard and price rollups rebuilt")
+        else:
+            applied = migrate(conn)
+            print(f"Applied migrations: {', '.join(applied) or 'none'}")
+    finally:
+        conn.close()
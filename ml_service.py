@@ -1,34 +1,189 @@
+import time
+_module_started = time.perf_counter()
+startup_phases = {}
+
+# Only lightweight imports at module load; pandas, sklearn, TextBlob and
+# NLTK are loaded on first use through `resources` below
 from flask import Flask, request, jsonify
-import pandas as pd
-import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.cluster import KMeans
-from sklearn.linear_model import LinearRegression
-from textblob import TextBlob
-import nltk
-from nltk.sentiment import SentimentIntensityAnalyzer
-import psycopg2
-import json
-from datetime import datetime, timedelta
-import re
-import requests
-from bs4 import BeautifulSoup
+from psycopg2.extras import execute_values
+from sentiment_cache import SentimentCache, normalize_text, text_key
+from lazy_loader import LazyResources
+from process_runtime import ProcessRuntime, RuntimeRejected
+from db import ConnectionPool
+import metrics
+import ml_workers
+import os
 import warnings
 warnings.filterwarnings('ignore')
+startup_phases['imports'] = round(time.perf_counter() - _module_started, 4)
 
 app = Flask(__name__)
 
-# Database connection
-def get_db_connection():
-    return psycopg2.connect(
-        host="localhost",
-        database="product_research",
-        user="postgres",
-        password="your_password"  # Replace with your PostgreSQL password
+# Pooled database connections (settings in db.DB_SETTINGS)
+db_pool = ConnectionPool(
+    name='ml_service',
+    maxconn=int(os.environ.get('ML_DB_POOL_SIZE', 10))
+)
+
+# Request latency per route, SQL timing and pool counters on /metrics
+metrics.instrument_app(app, 'ml_service')
+metrics.register_pool(db_pool)
+
+# Heavy dependencies, built on first use or by /warmup
+resources = LazyResources()
+
+# Optional transformer sentiment backend (CPU only). The default backend is
+# set by SENTIMENT_BACKEND and can be overridden per request
+SENTIMENT_BACKENDS = ('lexicon', 'transformer')
+DEFAULT_SENTIMENT_BACKEND = os.environ.get('SENTIMENT_BACKEND', 'lexicon')
+TRANSFORMER_MODEL = os.environ.get('TRANSFORMER_MODEL', 'distilbert-base-uncased-finetuned-sst-2-english')
+TRANSFORMER_TIMEOUT = float(os.environ.get('TRANSFORMER_TIMEOUT', 30))
+
+def load_transformer_sentiment():
+    from transformer_sentiment import TransformerSentiment, MicroBatcher
+    engine = TransformerSentiment(
+        TRANSFORMER_MODEL,
+        num_threads=int(os.environ.get('TRANSFORMER_THREADS', 0)) or None,
+        quantize=os.environ.get('TRANSFORMER_QUANTIZE', '0') == '1'
+    )
+    batcher = MicroBatcher(
+        engine.predict,
+        max_batch_size=int(os.environ.get('TRANSFORMER_BATCH_SIZE', 32)),
+        max_wait_ms=float(os.environ.get('TRANSFORMER_BATCH_WAIT_MS', 10))
     )
+    return engine, batcher
+
+def load_feature_model():
+    # Corpus-wide TF-IDF model for /extract_features; set FEATURE_MODEL_PATH
+    # to persist the vocabulary and document frequencies
+    from feature_model import IncrementalTfidf
+    return IncrementalTfidf(path=os.environ.get('FEATURE_MODEL_PATH') or None)
+
+def load_price_forecast():
+    from price_forecast import forecast_price_trends
+    return forecast_price_trends
+
+def load_linear_regression():
+    import pandas as pd
+    from sklearn.linear_model import LinearRegression
+    return pd, LinearRegression
+
+resources.register('transformer_sentiment', load_transformer_sentiment)
+resources.register('feature_model', load_feature_model)
+resources.register('price_forecast', load_price_forecast)
+resources.register('linear_regression', load_linear_regression)
+
+# Process pools for CPU-bound work (lexicon sentiment, clustering), so one
+# slow request cannot stall the others behind the GIL. Each lane has its own
+# bounded queue; 0 workers runs the lane inline. Workers are spawned on
+# first use or by /warmup and preload their models when they start.
+runtime = ProcessRuntime()
+runtime.add_lane(
+    'sentiment',
+    workers=int(os.environ.get('ML_SENTIMENT_WORKERS', max(1, (os.cpu_count() or 2) - 1))),
+    max_queue=int(os.environ.get('ML_SENTIMENT_QUEUE', 64)),
+    timeout=float(os.environ.get('ML_SENTIMENT_TIMEOUT', 30)),
+    initializer=ml_workers.init_worker,
+    initargs=(['sentiment'],)
+)
+# One clustering worker by default: the per-category cache lives in the worker
+runtime.add_lane(
+    'clustering',
+    workers=int(os.environ.get('ML_CLUSTER_WORKERS', 1)),
+    max_queue=int(os.environ.get('ML_CLUSTER_QUEUE', 16)),
+    timeout=float(os.environ.get('ML_CLUSTER_TIMEOUT', 120)),
+    initializer=ml_workers.init_worker,
+    initargs=(['cluster_index'],)
+)
+
+def runtime_gauges():
+    fields = ['pending', 'submitted', 'completed', 'rejected', 'timeouts', 'restarts']
+    return {
+        (lane, field): stats[field]
+        for lane, stats in runtime.stats().items()
+        for field in fields if field in stats
+    }
 
-# Initialize sentiment analyzer
-sia = SentimentIntensityAnalyzer()
+metrics.REGISTRY.gauge_function('ml_runtime_lane', 'Process pool lane counters', ['lane', 'field'], runtime_gauges)
+
+# Texts per sentiment task sent to a worker
+SENTIMENT_CHUNK_SIZE = 250
+
+# Upper bound on texts accepted by /analyze_sentiment_batch
+MAX_SENTIMENT_BATCH = 10000
+
+# Sentiment cache keyed on a hash of the normalized text; set
+# SENTIMENT_CACHE_PATH to keep results across restarts
+sentiment_cache = SentimentCache(
+    max_entries=int(os.environ.get('SENTIMENT_CACHE_SIZE', 50000)),
+    disk_path=os.environ.get('SENTIMENT_CACHE_PATH') or None
+)
+
+def sentiment_key(normalized, backend):
+    if backend == 'transformer':
+        # Results depend on the model, so it is part of the key
+        return text_key(f'transformer:{TRANSFORMER_MODEL}:{normalized}')
+    return text_key(normalized)
+
+def compute_sentiment_many(texts, backend):
+    if backend == 'transformer':
+        # Queue every text on the micro-batcher so they share model batches
+        # with concurrent single-text requests
+        _, batcher = resources.get('transformer_sentiment')
+        futures = [batcher.submit(text) for text in texts]
+        return [future.result(timeout=TRANSFORMER_TIMEOUT) for future in futures]
+    
+    # The lexicon analyzers have no batch API; the batch is split into
+    # chunks scored in parallel by the sentiment workers instead
+    chunk_size = max(1, min(SENTIMENT_CHUNK_SIZE, -(-len(texts) // runtime.workers('sentiment'))))
+    chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+    return [result for chunk in runtime.map('sentiment', ml_workers.score_texts, chunks) for result in chunk]
+
+def score_sentiment(text, backend=None):
+    return score_sentiment_batch([text], backend)[0]
+
+def score_sentiment_batch(texts, backend=None):
+    backend = backend or DEFAULT_SENTIMENT_BACKEND
+    normalized_texts = [normalize_text(text) for text in texts]
+    
+    # Score each distinct uncached text once; duplicates in the batch share the result
+    scored = {}
+    misses = []
+    for normalized in dict.fromkeys(normalized_texts):
+        result = sentiment_cache.get(sentiment_key(normalized, backend))
+        if result is None:
+            misses.append(normalized)
+        else:
+            scored[normalized] = result
+    
+    if misses:
+        results = compute_sentiment_many(misses, backend)
+        # One disk transaction for every miss in the batch
+        sentiment_cache.put_many(
+            (sentiment_key(normalized, backend), result) for normalized, result in zip(misses, results)
+        )
+        scored.update(zip(misses, results))
+    
+    return [scored[normalized] for normalized in normalized_texts]
+
+def get_sentiment_backend(data):
+    backend = data.get('backend') or DEFAULT_SENTIMENT_BACKEND
+    if backend not in SENTIMENT_BACKENDS:
+        raise ValueError(f'Unknown sentiment backend: {backend}')
+    return backend
+
+def get_product_ids(data):
+    """`product_ids` of a request body as a list of distinct ints, or None if absent"""
+    product_ids = data.get('product_ids')
+    if product_ids is None:
+        return None
+    if not isinstance(product_ids, list):
+        raise ValueError('product_ids must be a list')
+    try:
+        # ids arrive as strings from n8n; an int column cannot be compared with text[]
+        return list(dict.fromkeys(int(product_id) for product_id in product_ids))
+    except (TypeError, ValueError):
+        raise ValueError('product_ids must be integers')
 
 @app.route('/analyze_sentiment', methods=['POST'])
 def analyze_sentiment():
@@ -36,32 +191,67 @@ def analyze_sentiment():
         data = request.json
         text = data.get('text', '')
         
-        # TextBlob sentiment
-        blob = TextBlob(text)
-        polarity = blob.sentiment.polarity
+        try:
+            backend = get_sentiment_backend(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        # NLTK VADER sentiment
-        vader_scores = sia.polarity_scores(text)
+        return jsonify(score_sentiment(text, backend))
+    except RuntimeRejected as e:
+        return jsonify({'error': str(e)}), e.status_code
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/analyze_sentiment_batch', methods=['POST'])
+def analyze_sentiment_batch():
+    try:
+        data = request.json
+        texts = data.get('texts', [])
         
-        # Combined sentiment score
-        combined_score = (polarity + vader_scores['compound']) / 2
+        if not isinstance(texts, list):
+            return jsonify({'error': 'texts must be a list'}), 400
         
-        # Determine sentiment label
-        if combined_score > 0.1:
-            sentiment = 'positive'
-        elif combined_score < -0.1:
-            sentiment = 'negative'
-        else:
-            sentiment = 'neutral'
+        try:
+            backend = get_sentiment_backend(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        return jsonify({
-            'sentiment_score': round(combined_score, 2),
-            'sentiment_label': sentiment,
-            'confidence': abs(combined_score)
-        })
+        if len(texts) > MAX_SENTIMENT_BATCH:
+            return jsonify({'error': f'At most {MAX_SENTIMENT_BATCH} texts per batch'}), 413
+        
+        texts = [text if isinstance(text, str) else '' for text in texts]
+        
+        return jsonify({'results': score_sentiment_batch(texts, backend)})
+    except RuntimeRejected as e:
+        return jsonify({'error': str(e)}), e.status_code
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/sentiment_cache/stats', methods=['GET'])
+def sentiment_cache_stats():
+    return jsonify(sentiment_cache.stats())
+
+@app.route('/sentiment_backend/stats', methods=['GET'])
+def sentiment_backend_stats():
+    stats = {
+        'default_backend': DEFAULT_SENTIMENT_BACKEND,
+        'transformer_model': TRANSFORMER_MODEL,
+        'transformer_loaded': resources.loaded('transformer_sentiment')
+    }
+    if stats['transformer_loaded']:
+        engine, batcher = resources.get('transformer_sentiment')
+        stats.update({
+            'threads': engine.num_threads,
+            'quantized': engine.quantize,
+            'micro_batching': batcher.stats()
+        })
+    return jsonify(stats)
+
+@app.route('/sentiment_cache/clear', methods=['POST'])
+def sentiment_cache_clear():
+    sentiment_cache.clear()
+    return jsonify({'message': 'Sentiment cache cleared'})
+
 @app.route('/extract_features', methods=['POST'])
 def extract_features():
     try:
@@ -71,52 +261,79 @@ def extract_features():
         if not reviews:
             return jsonify({'features': []})
         
-        # Combine all reviews
-        all_text = ' '.join(reviews)
-        
-        # Extract features using TF-IDF
-        vectorizer = TfidfVectorizer(
-            max_features=20,
-            stop_words='english',
-            ngram_range=(1, 2)
-        )
+        feature_model = resources.get('feature_model')
         
-        tfidf_matrix = vectorizer.fit_transform([all_text])
-        feature_names = vectorizer.get_feature_names_out()
-        scores = tfidf_matrix.toarray()[0]
+        # Each review is a document in the corpus-wide model
+        if data.get('update_model', True):
+            feature_model.update(reviews)
         
-        # Get top features
-        feature_scores = list(zip(feature_names, scores))
-        feature_scores.sort(key=lambda x: x[1], reverse=True)
+        # Score this product's terms against the corpus IDF
+        feature_scores = feature_model.top_features(reviews, top_n=10)
         
         return jsonify({
-            'features': [{'feature': f[0], 'score': round(f[1], 3)} for f in feature_scores[:10]]
+            'features': [{'feature': f[0], 'score': round(f[1], 3)} for f in feature_scores]
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/feature_model/rebuild', methods=['POST'])
+def rebuild_feature_model():
+    try:
+        feature_model = resources.get('feature_model')
+        
+        with db_pool.connection() as conn:
+            # Named cursor streams reviews instead of loading the table at once
+            cursor = conn.cursor(name='feature_model_reviews')
+            cursor.itersize = 5000
+            
+            cursor.execute("""
+                SELECT review_text 
+                FROM reviews 
+                WHERE review_text IS NOT NULL
+            """)
+            
+            feature_model.reset()
+            while True:
+                rows = cursor.fetchmany(5000)
+                if not rows:
+                    break
+                feature_model.update([r[0] for r in rows])
+            
+            cursor.close()
+            conn.rollback()
+        
+        feature_model.save()
+        
+        return jsonify(feature_model.stats())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/feature_model/stats', methods=['GET'])
+def feature_model_stats():
+    return jsonify(resources.get('feature_model').stats())
+
 @app.route('/predict_price_trend', methods=['POST'])
 def predict_price_trend():
     try:
         data = request.json
         product_id = data.get('product_id')
         
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Get price history
-        cursor.execute("""
-            SELECT price, recorded_at 
-            FROM price_history 
-            WHERE product_id = %s 
-            ORDER BY recorded_at
-        """, (product_id,))
-        
-        price_data = cursor.fetchall()
+        with db_pool.cursor() as cursor:
+            # Get price history
+            cursor.execute("""
+                SELECT price, recorded_at 
+                FROM price_history 
+                WHERE product_id = %s 
+                ORDER BY recorded_at
+            """, (product_id,))
+            
+            price_data = cursor.fetchall()
         
         if len(price_data) < 3:
             return jsonify({'trend': 'insufficient_data', 'prediction': None})
         
+        pd, LinearRegression = resources.get('linear_regression')
+        
         # Prepare data for prediction
         df = pd.DataFrame(price_data, columns=['price', 'date'])
         df['days'] = (df['date'] - df['date'].min()).dt.days
@@ -141,9 +358,6 @@ def predict_price_trend():
         else:
             trend = 'stable'
         
-        cursor.close()
-        conn.close()
-        
         return jsonify({
             'trend': trend,
             'prediction': round(predicted_price, 2),
@@ -152,136 +366,285 @@ def predict_price_trend():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/predict_price_trends', methods=['POST'])
+def predict_price_trends():
+    try:
+        data = request.json or {}
+        persist = data.get('persist', False)
+        
+        try:
+            product_ids = get_product_ids(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        with db_pool.cursor() as cursor:
+            # Load price history for every requested product in one pass
+            if product_ids:
+                cursor.execute("""
+                    SELECT product_id, price, recorded_at 
+                    FROM price_history 
+                    WHERE product_id = ANY(%s) AND price IS NOT NULL
+                    ORDER BY product_id, recorded_at
+                """, (product_ids,))
+            else:
+                cursor.execute("""
+                    SELECT product_id, price, recorded_at 
+                    FROM price_history 
+                    WHERE price IS NOT NULL
+                    ORDER BY product_id, recorded_at
+                """)
+            
+            forecast_price_trends = resources.get('price_forecast')
+            forecasts = forecast_price_trends(cursor.fetchall())
+            
+            for product_id in product_ids or []:
+                forecasts.setdefault(product_id, {'trend': 'insufficient_data', 'prediction': None})
+            
+            if persist:
+                # price_forecasts is created by migrations.py
+                rows = [
+                    (product_id, f['trend'], f['prediction'], f['slope'], f['confidence'])
+                    for product_id, f in forecasts.items() if f['prediction'] is not None
+                ]
+                
+                # A product whose history no longer supports a forecast loses
+                # its old one; a run over all products also drops the forecasts
+                # of products left without any price history
+                if product_ids:
+                    cursor.execute(
+                        "DELETE FROM price_forecasts WHERE product_id = ANY(%s)",
+                        ([product_id for product_id, f in forecasts.items() if f['prediction'] is None],)
+                    )
+                else:
+                    cursor.execute(
+                        "DELETE FROM price_forecasts WHERE product_id <> ALL(%s)",
+                        ([row[0] for row in rows],)
+                    )
+                execute_values(cursor, """
+                    INSERT INTO price_forecasts 
+                    (product_id, trend, predicted_price, slope, confidence, forecast_at)
+                    VALUES %s
+                    ON CONFLICT (product_id) DO UPDATE SET
+                    trend = EXCLUDED.trend,
+                    predicted_price = EXCLUDED.predicted_price,
+                    slope = EXCLUDED.slope,
+                    confidence = EXCLUDED.confidence,
+                    forecast_at = EXCLUDED.forecast_at
+                """, rows, template="(%s, %s, %s, %s, %s, NOW())", page_size=1000)
+        
+        return jsonify({
+            'forecasts': {str(product_id): f for product_id, f in forecasts.items()},
+            'count': len(forecasts)
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/cluster_products', methods=['POST'])
 def cluster_products():
     try:
         data = request.json
         category = data.get('category', '')
         
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Get products in category
-        cursor.execute("""
-            SELECT id, name, description, price 
-            FROM products 
-            WHERE category = %s AND description IS NOT NULL
-        """, (category,))
-        
-        products = cursor.fetchall()
-        
-        if len(products) < 3:
-            return jsonify({'clusters': []})
-        
-        # Prepare text data
-        df = pd.DataFrame(products, columns=['id', 'name', 'description', 'price'])
-        descriptions = df['description'].fillna('').tolist()
-        
-        # TF-IDF vectorization
-        vectorizer = TfidfVectorizer(max_features=100, stop_words='english')
-        tfidf_matrix = vectorizer.fit_transform(descriptions)
-        
-        # K-means clustering
-        n_clusters = min(5, len(products) // 2)
-        kmeans = KMeans(n_clusters=n_clusters, random_state=42)
-        clusters = kmeans.fit_predict(tfidf_matrix)
-        
-        # Group products by cluster
-        cluster_groups = {}
-        for i, cluster_id in enumerate(clusters):
-            if cluster_id not in cluster_groups:
-                cluster_groups[cluster_id] = []
-            cluster_groups[cluster_id].append({
-                'id': products[i][0],
-                'name': products[i][1],
-                'price': float(products[i][3]) if products[i][3] else 0
-            })
-        
-        cursor.close()
-        conn.close()
-        
-        return jsonify({'clusters': cluster_groups})
+        # Vectorizing and clustering run in the clustering worker
+        (cluster_groups, refreshed), telemetry = runtime.run('clustering', ml_workers.cluster_category, category)
+        metrics.record_remote(telemetry)
+        
+        return jsonify({'clusters': cluster_groups, 'refreshed_products': refreshed})
+    except RuntimeRejected as e:
+        return jsonify({'error': str(e)}), e.status_code
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/db/stats', methods=['GET'])
+def db_stats():
+    return jsonify(db_pool.stats())
+
+@app.route('/cluster_index/stats', methods=['GET'])
+def cluster_index_stats():
+    try:
+        return jsonify(runtime.run('clustering', ml_workers.cluster_index_stats))
+    except RuntimeRejected as e:
+        return jsonify({'error': str(e)}), e.status_code
+
+def build_insights(product_data, recent_reviews, positive_reviews, negative_reviews):
+    # product_data: (name, category, price, description, review_count, avg_rating, avg_sentiment)
+    insights = {
+        'product_name': product_data[0],
+        'category': product_data[1],
+        'price': float(product_data[2]) if product_data[2] else 0,
+        'review_count': product_data[4],
+        'avg_rating': round(float(product_data[5]), 2) if product_data[5] else 0,
+        'avg_sentiment': round(float(product_data[6]), 2) if product_data[6] else 0,
+        'insights': []
+    }
+    
+    # Add specific insights based on data
+    if product_data[4] > 100:
+        insights['insights'].append("High review volume indicates strong market presence")
+    
+    if product_data[5] and float(product_data[5]) > 4.0:
+        insights['insights'].append("Excellent customer satisfaction with high ratings")
+    elif product_data[5] and float(product_data[5]) < 3.0:
+        insights['insights'].append("Below average ratings suggest quality concerns")
+    
+    if product_data[6] and float(product_data[6]) > 0.3:
+        insights['insights'].append("Positive sentiment indicates customer satisfaction")
+    elif product_data[6] and float(product_data[6]) < -0.3:
+        insights['insights'].append("Negative sentiment indicates customer dissatisfaction")
+    
+    # Analyze review patterns
+    if recent_reviews:
+        if positive_reviews > negative_reviews * 2:
+            insights['insights'].append("Strong positive review momentum")
+        elif negative_reviews > positive_reviews:
+            insights['insights'].append("Concerning negative review trend")
+    
+    return insights
+
 @app.route('/generate_insights', methods=['POST'])
 def generate_insights():
     try:
         data = request.json
         product_id = data.get('product_id')
         
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Get product details
-        cursor.execute("""
-            SELECT p.name, p.category, p.price, p.description,
-                   COUNT(r.id) as review_count,
-                   AVG(r.rating) as avg_rating,
-                   AVG(r.sentiment_score) as avg_sentiment
-            FROM products p
-            LEFT JOIN reviews r ON p.id = r.product_id
-            WHERE p.id = %s
-            GROUP BY p.id, p.name, p.category, p.price, p.description
-        """, (product_id,))
-        
-        product_data = cursor.fetchone()
-        
-        if not product_data:
-            return jsonify({'error': 'Product not found'}), 404
-        
-        # Get recent reviews for analysis
-        cursor.execute("""
-            SELECT review_text, sentiment_label, rating
-            FROM reviews
-            WHERE product_id = %s
-            ORDER BY scraped_at DESC
-            LIMIT 50
-        """, (product_id,))
-        
-        reviews = cursor.fetchall()
-        
-        # Generate insights
-        insights = {
-            'product_name': product_data[0],
-            'category': product_data[1],
-            'price': float(product_data[2]) if product_data[2] else 0,
-            'review_count': product_data[4],
-            'avg_rating': round(float(product_data[5]), 2) if product_data[5] else 0,
-            'avg_sentiment': round(float(product_data[6]), 2) if product_data[6] else 0,
-            'insights': []
-        }
-        
-        # Add specific insights based on data
-        if product_data[4] > 100:
-            insights['insights'].append("High review volume indicates strong market presence")
-        
-        if product_data[5] and float(product_data[5]) > 4.0:
-            insights['insights'].append("Excellent customer satisfaction with high ratings")
-        elif product_data[5] and float(product_data[5]) < 3.0:
-            insights['insights'].append("Below average ratings suggest quality concerns")
-        
-        if product_data[6] and float(product_data[6]) > 0.3:
-            insights['insights'].append("Positive sentiment indicates customer satisfaction")
-        elif product_data[6] and float(product_data[6]) < -0.3:
-            insights['insights'].append("Negative sentiment indicates customer dissatisfaction")
-        
-        # Analyze review patterns
-        if reviews:
+        with db_pool.cursor() as cursor:
+            # Get product details
+            cursor.execute("""
+                SELECT p.name, p.category, p.price, p.description,
+                       COUNT(r.id) as review_count,
+                       AVG(r.rating) as avg_rating,
+                       AVG(r.sentiment_score) as avg_sentiment
+                FROM products p
+                LEFT JOIN reviews r ON p.id = r.product_id
+                WHERE p.id = %s
+                GROUP BY p.id, p.name, p.category, p.price, p.description
+            """, (product_id,))
+            
+            product_data = cursor.fetchone()
+            
+            if not product_data:
+                return jsonify({'error': 'Product not found'}), 404
+            
+            # Get recent reviews for analysis
+            cursor.execute("""
+                SELECT review_text, sentiment_label, rating
+                FROM reviews
+                WHERE product_id = %s
+                ORDER BY scraped_at DESC
+                LIMIT 50
+            """, (product_id,))
+            
+            reviews = cursor.fetchall()
+            
+            # Analyze review patterns
             positive_reviews = sum(1 for r in reviews if r[1] == 'positive')
             negative_reviews = sum(1 for r in reviews if r[1] == 'negative')
             
-            if positive_reviews > negative_reviews * 2:
-                insights['insights'].append("Strong positive review momentum")
-            elif negative_reviews > positive_reviews:
-                insights['insights'].append("Concerning negative review trend")
-        
-        cursor.close()
-        conn.close()
+            insights = build_insights(product_data, len(reviews), positive_reviews, negative_reviews)
         
         return jsonify(insights)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/generate_insights_batch', methods=['POST'])
+def generate_insights_batch():
+    try:
+        data = request.json
+        
+        try:
+            product_ids = get_product_ids(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if not product_ids:
+            return jsonify({'error': 'product_ids must be a non-empty list'}), 400
+        
+        with db_pool.cursor() as cursor:
+            # Product details and review aggregates for the whole set
+            cursor.execute("""
+                SELECT p.id, p.name, p.category, p.price, p.description,
+                       COUNT(r.id) as review_count,
+                       AVG(r.rating) as avg_rating,
+                       AVG(r.sentiment_score) as avg_sentiment
+                FROM products p
+                LEFT JOIN reviews r ON p.id = r.product_id
+                WHERE p.id = ANY(%s)
+                GROUP BY p.id, p.name, p.category, p.price, p.description
+            """, (product_ids,))
+            
+            products = cursor.fetchall()
+            
+            # Label counts over each product's 50 most recent reviews
+            cursor.execute("""
+                SELECT product_id,
+                       COUNT(*) as recent_reviews,
+                       COUNT(*) FILTER (WHERE sentiment_label = 'positive') as positive_reviews,
+                       COUNT(*) FILTER (WHERE sentiment_label = 'negative') as negative_reviews
+                FROM (
+                    SELECT product_id, sentiment_label,
+                           ROW_NUMBER() OVER (PARTITION BY product_id ORDER BY scraped_at DESC) as rn
+                    FROM reviews
+                    WHERE product_id = ANY(%s)
+                ) recent
+                WHERE rn <= 50
+                GROUP BY product_id
+            """, (product_ids,))
+            
+            label_counts = {row[0]: row[1:] for row in cursor.fetchall()}
+        
+        results = {}
+        for product in products:
+            recent_reviews, positive_reviews, negative_reviews = label_counts.get(product[0], (0, 0, 0))
+            results[product[0]] = build_insights(
+                product[1:], recent_reviews, positive_reviews, negative_reviews
+            )
+        
+        found = {product[0] for product in products}
+        missing = [product_id for product_id in product_ids if product_id not in found]
+        
+        return jsonify({'insights': results, 'missing': missing})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/warmup', methods=['POST'])
+def warmup():
+    try:
+        data = request.get_json(silent=True) or {}
+        names = data.get('resources')
+        if names is None:
+            # The transformer model is only preloaded when it is the default backend
+            names = [name for name in resources.report()
+                     if name != 'transformer_sentiment' or DEFAULT_SENTIMENT_BACKEND == 'transformer']
+        
+        unknown = [name for name in names or [] if name not in resources.report()]
+        if unknown:
+            return jsonify({'error': f'Unknown resources: {unknown}'}), 400
+        
+        loaded = resources.warm(names)
+        
+        # Spawn pool workers (they preload their own models); inline lanes
+        # load the same models in this process
+        runtime.start()
+        if runtime.inline:
+            ml_workers.warm_worker()
+        
+        return jsonify({'loaded': loaded, 'runtime': runtime.stats()})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/runtime/stats', methods=['GET'])
+def runtime_stats():
+    return jsonify(runtime.stats())
+
+@app.route('/startup_report', methods=['GET'])
+def startup_report():
+    return jsonify({
+        'module_load_seconds': startup_phases.get('total'),
+        'phases': startup_phases,
+        'resources': resources.report()
+    })
+
+startup_phases['total'] = round(time.perf_counter() - _module_started, 4)
+
 if __name__ == '__main__':
     app.run(host='127.0.0.1', port=5000, debug=True)
\ No newline at end of file
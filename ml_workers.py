@@ -0,0 +1,121 @@
+"""CPU-bound ml_service work, run inside the process pool workers.
+
+Each worker process keeps its own analyzers, cluster index and database
+pool; init_worker() preloads them when the worker starts. When a lane is
+configured with 0 workers these functions run inline in ml_service.
+
+Functions that query the database return (result, telemetry()); ml_service
+passes the telemetry to metrics.record_remote so the worker's SQL timings
+and pool counters show up on its /metrics.
+"""
+import os
+
+import metrics
+from db import ConnectionPool
+from lazy_loader import LazyResources
+
+resources = LazyResources()
+
+# Worker-local database connections, created on first use
+db_pool = ConnectionPool(
+    name='ml_worker',
+    maxconn=int(os.environ.get('ML_WORKER_DB_POOL_SIZE', 2))
+)
+
+def load_sentiment_analyzers():
+    from textblob.sentiments import PatternAnalyzer
+    from nltk.sentiment import SentimentIntensityAnalyzer
+    return PatternAnalyzer(), SentimentIntensityAnalyzer()
+
+def load_cluster_index():
+    # Per-category TF-IDF rows and cluster models for /cluster_products
+    from cluster_index import ClusterIndex
+    return ClusterIndex(max_features=100)
+
+resources.register('sentiment', load_sentiment_analyzers)
+resources.register('cluster_index', load_cluster_index)
+
+def init_worker(names=None):
+    """Process pool initializer: keep SQL timings for the parent, then preload"""
+    metrics.buffer_sql()
+    warm_worker(names)
+
+def telemetry():
+    return {'pid': os.getpid(), 'sql': metrics.take_sql_timings(), 'pool': db_pool.stats()}
+
+def warm_worker(names=None):
+    # A failed preload must not kill the pool; the error resurfaces on the
+    # first request that needs the resource
+    try:
+        resources.warm(names)
+    except Exception as e:
+        print(f"ml worker warm-up failed: {e}")
+
+def compute_sentiment(text):
+    return _score_text(text, *resources.get('sentiment'))
+
+def _score_text(text, pattern_analyzer, sia):
+    # TextBlob sentiment (same pattern lexicon TextBlob(text).sentiment uses,
+    # without building a TextBlob object per text)
+    polarity = pattern_analyzer.analyze(text).polarity
+
+    # NLTK VADER sentiment
+    vader_scores = sia.polarity_scores(text)
+
+    # Combined sentiment score
+    combined_score = (polarity + vader_scores['compound']) / 2
+
+    # Determine sentiment label
+    if combined_score > 0.1:
+        sentiment = 'positive'
+    elif combined_score < -0.1:
+        sentiment = 'negative'
+    else:
+        sentiment = 'neutral'
+
+    return {
+        'sentiment_score': round(combined_score, 2),
+        'sentiment_label': sentiment,
+        'confidence': abs(combined_score)
+    }
+
+def score_texts(texts):
+    # The pattern analyzer and VADER take one text per call, so a chunk is
+    # scored text by text with the analyzers looked up once
+    pattern_analyzer, sia = resources.get('sentiment')
+    return [_score_text(text, pattern_analyzer, sia) for text in texts]
+
+def _cluster_category(category):
+    with db_pool.cursor() as cursor:
+        # Get products in category; hashing descriptions in Postgres lets us
+        # spot changed products without transferring every description
+        cursor.execute("""
+            SELECT id, name, price, md5(description)
+            FROM products
+            WHERE category = %s AND description IS NOT NULL
+        """, (category,))
+
+        products = cursor.fetchall()
+
+        if len(products) < 3:
+            return [], 0
+
+        def load_descriptions(product_ids):
+            cursor.execute("""
+                SELECT id, description
+                FROM products
+                WHERE id = ANY(%s)
+            """, (list(product_ids),))
+            return dict(cursor.fetchall())
+
+        # Only new or changed descriptions are re-vectorized
+        cluster_index = resources.get('cluster_index')
+        return cluster_index.clusters(category, products, load_descriptions)
+
+def cluster_category(category):
+    # Telemetry is taken once the connection is back in the pool, so the
+    # commit is included and in_use is not counted
+    return _cluster_category(category), telemetry()
+
+def cluster_index_stats():
+    return resources.get('cluster_index').stats()
@@ -0,0 +1,149 @@
+"""On-disk conditional-GET cache for scraper_service.
+
+Every scraped URL gets a small JSON file holding the page's ETag,
+Last-Modified, a SHA-256 of the body and the record extracted from it.
+The next scrape of the URL sends If-None-Match / If-Modified-Since; a 304,
+or a 200 whose body hashes the same as before, returns the stored record
+without parsing the page again.
+
+Entries are keyed by (kind, variant, url). The variant names whatever the
+record depends on besides the page, such as the source profile and
+extractor version, so scraping a URL as another source or after an
+extractor change parses the page again.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+import metrics
+from fetch_engine import FetchError
+
+
+OUTCOMES = ['not_modified', 'unchanged', 'changed', 'miss']
+
+cache_lookups = metrics.REGISTRY.counter(
+    'scraper_page_cache_total', 'Page cache outcomes per scrape', ['kind', 'outcome'])
+cache_bytes_saved = metrics.REGISTRY.counter(
+    'scraper_page_cache_bytes_saved_total', 'Response bytes not downloaded thanks to a 304')
+
+
+def content_hash(body):
+    return hashlib.sha256(body).hexdigest()
+
+
+def write_json(path, data):
+    """Write-then-rename so a concurrent reader never sees half a file"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+
+
+class PageCache:
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._counts = {}
+        self._bytes_saved = 0
+
+    def _path(self, kind, variant, url):
+        key = hashlib.sha256(f"{kind}:{variant}:{url}".encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, kind, key[:2], key + '.json')
+
+    def get(self, kind, variant, url):
+        """Stored entry for (kind, variant, url) or None"""
+        try:
+            with open(self._path(kind, variant, url), encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # Two keys sharing a hash is practically impossible, but cheap to rule out
+        return entry if entry.get('url') == url and entry.get('variant') == variant else None
+
+    def conditional_headers(self, entry, headers):
+        """`headers` plus the validators of a stored entry"""
+        headers = dict(headers)
+        if entry:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def store(self, kind, variant, url, page, digest, record):
+        entry = {
+            'url': url,
+            'variant': variant,
+            'etag': page.header('ETag'),
+            'last_modified': page.header('Last-Modified'),
+            'content_hash': digest,
+            'size': len(page.body),
+            'record': record,
+            'stored_at': time.time()
+        }
+        write_json(self._path(kind, variant, url), entry)
+        return entry
+
+    def record(self, kind, outcome, bytes_saved=0):
+        with self._lock:
+            key = (kind, outcome)
+            self._counts[key] = self._counts.get(key, 0) + 1
+            self._bytes_saved += bytes_saved
+        cache_lookups.inc((kind, outcome))
+        if bytes_saved:
+            cache_bytes_saved.inc(amount=bytes_saved)
+
+    def extract(self, kind, variant, url, page, entry, parse, refetch=None):
+        """Record for a fetched page, reusing `entry` when the page has not changed.
+
+        Returns (record, outcome): not_modified (304), unchanged (same body
+        hash), changed (parsed, replaced a stale entry) or miss (parsed, no
+        entry before). `refetch()` fetches the page again without validators;
+        it is called when a 304 arrives with no entry to reuse.
+        """
+        if page.status == 304:
+            if entry:
+                self.record(kind, 'not_modified', entry.get('size', 0))
+                return entry['record'], 'not_modified'
+            # Nothing stored to reuse (evicted, or kept under another variant)
+            # and a 304 has no body to parse
+            if refetch is not None:
+                page = refetch()
+            if page.status == 304:
+                raise FetchError(f"304 Not Modified for {url} without a cached copy")
+        page.raise_for_status()
+
+        digest = content_hash(page.body)
+        if entry and entry.get('content_hash') == digest:
+            # Keep the newest validators so the next run can get a 304
+            if page.header('ETag') != entry.get('etag') or page.header('Last-Modified') != entry.get('last_modified'):
+                self.store(kind, variant, url, page, digest, entry['record'])
+            self.record(kind, 'unchanged')
+            return entry['record'], 'unchanged'
+
+        record = parse(page.body)
+        self.store(kind, variant, url, page, digest, record)
+        outcome = 'changed' if entry else 'miss'
+        self.record(kind, outcome)
+        return record, outcome
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._counts)
+            bytes_saved = self._bytes_saved
+        kinds = {}
+        for (kind, outcome), count in counts.items():
+            kinds.setdefault(kind, dict.fromkeys(OUTCOMES, 0))[outcome] = count
+        for kind, outcome_counts in kinds.items():
+            total = sum(outcome_counts.values())
+            reused = outcome_counts['not_modified'] + outcome_counts['unchanged']
+            outcome_counts['hit_rate'] = round(reused / total, 3) if total else 0.0
+        return {'directory': self.directory, 'bytes_saved': bytes_saved, 'kinds': kinds}
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+
+# Same thresholds as /predict_price_trend
+MIN_POINTS = 3
+FORECAST_DAYS = 30
+
+
+def forecast_price_trends(rows):
+    """Fit a price-vs-days line for every product at once.
+
+    `rows` are (product_id, price, recorded_at) tuples for any number of
+    products. Slopes and intercepts come from closed-form grouped least
+    squares, which gives the same line LinearRegression fits per product.
+    """
+    if not rows:
+        return {}
+
+    df = pd.DataFrame(rows, columns=['product_id', 'price', 'date'])
+    df['price'] = df['price'].astype(float)
+    df['date'] = pd.to_datetime(df['date'])
+    df['days'] = (df['date'] - df.groupby('product_id')['date'].transform('min')).dt.days
+
+    product_ids, group = np.unique(df['product_id'].values, return_inverse=True)
+    x = df['days'].values.astype(float)
+    y = df['price'].values
+
+    n = np.bincount(group).astype(float)
+    sum_x = np.bincount(group, weights=x)
+    sum_y = np.bincount(group, weights=y)
+    sum_xx = np.bincount(group, weights=x * x)
+    sum_xy = np.bincount(group, weights=x * y)
+    max_x = np.zeros(len(product_ids))
+    np.maximum.at(max_x, group, x)
+
+    denom = n * sum_xx - sum_x * sum_x
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = np.where(denom != 0, (n * sum_xy - sum_x * sum_y) / denom, 0.0)
+    intercept = (sum_y - slope * sum_x) / n
+    predicted = intercept + slope * (max_x + FORECAST_DAYS)
+
+    trend = np.where(slope > 0.1, 'increasing', np.where(slope < -0.1, 'decreasing', 'stable'))
+    confidence = np.minimum(0.95, np.abs(slope) * 10)
+
+    results = {}
+    for i, product_id in enumerate(product_ids.tolist()):
+        if n[i] < MIN_POINTS:
+            results[product_id] = {'trend': 'insufficient_data', 'prediction': None}
+            continue
+        results[product_id] = {
+            'trend': str(trend[i]),
+            'prediction': round(float(predicted[i]), 2),
+            'slope': round(float(slope[i]), 4),
+            'confidence': float(confidence[i])
+        }
+    return results
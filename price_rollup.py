@@ -0,0 +1,247 @@
+"""Per-product price history rolled up by day, week and month.
+
+`price_rollup` keeps min, max, sum, count and the latest price of every
+(product, resolution, bucket). Inserts into price_history are folded in by
+a statement-level trigger; updates and deletes recompute just the buckets
+they touch from the raw rows, since a min or max cannot be subtracted.
+Truncating price_history empties the rollup.
+
+read_history() serves a time range from the raw rows when they are few
+enough, otherwise from the finest rollup that fits in `max_points`.
+
+Run `python price_rollup.py` to install the trigger and rebuild the
+rollup from the existing rows. migrations.py installs it once; `python
+migrations.py --rebuild` rebuilds it.
+"""
+import psycopg2
+
+from db import DB_SETTINGS
+
+
+RESOLUTIONS = ['day', 'week', 'month']
+
+PRICE_ROLLUP_SCHEMA = """
+CREATE TABLE IF NOT EXISTS price_rollup (
+    product_id INTEGER NOT NULL,
+    resolution VARCHAR(5) NOT NULL,
+    bucket DATE NOT NULL,
+    min_price NUMERIC NOT NULL,
+    max_price NUMERIC NOT NULL,
+    price_sum NUMERIC NOT NULL,
+    price_count BIGINT NOT NULL,
+    last_price NUMERIC NOT NULL,
+    last_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (product_id, resolution, bucket)
+);
+
+CREATE OR REPLACE FUNCTION rollup_price_buckets() RETURNS trigger AS $$
+DECLARE
+    touched_ids INTEGER[];
+    touched_times TIMESTAMP[];
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO price_rollup AS pr
+            (product_id, resolution, bucket, min_price, max_price, price_sum, price_count, last_price, last_at)
+        SELECT n.product_id, res.resolution, DATE_TRUNC(res.resolution, n.recorded_at)::date,
+               MIN(n.price), MAX(n.price), SUM(n.price), COUNT(*),
+               (ARRAY_AGG(n.price ORDER BY n.recorded_at DESC, n.id DESC))[1], MAX(n.recorded_at)
+        FROM new_rows n
+        CROSS JOIN (VALUES ('day'), ('week'), ('month')) res(resolution)
+        WHERE n.product_id IS NOT NULL AND n.price IS NOT NULL AND n.recorded_at IS NOT NULL
+        GROUP BY 1, 2, 3
+        ON CONFLICT (product_id, resolution, bucket) DO UPDATE SET
+            min_price = LEAST(pr.min_price, EXCLUDED.min_price),
+            max_price = GREATEST(pr.max_price, EXCLUDED.max_price),
+            price_sum = pr.price_sum + EXCLUDED.price_sum,
+            price_count = pr.price_count + EXCLUDED.price_count,
+            last_price = CASE WHEN EXCLUDED.last_at >= pr.last_at
+                              THEN EXCLUDED.last_price ELSE pr.last_price END,
+            last_at = GREATEST(pr.last_at, EXCLUDED.last_at);
+        RETURN NULL;
+    END IF;
+
+    -- UPDATE or DELETE: recompute every bucket an old or new row falls in
+    SELECT ARRAY_AGG(product_id), ARRAY_AGG(recorded_at)
+    INTO touched_ids, touched_times
+    FROM old_rows;
+
+    IF TG_OP = 'UPDATE' THEN
+        SELECT touched_ids || ARRAY_AGG(product_id), touched_times || ARRAY_AGG(recorded_at)
+        INTO touched_ids, touched_times
+        FROM new_rows;
+    END IF;
+
+    DELETE FROM price_rollup pr
+    USING (
+        SELECT DISTINCT t.product_id, res.resolution, DATE_TRUNC(res.resolution, t.recorded_at)::date AS bucket
+        FROM UNNEST(touched_ids, touched_times) t(product_id, recorded_at)
+        CROSS JOIN (VALUES ('day'), ('week'), ('month')) res(resolution)
+    ) t
+    WHERE pr.product_id = t.product_id AND pr.resolution = t.resolution AND pr.bucket = t.bucket;
+
+    INSERT INTO price_rollup
+        (product_id, resolution, bucket, min_price, max_price, price_sum, price_count, last_price, last_at)
+    SELECT t.product_id, t.resolution, t.bucket,
+           MIN(ph.price), MAX(ph.price), SUM(ph.price), COUNT(*),
+           (ARRAY_AGG(ph.price ORDER BY ph.recorded_at DESC, ph.id DESC))[1], MAX(ph.recorded_at)
+    FROM (
+        SELECT DISTINCT t.product_id, res.resolution, DATE_TRUNC(res.resolution, t.recorded_at)::date AS bucket
+        FROM UNNEST(touched_ids, touched_times) t(product_id, recorded_at)
+        CROSS JOIN (VALUES ('day'), ('week'), ('month')) res(resolution)
+        WHERE t.product_id IS NOT NULL AND t.recorded_at IS NOT NULL
+    ) t
+    JOIN price_history ph
+      ON ph.product_id = t.product_id
+     AND ph.recorded_at >= t.bucket
+     AND ph.recorded_at < t.bucket + ('1 ' || t.resolution)::interval
+     AND ph.price IS NOT NULL
+    GROUP BY 1, 2, 3;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS price_history_buckets_insert ON price_history;
+DROP TRIGGER IF EXISTS price_history_buckets_update ON price_history;
+DROP TRIGGER IF EXISTS price_history_buckets_delete ON price_history;
+CREATE TRIGGER price_history_buckets_insert AFTER INSERT ON price_history
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_price_buckets();
+CREATE TRIGGER price_history_buckets_update AFTER UPDATE ON price_history
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_price_buckets();
+CREATE TRIGGER price_history_buckets_delete AFTER DELETE ON price_history
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_price_buckets();
+"""
+
+TRUNCATE_TRIGGER = """
+CREATE OR REPLACE FUNCTION clear_price_buckets() RETURNS trigger AS $$
+BEGIN
+    DELETE FROM price_rollup;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS price_history_buckets_truncate ON price_history;
+CREATE TRIGGER price_history_buckets_truncate AFTER TRUNCATE ON price_history
+    FOR EACH STATEMENT EXECUTE FUNCTION clear_price_buckets();
+"""
+
+# Writers are blocked while the rollup is recomputed from scratch
+REBUILD_SQL = """
+LOCK TABLE price_history IN SHARE MODE;
+
+TRUNCATE price_rollup;
+
+INSERT INTO price_rollup
+    (product_id, resolution, bucket, min_price, max_price, price_sum, price_count, last_price, last_at)
+SELECT ph.product_id, res.resolution, DATE_TRUNC(res.resolution, ph.recorded_at)::date,
+       MIN(ph.price), MAX(ph.price), SUM(ph.price), COUNT(*),
+       (ARRAY_AGG(ph.price ORDER BY ph.recorded_at DESC, ph.id DESC))[1], MAX(ph.recorded_at)
+FROM price_history ph
+CROSS JOIN (VALUES ('day'), ('week'), ('month')) res(resolution)
+WHERE ph.product_id IS NOT NULL AND ph.price IS NOT NULL AND ph.recorded_at IS NOT NULL
+GROUP BY 1, 2, 3;
+"""
+
+
+def install(cursor):
+    cursor.execute(PRICE_ROLLUP_SCHEMA)
+    install_truncate_trigger(cursor)
+    rebuild(cursor)
+
+
+def install_truncate_trigger(cursor):
+    cursor.execute(TRUNCATE_TRIGGER)
+
+
+def rebuild(cursor):
+    cursor.execute(REBUILD_SQL)
+
+
+def _value(row, index, key):
+    return row[key] if isinstance(row, dict) else row[index]
+
+
+def choose_resolution(cursor, product_id, start, end, max_points, allow_raw=True):
+    """Finest resolution whose point count in [start, end] fits in max_points"""
+    cursor.execute("""
+        SELECT resolution, COUNT(*) AS buckets, SUM(price_count) AS prices
+        FROM price_rollup
+        WHERE product_id = %s
+          AND bucket >= DATE_TRUNC(resolution, %s::timestamp)::date
+          AND bucket <= %s
+        GROUP BY resolution
+    """, (product_id, start, end))
+    counts = {_value(row, 0, 'resolution'): row for row in cursor.fetchall()}
+
+    day = counts.get('day')
+    if allow_raw and (day is None or _value(day, 2, 'prices') <= max_points):
+        return 'raw'
+    for resolution in RESOLUTIONS:
+        row = counts.get(resolution)
+        if row is not None and _value(row, 1, 'buckets') <= max_points:
+            return resolution
+    return RESOLUTIONS[-1]
+
+
+def read_history(cursor, product_id, start, end, resolution='auto', max_points=500):
+    """Price points for one product between start and end (datetimes).
+
+    Returns (resolution used, points). Raw points are {'t', 'price'};
+    bucketed points also carry min, max, avg and the number of prices.
+    Buckets are whole days/weeks/months, so the first and last may reach
+    outside the range. Raw points never exceed max_points: a range holding
+    more prices is served from the finest rollup that fits instead.
+    """
+    if resolution == 'auto':
+        resolution = choose_resolution(cursor, product_id, start, end, max_points)
+
+    if resolution == 'raw':
+        cursor.execute("""
+            SELECT recorded_at, price
+            FROM price_history
+            WHERE product_id = %s AND recorded_at >= %s AND recorded_at <= %s
+              AND price IS NOT NULL
+            ORDER BY recorded_at
+            LIMIT %s
+        """, (product_id, start, end, max_points + 1))
+        rows = cursor.fetchall()
+        if len(rows) <= max_points:
+            return resolution, [
+                {'t': _value(row, 0, 'recorded_at').isoformat(), 'price': float(_value(row, 1, 'price'))}
+                for row in rows
+            ]
+        resolution = choose_resolution(cursor, product_id, start, end, max_points, allow_raw=False)
+
+    cursor.execute("""
+        SELECT bucket, min_price, max_price, price_sum / price_count AS avg_price,
+               last_price, price_count
+        FROM price_rollup
+        WHERE product_id = %s AND resolution = %s
+          AND bucket >= DATE_TRUNC(%s, %s::timestamp)::date
+          AND bucket <= %s
+        ORDER BY bucket
+    """, (product_id, resolution, resolution, start, end))
+    return resolution, [
+        {
+            't': _value(row, 0, 'bucket').isoformat(),
+            'min': float(_value(row, 1, 'min_price')),
+            'max': float(_value(row, 2, 'max_price')),
+            'avg': float(_value(row, 3, 'avg_price')),
+            'last': float(_value(row, 4, 'last_price')),
+            'count': _value(row, 5, 'price_count')
+        }
+        for row in cursor.fetchall()
+    ]
+
+
+if __name__ == '__main__':
+    conn = psycopg2.connect(**DB_SETTINGS)
+    try:
+        with conn.cursor() as cursor:
+            install(cursor)
+        conn.commit()
+        print("Price rollups installed and rebuilt")
+    finally:
+        conn.close()
@@ -0,0 +1,220 @@
+import multiprocessing
+import threading
+import weakref
+from concurrent.futures import CancelledError, ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+
+class RuntimeRejected(Exception):
+    status_code = 503
+
+
+class RuntimeBusy(RuntimeRejected):
+    """The lane's queue is full; the client should retry later"""
+    status_code = 429
+
+
+class RuntimeUnavailable(RuntimeRejected):
+    """The task timed out or the worker pool died"""
+    status_code = 503
+
+
+class Lane:
+    """One process pool with its own bounded queue, used by one group of endpoints"""
+
+    def __init__(self, name, workers, max_queue, timeout, initializer=None, initargs=()):
+        self.name = name
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.initializer = initializer
+        self.initargs = initargs
+        # Running plus queued tasks; a slot is freed when the task finishes,
+        # even if the caller already gave up on it
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._lock = threading.Lock()
+        self._executor = None
+        # Unfinished futures and the executor running them; each one holds a slot
+        self._outstanding = {}
+        # Executor of every future still referenced, to tell which pool failed
+        self._owners = weakref.WeakKeyDictionary()
+        self.submitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.restarts = 0
+        self.pending = 0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn: workers never inherit locks held by Flask threads
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=self.initializer,
+                    initargs=self.initargs
+                )
+            return self._executor
+
+    def _restart(self, executor=None, kill=False):
+        """Replace the pool and free the slots of every task it was running.
+
+        `executor` is the pool the failure was seen on; if it has already
+        been replaced there is nothing to do. With `kill` the worker
+        processes are terminated, which is the only way to stop a task that
+        is already running.
+        """
+        with self._lock:
+            old = self._executor
+            if old is None or (executor is not None and executor is not old):
+                return
+            self._executor = None
+            self.restarts += 1
+            orphaned = [future for future, owner in self._outstanding.items() if owner is old]
+            for future in orphaned:
+                del self._outstanding[future]
+            self.pending -= len(orphaned)
+
+        processes = list((getattr(old, '_processes', None) or {}).values())
+        old.shutdown(wait=False, cancel_futures=True)
+        if kill:
+            for process in processes:
+                process.terminate()
+        for _ in orphaned:
+            self._slots.release()
+
+    def _release(self, future):
+        with self._lock:
+            # Slots of tasks orphaned by a restart were already freed
+            if self._outstanding.pop(future, None) is None:
+                return
+            self.pending -= 1
+            self.completed += 1
+        self._slots.release()
+
+    def submit(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise RuntimeBusy(f"'{self.name}' workers are busy, retry later")
+
+        executor = self._get_executor()
+        try:
+            future = executor.submit(fn, *args)
+        except BrokenProcessPool:
+            self._slots.release()
+            self._restart(executor)
+            raise RuntimeUnavailable(f"'{self.name}' worker pool restarted, retry later")
+
+        with self._lock:
+            self.submitted += 1
+            self.pending += 1
+            self._outstanding[future] = executor
+            self._owners[future] = executor
+        future.add_done_callback(self._release)
+        return future
+
+    def result(self, future):
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            with self._lock:
+                self.timeouts += 1
+                executor = self._owners.get(future)
+            # cancel() cannot stop a running task: kill the pool it runs in
+            # (other tasks in flight there fail with BrokenProcessPool) and
+            # start a fresh one
+            if not future.cancel() and executor is not None:
+                self._restart(executor, kill=True)
+            raise RuntimeUnavailable(f"'{self.name}' task timed out after {self.timeout}s")
+        except BrokenProcessPool:
+            with self._lock:
+                executor = self._owners.get(future)
+            if executor is not None:
+                self._restart(executor)
+            raise RuntimeUnavailable(f"'{self.name}' worker pool crashed, retry later")
+        except CancelledError:
+            # Still queued when another task's timeout restarted the pool
+            raise RuntimeUnavailable(f"'{self.name}' worker pool restarted, retry later")
+
+    def start(self):
+        # Spawn every worker now so model preloading happens before traffic
+        executor = self._get_executor()
+        futures = [executor.submit(_noop) for _ in range(self.workers)]
+        for future in futures:
+            future.result(timeout=self.timeout)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'max_queue': self.max_queue,
+                'timeout': self.timeout,
+                'started': self._executor is not None,
+                'pending': self.pending,
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'timeouts': self.timeouts,
+                'restarts': self.restarts
+            }
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+def _noop():
+    return None
+
+
+class ProcessRuntime:
+    """Runs CPU-bound work in per-lane process pools.
+
+    A lane configured with 0 workers runs its functions inline in the
+    calling thread, which keeps single-process setups and debugging simple.
+    """
+
+    def __init__(self):
+        self.lanes = {}
+        self.inline = {}
+
+    def add_lane(self, name, workers, max_queue=64, timeout=30, initializer=None, initargs=()):
+        if workers <= 0:
+            self.inline[name] = True
+            return
+        self.lanes[name] = Lane(name, workers, max_queue, timeout, initializer, initargs)
+
+    def run(self, lane, fn, *args):
+        if lane in self.inline:
+            return fn(*args)
+        pool = self.lanes[lane]
+        return pool.result(pool.submit(fn, *args))
+
+    def map(self, lane, fn, chunks):
+        """Run fn over several argument chunks in parallel, preserving order"""
+        if lane in self.inline:
+            return [fn(chunk) for chunk in chunks]
+        pool = self.lanes[lane]
+        futures = [pool.submit(fn, chunk) for chunk in chunks]
+        return [pool.result(future) for future in futures]
+
+    def workers(self, lane):
+        return self.lanes[lane].workers if lane in self.lanes else 1
+
+    def start(self, names=None):
+        for name in names or list(self.lanes):
+            if name in self.lanes:
+                self.lanes[name].start()
+
+    def stats(self):
+        stats = {name: lane.stats() for name, lane in self.lanes.items()}
+        stats.update({name: {'workers': 0, 'inline': True} for name in self.inline})
+        return stats
+
+    def shutdown(self):
+        for lane in self.lanes.values():
+            lane.shutdown()
@@ -0,0 +1,236 @@
+"""Bulk product loading for /api/products/bulk.
+
+Rows arrive as NDJSON or CSV and are upserted on (source, source_id) with
+one multi-row INSERT per batch, and each batch is committed as soon as it
+is written so a large load never holds one long transaction. A batch runs
+under a savepoint: if it fails, its rows are retried one at a time, each
+under its own savepoint, so a bad row is reported instead of aborting the
+whole load. Lines that are not valid UTF-8 are reported the same way.
+
+Run `python product_ingest.py` once to add the source columns and the
+unique index the upsert relies on.
+"""
+import csv
+import io
+import json
+from decimal import Decimal, InvalidOperation
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+from db import DB_SETTINGS
+
+
+PRODUCT_FIELDS = ['name', 'brand', 'category', 'price', 'url', 'image_url', 'description', 'source', 'source_id']
+
+INGEST_SCHEMA = """
+ALTER TABLE products ADD COLUMN IF NOT EXISTS source VARCHAR(100);
+ALTER TABLE products ADD COLUMN IF NOT EXISTS source_id VARCHAR(200);
+CREATE UNIQUE INDEX IF NOT EXISTS products_source_key ON products (source, source_id);
+"""
+
+UPSERT_SQL = """
+    INSERT INTO products (name, brand, category, price, url, image_url, description, source, source_id)
+    VALUES %s
+    ON CONFLICT (source, source_id) DO UPDATE SET
+        name = EXCLUDED.name,
+        brand = COALESCE(EXCLUDED.brand, products.brand),
+        category = COALESCE(EXCLUDED.category, products.category),
+        price = COALESCE(EXCLUDED.price, products.price),
+        url = COALESCE(EXCLUDED.url, products.url),
+        image_url = COALESCE(EXCLUDED.image_url, products.image_url),
+        description = COALESCE(EXCLUDED.description, products.description),
+        updated_at = NOW()
+    RETURNING (xmax = 0) AS inserted
+"""
+
+
+def install(cursor):
+    cursor.execute(INGEST_SCHEMA)
+
+
+def is_utf8(text):
+    """False if `text` was decoded with errors='surrogateescape' from bytes that are not UTF-8"""
+    try:
+        text.encode('utf-8')
+    except UnicodeEncodeError:
+        return False
+    return True
+
+
+def read_ndjson(stream):
+    """Yield (line number, row or error message) from a binary NDJSON stream"""
+    lines = io.TextIOWrapper(stream, encoding='utf-8', errors='surrogateescape')
+    for line_no, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        if not is_utf8(line):
+            yield line_no, "invalid UTF-8"
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_no, f"invalid JSON: {e}"
+            continue
+        if not isinstance(row, dict):
+            yield line_no, "expected a JSON object"
+            continue
+        yield line_no, row
+
+
+def read_csv(stream):
+    """Yield (line number, row or error message) from a binary CSV stream with a header row"""
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8', errors='surrogateescape', newline=''))
+    for row in reader:
+        # Line of the record's last physical line, 1-based with the header as line 1
+        if not all(is_utf8(value) for value in row.values() if isinstance(value, str)):
+            yield reader.line_num, "invalid UTF-8"
+            continue
+        yield reader.line_num, {key: value for key, value in row.items() if key and value != ''}
+
+
+def clean_row(row):
+    """Return the INSERT tuple for a row, or raise ValueError"""
+    name = row.get('name')
+    if not name or not str(name).strip():
+        raise ValueError("name is required")
+
+    price = row.get('price')
+    if price is not None and price != '':
+        try:
+            price = Decimal(str(price).replace(',', ''))
+        except InvalidOperation:
+            raise ValueError(f"invalid price: {row.get('price')!r}")
+        if not price.is_finite() or price < 0:
+            raise ValueError(f"invalid price: {row.get('price')!r}")
+    else:
+        price = None
+
+    values = {field: row.get(field) for field in PRODUCT_FIELDS}
+    values['name'] = str(name).strip()
+    values['price'] = price
+    for field in ('source', 'source_id'):
+        if values[field] is not None:
+            values[field] = str(values[field])
+
+    if (values['source'] is None) != (values['source_id'] is None):
+        raise ValueError("source and source_id must be given together")
+
+    return tuple(values[field] for field in PRODUCT_FIELDS)
+
+
+class BulkLoader:
+    """Accumulates parsed rows and upserts them in batches on one connection.
+
+    Every flush commits, so rows of earlier batches stay written if a later
+    part of the load fails.
+    """
+
+    def __init__(self, conn, batch_size=1000, max_errors=100):
+        self.conn = conn
+        self.batch_size = batch_size
+        self.max_errors = max_errors
+        self.batch = []
+        self.received = 0
+        self.inserted = 0
+        self.updated = 0
+        self.duplicates = 0
+        self.failed = 0
+        self.errors = []
+
+    def add(self, line_no, row):
+        self.received += 1
+        if isinstance(row, str):
+            self._error(line_no, row)
+            return
+        try:
+            values = clean_row(row)
+        except ValueError as e:
+            self._error(line_no, str(e))
+            return
+
+        self.batch.append((line_no, values))
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.batch:
+            return
+        batch, self.batch = self._dedupe(self.batch), []
+
+        # Plain tuple cursor, whatever cursor_factory the pool uses
+        with self.conn.cursor(cursor_factory=psycopg2.extensions.cursor) as cursor:
+            cursor.execute("SAVEPOINT bulk_batch")
+            try:
+                inserted = execute_values(
+                    cursor, UPSERT_SQL, [values for _, values in batch],
+                    page_size=len(batch), fetch=True
+                )
+                cursor.execute("RELEASE SAVEPOINT bulk_batch")
+                self._count(inserted)
+            except psycopg2.Error:
+                cursor.execute("ROLLBACK TO SAVEPOINT bulk_batch")
+                cursor.execute("RELEASE SAVEPOINT bulk_batch")
+
+                # Isolate the failing rows
+                for line_no, values in batch:
+                    cursor.execute("SAVEPOINT bulk_row")
+                    try:
+                        inserted = execute_values(cursor, UPSERT_SQL, [values], fetch=True)
+                    except psycopg2.Error as e:
+                        cursor.execute("ROLLBACK TO SAVEPOINT bulk_row")
+                        self._error(line_no, (e.pgerror or str(e)).strip())
+                    else:
+                        self._count(inserted)
+                    cursor.execute("RELEASE SAVEPOINT bulk_row")
+        self.conn.commit()
+
+    def _dedupe(self, batch):
+        # ON CONFLICT cannot touch the same row twice in one statement, so
+        # only the last occurrence of a (source, source_id) pair is kept
+        source_index = PRODUCT_FIELDS.index('source')
+        keyed = {}
+        unkeyed = []
+        for line_no, values in batch:
+            key = values[source_index:source_index + 2]
+            if key[0] is None:
+                unkeyed.append((line_no, values))
+            else:
+                if key in keyed:
+                    # The earlier row never reaches the database
+                    self.duplicates += 1
+                keyed[key] = (line_no, values)
+        return unkeyed + list(keyed.values())
+
+    def _count(self, rows):
+        for (inserted,) in rows:
+            if inserted:
+                self.inserted += 1
+            else:
+                self.updated += 1
+
+    def _error(self, line_no, message):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'line': line_no, 'error': message})
+
+    def summary(self):
+        return {
+            'received': self.received,
+            'inserted': self.inserted,
+            'updated': self.updated,
+            'duplicates': self.duplicates,
+            'failed': self.failed,
+            'errors': self.errors
+        }
+
+
+if __name__ == '__main__':
+    conn = psycopg2.connect(**DB_SETTINGS)
+    try:
+        with conn.cursor() as cursor:
+            install(cursor)
+        conn.commit()
+        print("Product ingest index installed")
+    finally:
+        conn.close()
@@ -0,0 +1,127 @@
+import functools
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from flask import Response, make_response, request
+
+
+class CachedResponse:
+    def __init__(self, body, mimetype, etag, version, expires, headers=None):
+        self.body = body
+        self.mimetype = mimetype
+        self.headers = headers or {}
+        self.etag = etag
+        self.version = version
+        self.expires = expires
+
+
+class ResponseCache:
+    """Serialized-response cache with ETags for read-only Flask endpoints.
+
+    An entry is reused while the data version it was built under is still
+    current and its TTL has not run out. The version combines
+    `version_source()` (e.g. a database change counter, checked at most once
+    per `version_check_interval` seconds) with a local generation bumped by
+    invalidate(). Requests whose If-None-Match matches get a 304.
+    """
+
+    def __init__(self, version_source=None, ttl=30, version_check_interval=1.0, max_entries=1024):
+        self.version_source = version_source
+        self.ttl = ttl
+        self.version_check_interval = version_check_interval
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._source_version = None
+        self._source_checked = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def version(self):
+        now = time.monotonic()
+        if self.version_source and now - self._source_checked >= self.version_check_interval:
+            try:
+                self._source_version = self.version_source()
+            except Exception:
+                # No version available: entries then expire by TTL only
+                self._source_version = None
+            self._source_checked = now
+        return (self._source_version, self._generation)
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+        # Re-read the source version on the next request
+        self._source_checked = 0.0
+
+    def cached(self, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                key = request.full_path
+                version = self.version()
+                now = time.monotonic()
+
+                with self._lock:
+                    entry = self._entries.get(key)
+                    if entry is not None and (entry.version != version or entry.expires < now):
+                        entry = None
+                    if entry is not None:
+                        self._entries.move_to_end(key)
+                        self.hits += 1
+
+                if entry is None:
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+                    body = response.get_data()
+                    # Keep view-set headers such as pagination cursors
+                    headers = {
+                        name: value for name, value in response.headers.items()
+                        if name.lower() not in ('content-type', 'content-length')
+                    }
+                    entry = CachedResponse(
+                        body,
+                        response.mimetype,
+                        hashlib.sha1(body).hexdigest(),
+                        version,
+                        now + ttl,
+                        headers
+                    )
+                    with self._lock:
+                        self.misses += 1
+                        self._entries[key] = entry
+                        while len(self._entries) > self.max_entries:
+                            self._entries.popitem(last=False)
+
+                if request.if_none_match.contains(entry.etag):
+                    with self._lock:
+                        self.not_modified += 1
+                    response = Response(status=304)
+                else:
+                    response = Response(entry.body, mimetype=entry.mimetype)
+                response.headers.update(entry.headers)
+                response.set_etag(entry.etag)
+                # Let browsers keep the body but revalidate it on every request
+                response.headers['Cache-Control'] = 'no-cache'
+                return response
+            return wrapper
+        return decorator
+
+    def stats(self):
+        version = self.version()
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'not_modified': self.not_modified,
+                'version': list(version)
+            }
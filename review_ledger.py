@@ -0,0 +1,208 @@
+"""Per-product memory of scraped reviews for incremental /scrape_reviews runs.
+
+For every product key the ledger keeps a high-water mark (the hash of the
+newest review returned so far) and the hashes of the most recent
+`max_seen` reviews, in one JSON file under the page cache directory. A
+scan walks the review pages newest-first, skips reviews it has returned
+before and stops when it reaches the high-water mark or a streak of known
+reviews, so a run only pays for the pages with something new on them.
+
+A run cut short by max_reviews or max_pages leaves older reviews it never
+reached. It records the page to resume from, and the high-water mark stays
+where it was until a later run has walked that backlog down to it.
+
+A scan does not change the ledger by itself: its result is kept as a
+proposal and committed by ack() once the caller has stored the reviews.
+Until then the next scan starts from the last committed state and returns
+the same reviews again, so a failed save loses nothing.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+
+import metrics
+from page_cache import write_json
+
+
+reviews_scanned = metrics.REGISTRY.counter(
+    'scraper_reviews_total', 'Reviews read by incremental scans, new or already returned', ['outcome'])
+review_pages = metrics.REGISTRY.counter(
+    'scraper_review_pages_total', 'Review pages fetched by incremental scans')
+
+
+def review_hash(review):
+    """Identity of a review: reviewer and text, ignoring case and whitespace.
+
+    Dates and ratings are left out; sites render dates relative to now
+    ("2 days ago") and the same review would hash differently every run.
+    """
+    parts = [' '.join(str(review.get(field) or '').lower().split()) for field in ('reviewer_name', 'review_text')]
+    return hashlib.sha256('\x1f'.join(parts).encode('utf-8')).hexdigest()[:32]
+
+
+def empty_state(key):
+    return {'key': key, 'high_water': None, 'pending_high_water': None, 'resume': None, 'seen': []}
+
+
+class ReviewLedger:
+    def __init__(self, directory, max_seen=5000):
+        self.directory = directory
+        self.max_seen = max_seen
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    def _path(self, key):
+        name = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, 'reviews', name[:2], name + '.json')
+
+    def lock(self, key):
+        """Per-key lock so two scans of one product cannot both return the same reviews"""
+        with self._locks_lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def load(self, key):
+        """Last committed state of `key`, with any unacknowledged proposal under 'proposal'"""
+        try:
+            with open(self._path(key), encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = None
+        if not state or state.get('key') != key:
+            return empty_state(key)
+        # Files written before resume cursors existed
+        return dict(empty_state(key), **state)
+
+    def next_state(self, key, state, new_reviews, summary):
+        """State after a scan: returned reviews become known and, once no
+        backlog is left, the newest one becomes the high-water mark"""
+        new_hashes = [review['review_hash'] for review in new_reviews]
+        new_set = set(new_hashes)
+        seen = new_hashes + [digest for digest in state['seen'] if digest not in new_set]
+        newest = summary['newest'] or state['pending_high_water']
+        if summary['resume'] is None:
+            high_water, pending = newest or state['high_water'], None
+        else:
+            high_water, pending = state['high_water'], newest
+        return {
+            'key': key,
+            'high_water': high_water,
+            'pending_high_water': pending,
+            'resume': summary['resume'],
+            'seen': seen[:self.max_seen],
+            'updated_at': time.time()
+        }
+
+    def propose(self, key, state, new_reviews, summary):
+        """Keep a scan's result until it is acknowledged; returns the ack token.
+
+        A scan that returned nothing has nothing to lose and is committed
+        right away (None is returned).
+        """
+        proposed = self.next_state(key, state, new_reviews, summary)
+        if not new_reviews:
+            write_json(self._path(key), proposed)
+            return None
+        token = uuid.uuid4().hex
+        committed = {field: value for field, value in state.items() if field != 'proposal'}
+        write_json(self._path(key), dict(committed, proposal={'token': token, 'state': proposed}))
+        return token
+
+    def ack(self, key, token):
+        """Commit the proposal made under `token`; False if it was superseded.
+
+        Acknowledging the same token twice is harmless.
+        """
+        state = self.load(key)
+        if state.get('acked') == token:
+            return True
+        proposal = state.get('proposal')
+        if not proposal or proposal['token'] != token:
+            return False
+        write_json(self._path(key), dict(proposal['state'], acked=token))
+        return True
+
+
+class _Walk:
+    """Reviews and budget shared by the passes of one scan"""
+
+    def __init__(self, fetch_page, url, state, max_reviews, max_pages):
+        self.fetch_page = fetch_page
+        self.url = url
+        self.high_water = state['high_water']
+        self.seen = set(state['seen'])
+        self.max_reviews = max_reviews
+        self.max_pages = max_pages
+        self.new_reviews = []
+        self.known = 0
+        self.pages = 0
+
+    def run(self, page_url, known_streak=None):
+        """Follow pages from `page_url`; returns (why it stopped, page to resume from or None)"""
+        visited = set()
+        streak = 0
+        while True:
+            if self.pages >= self.max_pages:
+                return 'max_pages', page_url
+            visited.add(page_url)
+            reviews, next_url = self.fetch_page(page_url)
+            self.pages += 1
+            review_pages.inc()
+
+            for index, review in enumerate(reviews):
+                digest = review_hash(review)
+                # A pinned review sits above the newest ones on every run, so the
+                # high-water mark only ends the scan when it is not the first review
+                if digest == self.high_water and (index > 0 or page_url != self.url):
+                    return 'high_water', None
+                if digest in self.seen:
+                    self.known += 1
+                    streak += 1
+                    if known_streak and streak >= known_streak:
+                        return 'known_streak', None
+                    continue
+
+                streak = 0
+                self.seen.add(digest)
+                self.new_reviews.append(dict(review, review_hash=digest))
+                if len(self.new_reviews) >= self.max_reviews:
+                    # The rest of this page is read again next time; what was
+                    # returned now is skipped as seen
+                    return 'max_reviews', page_url
+
+            if not next_url or next_url in visited:
+                return 'last_page', None
+            page_url = next_url
+
+
+def scan(fetch_page, url, state, max_reviews, max_pages, known_streak=5):
+    """Follow review pages newest-first from `url` and collect unseen reviews.
+
+    `fetch_page(url)` returns (reviews on the page, next page URL or None).
+    Returns (new reviews with their `review_hash`, summary of the scan).
+    When an earlier run left a backlog, a head pass that ends on a known
+    streak is followed by a pass from state['resume'] that ignores known
+    streaks and runs to the high-water mark or the last page. The
+    summary's `resume` is the page the next run continues from, or None
+    once nothing is left behind.
+    """
+    walk = _Walk(fetch_page, url, state, max_reviews, max_pages)
+    stopped, resume = walk.run(url, known_streak)
+    head_reviews = len(walk.new_reviews)
+    # Reaching the high-water mark or the last page means the head pass
+    # went through the backlog too; a known streak stops short of it
+    if stopped == 'known_streak' and state.get('resume'):
+        stopped, resume = walk.run(state['resume'])
+
+    reviews_scanned.inc(('new',), len(walk.new_reviews))
+    reviews_scanned.inc(('known',), walk.known)
+    return walk.new_reviews, {
+        'pages': walk.pages,
+        'new_reviews': len(walk.new_reviews),
+        'known_reviews': walk.known,
+        'stopped': stopped,
+        'resume': resume,
+        'newest': walk.new_reviews[0]['review_hash'] if head_reviews else None
+    }
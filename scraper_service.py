@@ -1,14 +1,52 @@
-from flask import Flask, request, jsonify
-import requests
-from bs4 import BeautifulSoup
+from flask import Flask, request, jsonify, Response, stream_with_context
+from concurrent.futures import as_completed, TimeoutError as FutureTimeout
 import json
+import os
 import time
 import random
-from urllib.parse import urljoin, urlparse
-import re
+import metrics
+import html_extract
+from fetch_engine import FetchEngine, FetchError
+from page_cache import PageCache
+import review_ledger
 
 app = Flask(__name__)
 
+# Request latency per route and outbound fetch timing on /metrics
+metrics.instrument_app(app, 'scraper_service')
+
+# Pages are fetched on one async loop with keep-alive connections; each
+# host gets a token bucket (requests/second and burst) instead of handler
+# threads sleeping between requests
+fetch_engine = FetchEngine(
+    max_concurrency=int(os.environ.get('SCRAPER_MAX_CONCURRENCY', 20)),
+    host_rate=float(os.environ.get('SCRAPER_HOST_RATE', 0.5)),
+    host_burst=int(os.environ.get('SCRAPER_HOST_BURST', 2)),
+    host_concurrency=int(os.environ.get('SCRAPER_HOST_CONCURRENCY', 2)),
+    timeout=float(os.environ.get('SCRAPER_TIMEOUT', 10)),
+    max_delay=float(os.environ.get('SCRAPER_MAX_DELAY', 30))
+)
+
+# /scrape_products limits; a batch may queue behind its hosts' token
+# buckets for longer than a single request would
+MAX_BATCH_URLS = int(os.environ.get('SCRAPER_MAX_BATCH', 100))
+BATCH_MAX_DELAY = float(os.environ.get('SCRAPER_BATCH_MAX_DELAY', 300))
+
+# selectolax, lxml or bs4 (html.parser); `auto` takes the fastest installed
+PARSER_BACKEND = html_extract.resolve_backend(os.environ.get('SCRAPER_PARSER', 'auto'))
+
+# Validators, body hash and extracted record of every scraped product page,
+# so an unchanged page is neither downloaded in full nor parsed again
+page_cache = PageCache(os.environ.get(
+    'SCRAPER_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'page_cache')
+))
+
+# Reviews already returned per product, so repeated runs only return new ones
+reviews_seen = review_ledger.ReviewLedger(page_cache.directory)
+REVIEW_MAX_PAGES = int(os.environ.get('SCRAPER_REVIEW_MAX_PAGES', 10))
+REVIEW_KNOWN_STREAK = int(os.environ.get('SCRAPER_REVIEW_KNOWN_STREAK', 5))
+
 # User agents for rotation
 USER_AGENTS = [
     'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
@@ -25,6 +63,37 @@ def get_headers():
         'Connection': 'keep-alive',
     }
 
+def fetch_error_response(error):
+    response = jsonify({'error': str(error)})
+    response.status_code = error.status_code
+    if getattr(error, 'retry_after', None):
+        response.headers['Retry-After'] = str(int(error.retry_after) + 1)
+    return response
+
+def parse_product(body, url, source):
+    """Extract name, price, description and image from a product page"""
+    product_data = {
+        'url': url,
+        'source': source,
+        'scraped_at': time.time()
+    }
+    product_data.update(html_extract.get_extractor(source, PARSER_BACKEND).product(body, url))
+    return product_data
+
+def cache_variant(source):
+    """Page cache variant: records depend on the source's profile and the extractor"""
+    extractor = html_extract.get_extractor(source, PARSER_BACKEND)
+    return f"{(source or 'generic').lower()}:{extractor.version}"
+
+def extract_product(url, source, page, entry, headers):
+    """Product record for a fetched page and how the page cache served it"""
+    record, outcome = page_cache.extract(
+        'product', cache_variant(source), url, page, entry, lambda body: parse_product(body, url, source),
+        refetch=lambda: fetch_engine.fetch(url, headers=headers)
+    )
+    # A reused record was still confirmed against the site just now
+    return dict(record, source=source, scraped_at=time.time()), outcome
+
 @app.route('/scrape_product', methods=['POST'])
 def scrape_product():
     try:
@@ -36,125 +105,185 @@ def scrape_product():
             return jsonify({'error': 'URL is required'}), 400
         
         headers = get_headers()
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        # Generic scraping logic - customize based on source
-        product_data = {
-            'url': url,
-            'source': source,
-            'scraped_at': time.time()
-        }
-        
-        # Extract basic information
-        title_selectors = ['h1', '.product-title', '#product-title', '.title']
-        for selector in title_selectors:
-            title_elem = soup.select_one(selector)
-            if title_elem:
-                product_data['name'] = title_elem.get_text(strip=True)
-                break
-        
-        # Extract price
-        price_selectors = ['.price', '.product-price', '.current-price', '[data-testid="price"]']
-        for selector in price_selectors:
-            price_elem = soup.select_one(selector)
-            if price_elem:
-                price_text = price_elem.get_text(strip=True)
-                price_match = re.search(r'[\d,]+\.?\d*', price_text.replace(',', ''))
-                if price_match:
-                    product_data['price'] = float(price_match.group())
-                break
+        entry = page_cache.get('product', cache_variant(source), url)
+        page = fetch_engine.fetch(url, headers=page_cache.conditional_headers(entry, headers))
         
-        # Extract description
-        desc_selectors = ['.description', '.product-description', '.product-details']
-        for selector in desc_selectors:
-            desc_elem = soup.select_one(selector)
-            if desc_elem:
-                product_data['description'] = desc_elem.get_text(strip=True)[:500]
-                break
+        product_data, outcome = extract_product(url, source, page, entry, headers)
         
-        # Extract image
-        img_selectors = ['.product-image img', '.main-image img', 'img[data-testid="product-image"]']
-        for selector in img_selectors:
-            img_elem = soup.select_one(selector)
-            if img_elem:
-                img_src = img_elem.get('src') or img_elem.get('data-src')
-                if img_src:
-                    product_data['image_url'] = urljoin(url, img_src)
-                break
-        
-        # Add delay to be respectful
-        time.sleep(random.uniform(1, 3))
-        
-        return jsonify(product_data)
+        response = jsonify(product_data)
+        response.headers['X-Cache'] = outcome
+        return response
     
+    except FetchError as e:
+        return fetch_error_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def batch_items(data):
+    """Normalize the /scrape_products body to a list of (url, source)"""
+    if isinstance(data, dict):
+        default_source = data.get('source', 'generic')
+        entries = data.get('urls') or data.get('items') or []
+    else:
+        default_source = 'generic'
+        entries = data or []
+    
+    if not isinstance(entries, list):
+        raise ValueError('urls must be a list')
+    
+    items = []
+    for entry in entries:
+        if isinstance(entry, str):
+            items.append((entry, default_source))
+        elif isinstance(entry, dict) and entry.get('url'):
+            items.append((entry['url'], entry.get('source', default_source)))
+        else:
+            raise ValueError('Each entry needs a url')
+    
+    if not items:
+        raise ValueError('At least one URL is required')
+    if len(items) > MAX_BATCH_URLS:
+        raise ValueError(f'At most {MAX_BATCH_URLS} URLs per batch')
+    return items
+
+def stream_batch(items):
+    """Fetch every item concurrently and yield one NDJSON line per URL as it finishes"""
+    headers = get_headers()
+    futures = {}
+    for index, (url, source) in enumerate(items):
+        entry = page_cache.get('product', cache_variant(source), url)
+        future = fetch_engine.submit(
+            url, headers=page_cache.conditional_headers(entry, headers), max_delay=BATCH_MAX_DELAY
+        )
+        futures[future] = (index, url, source, entry)
+    
+    succeeded = 0
+    pending = set(futures)
+    deadline = BATCH_MAX_DELAY + fetch_engine.jitter + fetch_engine.timeout + 5
+    try:
+        for future in as_completed(futures, timeout=deadline):
+            pending.discard(future)
+            index, url, source, entry = futures[future]
+            line = {'index': index, 'url': url}
+            try:
+                line['product'], line['cache'] = extract_product(url, source, future.result(), entry, headers)
+                succeeded += 1
+            except FetchError as e:
+                line['error'] = str(e)
+                line['status'] = e.status_code
+                if getattr(e, 'retry_after', None):
+                    line['retry_after'] = round(e.retry_after, 1)
+            except Exception as e:
+                line['error'] = str(e)
+                line['status'] = 500
+            yield json.dumps(line) + '\n'
+    except FutureTimeout:
+        for future in pending:
+            index, url, _, _ = futures[future]
+            yield json.dumps({'index': index, 'url': url, 'error': 'Batch timed out', 'status': 504}) + '\n'
+    finally:
+        # Client went away or the batch timed out: drop fetches still queued
+        for future in pending:
+            future.cancel()
+    
+    yield json.dumps({'summary': {'total': len(items), 'succeeded': succeeded,
+                                  'failed': len(items) - succeeded}}) + '\n'
+
+@app.route('/scrape_products', methods=['POST'])
+def scrape_products():
+    """Batch of {url, source} entries (or plain URLs); results stream as NDJSON in completion order"""
+    try:
+        items = batch_items(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return Response(stream_with_context(stream_batch(items)), mimetype='application/x-ndjson')
+
 @app.route('/scrape_reviews', methods=['POST'])
 def scrape_reviews():
+    """New reviews since the last run for this product_id (or URL), following pagination.
+
+    `"incremental": false` reads only the first page and remembers nothing;
+    `"reset": true` forgets what earlier runs returned. The reviews count
+    as returned once the `ack_token` of the response is acknowledged, via
+    /scrape_reviews/ack or as `"ack"` in the next request for the product.
+    """
     try:
         data = request.json
         url = data.get('url')
-        max_reviews = data.get('max_reviews', 50)
+        max_reviews = int(data.get('max_reviews', 50))
+        max_pages = min(int(data.get('max_pages', REVIEW_MAX_PAGES)), REVIEW_MAX_PAGES)
         
         if not url:
             return jsonify({'error': 'URL is required'}), 400
         
+        extractor = html_extract.get_extractor(data.get('source', 'generic'), PARSER_BACKEND)
         headers = get_headers()
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        
-        soup = BeautifulSoup(response.content, 'html.parser')
         
-        reviews = []
+        def fetch_page(page_url):
+            page = fetch_engine.fetch(page_url, headers=headers)
+            page.raise_for_status()
+            return extractor.review_page(page.body, page.url, max_reviews)
         
-        # Generic review extraction - customize based on source
-        review_selectors = ['.review', '.review-item', '[data-testid="review"]']
+        if not data.get('incremental', True):
+            reviews, _ = fetch_page(url)
+            return jsonify({'reviews': reviews})
         
-        for selector in review_selectors:
-            review_elements = soup.select(selector)[:max_reviews]
-            
-            for review_elem in review_elements:
-                review_data = {}
-                
-                # Extract reviewer name
-                name_elem = review_elem.select_one('.reviewer-name, .review-author, .name')
-                if name_elem:
-                    review_data['reviewer_name'] = name_elem.get_text(strip=True)
-                
-                # Extract rating
-                rating_elem = review_elem.select_one('.rating, .stars, [data-testid="rating"]')
-                if rating_elem:
-                    rating_text = rating_elem.get_text(strip=True)
-                    rating_match = re.search(r'(\d+)', rating_text)
-                    if rating_match:
-                        review_data['rating'] = int(rating_match.group(1))
-                
-                # Extract review text
-                text_elem = review_elem.select_one('.review-text, .review-content, .comment')
-                if text_elem:
-                    review_data['review_text'] = text_elem.get_text(strip=True)
-                
-                # Extract date
-                date_elem = review_elem.select_one('.review-date, .date')
-                if date_elem:
-                    review_data['review_date'] = date_elem.get_text(strip=True)
-                
-                if review_data.get('review_text'):
-                    reviews.append(review_data)
-            
-            if reviews:
-                break
+        key = review_key(data)
+        with reviews_seen.lock(key):
+            if data.get('ack'):
+                reviews_seen.ack(key, data['ack'])
+            state = reviews_seen.load(key)
+            if data.get('reset'):
+                state = review_ledger.empty_state(key)
+            # A failed page fetch raises here and leaves the ledger untouched,
+            # so the next run scans the same pages again
+            reviews, summary = review_ledger.scan(
+                fetch_page, url, state, max_reviews, max_pages, REVIEW_KNOWN_STREAK
+            )
+            ack_token = reviews_seen.propose(key, state, reviews, summary)
         
-        time.sleep(random.uniform(1, 3))
-        
-        return jsonify({'reviews': reviews})
+        summary['reviews'] = reviews
+        summary['product_id'] = data.get('product_id')
+        summary['url'] = url
+        summary['ack_token'] = ack_token
+        return jsonify(summary)
     
+    except FetchError as e:
+        return fetch_error_response(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def review_key(data):
+    return str(data.get('product_id') or data.get('url'))
+
+@app.route('/scrape_reviews/ack', methods=['POST'])
+def ack_reviews():
+    """Mark the reviews of a /scrape_reviews response as stored, so later runs skip them"""
+    try:
+        data = request.json
+        if not data.get('ack_token') or not (data.get('product_id') or data.get('url')):
+            return jsonify({'error': 'ack_token and product_id or url are required'}), 400
+        
+        key = review_key(data)
+        with reviews_seen.lock(key):
+            acknowledged = reviews_seen.ack(key, data['ack_token'])
+        if not acknowledged:
+            # A later run replaced this one; its reviews come back in that run
+            return jsonify({'error': 'ack_token was superseded by a later run'}), 409
+        return jsonify({'acknowledged': True})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/fetch/stats')
+def get_fetch_stats():
+    return jsonify(fetch_engine.stats())
+
+@app.route('/cache/stats')
+def get_cache_stats():
+    stats = page_cache.stats()
+    stats['parser'] = PARSER_BACKEND
+    return jsonify(stats)
+
 if __name__ == '__main__':
     app.run(host='127.0.0.1', port=5001, debug=True)
\ No newline at end of file
@@ -0,0 +1,117 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+
+
+def normalize_text(text):
+    """Normalize review text so trivially different copies share a cache entry"""
+    text = unicodedata.normalize('NFC', text or '')
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def text_key(normalized):
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+class SentimentCache:
+    """Content-addressed sentiment cache: bounded in-memory LRU plus an optional SQLite tier"""
+
+    def __init__(self, max_entries=50000, disk_path=None):
+        self.max_entries = max_entries
+        self.disk_path = disk_path
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk = None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if disk_path:
+            self._disk = sqlite3.connect(disk_path, check_same_thread=False)
+            self._disk.execute("""
+                CREATE TABLE IF NOT EXISTS sentiment_cache (
+                    key TEXT PRIMARY KEY,
+                    result TEXT NOT NULL
+                )
+            """)
+            self._disk.commit()
+
+    def get(self, key):
+        with self._lock:
+            result = self._memory.get(key)
+            if result is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return result
+
+            if self._disk is not None:
+                row = self._disk.execute(
+                    "SELECT result FROM sentiment_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row:
+                    result = json.loads(row[0])
+                    self._remember(key, result)
+                    self.disk_hits += 1
+                    return result
+
+            self.misses += 1
+            return None
+
+    def put(self, key, result):
+        self.put_many([(key, result)])
+
+    def put_many(self, items):
+        """Store (key, result) pairs; the disk tier writes them in one transaction"""
+        items = list(items)
+        if not items:
+            return
+        # Serialize before taking the lock so only the write itself is serialized
+        rows = [(key, json.dumps(result)) for key, result in items] if self._disk is not None else None
+        with self._lock:
+            for key, result in items:
+                self._remember(key, result)
+            if rows:
+                self._disk.executemany(
+                    "INSERT OR REPLACE INTO sentiment_cache (key, result) VALUES (?, ?)",
+                    rows
+                )
+                self._disk.commit()
+
+    def _remember(self, key, result):
+        self._memory[key] = result
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            disk_entries = None
+            if self._disk is not None:
+                disk_entries = self._disk.execute(
+                    "SELECT COUNT(*) FROM sentiment_cache"
+                ).fetchone()[0]
+            return {
+                'memory_entries': len(self._memory),
+                'max_entries': self.max_entries,
+                'disk_entries': disk_entries,
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0
+            }
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._disk is not None:
+                self._disk.execute("DELETE FROM sentiment_cache")
+                self._disk.commit()
+            self.memory_hits = self.disk_hits = self.misses = self.evictions = 0
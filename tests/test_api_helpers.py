@@ -0,0 +1,22 @@
+from decimal import Decimal
+
+from api_server import decode_cursor, encode_cursor, keyset_condition
+
+
+def test_cursor_round_trip():
+    token = encode_cursor('price', 'desc', Decimal('19.99'), 42)
+    assert '=' not in token
+    assert decode_cursor(token) == ('price', 'desc', '19.99', 42)
+
+
+def test_cursor_with_null_value():
+    assert decode_cursor(encode_cursor('name', 'asc', None, 7)) == ('name', 'asc', None, 7)
+
+
+def test_keyset_condition_is_a_row_comparison():
+    assert keyset_condition('p.price', 'desc', '19.99', 42) == ("(p.price, p.id) < (%s, %s)", ['19.99', 42])
+    assert keyset_condition('p.name', 'asc', 'Widget', 7) == ("(p.name, p.id) > (%s, %s)", ['Widget', 7])
+
+
+def test_keyset_condition_inside_the_null_tail():
+    assert keyset_condition('p.price', 'asc', None, 42) == ("(p.price IS NULL AND p.id > %s)", [42])
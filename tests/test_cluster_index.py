@@ -0,0 +1,144 @@
+import pytest
+
+from cluster_index import ClusterIndex
+
+TOPICS = [
+    'wireless bluetooth headphones with noise cancelling',
+    'stainless steel kitchen knife set with block',
+    'running shoes with breathable mesh and foam sole',
+    'gaming laptop with fast graphics card',
+    'organic green tea leaves in a tin',
+]
+
+
+class Catalog:
+    """Products of one category and a description loader that records its calls"""
+
+    def __init__(self, count=20):
+        self.products = {pid: (f"Product {pid}", 10.0 * pid, TOPICS[pid % len(TOPICS)]) for pid in range(1, count + 1)}
+        self.loaded = []
+
+    def rows(self):
+        return [(pid, name, price, hash(description)) for pid, (name, price, description) in self.products.items()]
+
+    def load_descriptions(self, ids):
+        self.loaded.append(sorted(ids))
+        return {pid: self.products[pid][2] for pid in ids}
+
+    def describe(self, pid, description):
+        name, price, _ = self.products[pid]
+        self.products[pid] = (name, price, description)
+
+
+@pytest.fixture
+def catalog():
+    return Catalog()
+
+
+def cluster(index, catalog):
+    return index.clusters('Electronics', catalog.rows(), catalog.load_descriptions)
+
+
+def members(groups):
+    return sorted(item['id'] for items in groups.values() for item in items)
+
+
+def test_first_call_fits_every_product(catalog):
+    index = ClusterIndex()
+    groups, refreshed = cluster(index, catalog)
+
+    assert refreshed == 20
+    assert members(groups) == list(range(1, 21))
+    assert len(groups) == 5
+    assert catalog.loaded == [list(range(1, 21))]
+    # Products with the same description share a cluster
+    same_topic = {item['id']: cluster_id for cluster_id, items in groups.items() for item in items}
+    assert same_topic[1] == same_topic[6] == same_topic[11]
+
+
+def test_unchanged_category_reuses_the_cached_clusters(catalog):
+    index = ClusterIndex()
+    first, _ = cluster(index, catalog)
+    kmeans = index._indexes['Electronics'].kmeans
+
+    again, refreshed = cluster(index, catalog)
+    assert refreshed == 0
+    assert again == first
+    assert len(catalog.loaded) == 1
+    assert index._indexes['Electronics'].kmeans is kmeans
+
+
+def test_a_few_changes_are_partial_fit(catalog):
+    index = ClusterIndex(refit_ratio=0.3)
+    cluster(index, catalog)
+    kmeans = index._indexes['Electronics'].kmeans
+
+    catalog.describe(3, TOPICS[0])
+    groups, refreshed = cluster(index, catalog)
+
+    assert refreshed == 1
+    assert catalog.loaded[-1] == [3]
+    assert index._indexes['Electronics'].kmeans is kmeans
+    assert index.stats()['Electronics']['changes_since_fit'] == 1
+    assert members(groups) == list(range(1, 21))
+
+
+def test_many_changes_refit_from_scratch(catalog):
+    index = ClusterIndex(refit_ratio=0.3)
+    cluster(index, catalog)
+    kmeans = index._indexes['Electronics'].kmeans
+
+    for pid in range(1, 8):
+        catalog.describe(pid, 'portable solar power bank charger')
+    _, refreshed = cluster(index, catalog)
+
+    assert refreshed == 7
+    assert catalog.loaded[-1] == list(range(1, 21))
+    assert index._indexes['Electronics'].kmeans is not kmeans
+    assert index.stats()['Electronics']['changes_since_fit'] == 0
+
+
+def test_removed_products_leave_the_clusters(catalog):
+    index = ClusterIndex()
+    cluster(index, catalog)
+
+    del catalog.products[20]
+    groups, refreshed = cluster(index, catalog)
+    assert refreshed == 0
+    assert members(groups) == list(range(1, 20))
+    assert index.stats()['Electronics']['products'] == 19
+
+
+def test_cluster_count_change_refits():
+    catalog = Catalog(count=6)
+    index = ClusterIndex()
+    cluster(index, catalog)
+    assert index.stats()['Electronics']['n_clusters'] == 3
+
+    catalog.products[7] = ('Product 7', 70.0, TOPICS[2])
+    cluster(index, catalog)
+    assert index.stats()['Electronics']['n_clusters'] == 3
+    catalog.products[8] = ('Product 8', 80.0, TOPICS[3])
+    cluster(index, catalog)
+    assert index.stats()['Electronics']['n_clusters'] == 4
+    assert catalog.loaded[-1] == list(range(1, 9))
+
+
+def test_name_and_price_edits_need_no_vectors(catalog):
+    index = ClusterIndex()
+    cluster(index, catalog)
+
+    catalog.products[5] = ('Renamed', 99.0, catalog.products[5][2])
+    groups, _ = cluster(index, catalog)
+    item = next(item for items in groups.values() for item in items if item['id'] == 5)
+    assert item == {'id': 5, 'name': 'Renamed', 'price': 99.0}
+    assert len(catalog.loaded) == 1
+
+
+def test_invalidate_forgets_the_category(catalog):
+    index = ClusterIndex()
+    cluster(index, catalog)
+    index.invalidate('Electronics')
+    _, refreshed = cluster(index, catalog)
+    assert refreshed == 20
+    assert len(catalog.loaded) == 2
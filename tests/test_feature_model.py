@@ -0,0 +1,123 @@
+import json
+import math
+import random
+import time
+
+import pytest
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from feature_model import IncrementalTfidf, SeenFilter
+
+DOCS = [
+    'The battery life is great and the screen is bright',
+    'Battery died after a week, terrible battery',
+    'Great sound quality, the bass is deep',
+    'Screen cracked on arrival, terrible packaging',
+    'Good value for money, great battery life',
+]
+
+
+def keys(count, seed):
+    rng = random.Random(seed)
+    return [f"{rng.getrandbits(64):016x}" for _ in range(count)]
+
+
+def test_seen_filter_has_no_false_negatives_when_saturated():
+    seen = SeenFilter(bits=1 << 12)
+    added = keys(5000, seed=1)
+    for key in added:
+        seen.add(key)
+    assert all(key in seen for key in added)
+
+
+def test_seen_filter_false_positives_stay_rare_when_sized():
+    seen = SeenFilter(bits=1 << 20)
+    for key in keys(10000, seed=1):
+        seen.add(key)
+    false_positives = sum(key in seen for key in keys(10000, seed=2))
+    assert false_positives / 10000 < 0.01
+
+
+def test_seen_filter_round_trips_through_bytes():
+    seen = SeenFilter(bits=1 << 10)
+    added = keys(50, seed=3)
+    for key in added:
+        seen.add(key)
+    copy = SeenFilter.from_bytes(seen.to_bytes())
+    assert copy.bits == 1 << 10
+    assert all(key in copy for key in added)
+
+
+def test_idf_matches_tfidf_vectorizer():
+    model = IncrementalTfidf()
+    # Split updates add up to the same corpus
+    model.update(DOCS[:2])
+    model.update(DOCS[2:])
+
+    vectorizer = TfidfVectorizer(stop_words='english', ngram_range=(1, 2)).fit(DOCS)
+    for term, index in vectorizer.vocabulary_.items():
+        assert model.idf(term) == pytest.approx(vectorizer.idf_[index])
+    # A term never seen gets the highest weight
+    assert model.idf('unseen') == pytest.approx(math.log(len(DOCS) + 1) + 1)
+
+
+def test_update_counts_each_document_once():
+    model = IncrementalTfidf()
+    assert model.update(DOCS + ['', None]) == len(DOCS)
+    assert model.update(DOCS) == 0
+    assert model.stats()['documents'] == len(DOCS)
+    assert model.doc_freq['battery'] == 3
+
+
+def test_vocabulary_is_pruned_to_the_most_common_terms():
+    model = IncrementalTfidf(max_terms=10)
+    model.update(DOCS)
+    assert len(model.doc_freq) <= 10
+    assert 'battery' in model.doc_freq
+    assert 'great' in model.doc_freq
+
+
+def test_top_features_are_normalized():
+    model = IncrementalTfidf()
+    model.update(DOCS)
+    features = model.top_features(['terrible battery, terrible screen'], top_n=3)
+
+    assert features[0][0] == 'terrible'
+    assert len(features) == 3
+    assert all(0 < weight <= 1 for _, weight in features)
+    assert model.top_features(['the and is']) == []
+
+
+def test_model_and_seen_filter_persist(tmp_path):
+    path = str(tmp_path / 'features.json')
+    model = IncrementalTfidf(path=path)
+    model.update(DOCS)
+    model.save()
+    assert model.stats()['unsaved_documents'] == 0
+
+    loaded = IncrementalTfidf(path=path)
+    assert loaded.stats()['documents'] == len(DOCS)
+    assert loaded.doc_freq == model.doc_freq
+    assert loaded.update(DOCS) == 0
+
+
+def test_files_with_a_seen_list_still_load(tmp_path):
+    path = tmp_path / 'features.json'
+    key = IncrementalTfidf._doc_key(DOCS[0])
+    path.write_text(json.dumps({'n_docs': 1, 'doc_freq': {'battery': 1}, 'seen': [key]}))
+
+    model = IncrementalTfidf(path=str(path))
+    assert model.stats()['documents'] == 1
+    assert model.update(DOCS[:2]) == 1
+
+
+def test_crossing_save_every_saves_in_the_background(tmp_path):
+    path = tmp_path / 'features.json'
+    model = IncrementalTfidf(path=str(path), save_every=2)
+    model.update(DOCS)
+
+    deadline = time.monotonic() + 5
+    while not path.exists() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert json.loads(path.read_text())['n_docs'] == len(DOCS)
+    assert model.stats()['unsaved_documents'] == 0
@@ -0,0 +1,134 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from aiohttp import web
+
+from fetch_engine import FetchEngine, HostBusy, TokenBucket
+from page_cache import PageCache
+
+ETAG = '"v1"'
+BODY = b'<html><h1>Widget</h1></html>'
+
+
+@pytest.fixture(scope='module')
+def server():
+    """Local HTTP server answering If-None-Match with a 304"""
+    loop = asyncio.new_event_loop()
+
+    async def page(request):
+        if request.headers.get('If-None-Match') == ETAG:
+            return web.Response(status=304, headers={'ETag': ETAG})
+        return web.Response(body=BODY, headers={'ETag': ETAG}, content_type='text/html')
+
+    app = web.Application()
+    app.router.add_get('/{name}', page)
+    runner = web.AppRunner(app)
+    loop.run_until_complete(runner.setup())
+    loop.run_until_complete(web.TCPSite(runner, '127.0.0.1', 0).start())
+    host, port = runner.addresses[0][:2]
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+
+    yield f"http://{host}:{port}"
+
+    asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result(timeout=5)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(timeout=5)
+
+
+@pytest.fixture
+def engine():
+    engines = []
+
+    def make(**kwargs):
+        engines.append(FetchEngine(**dict({'jitter': 0, 'timeout': 5}, **kwargs)))
+        return engines[-1]
+
+    yield make
+    for created in engines:
+        created.close()
+
+
+def host_stats(engine, url):
+    return engine.stats()['hosts'][url.split('://', 1)[1]]
+
+
+def test_bucket_refills_at_its_rate():
+    bucket = TokenBucket(rate=2, burst=2)
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == pytest.approx(0.5, abs=0.01)
+
+    # A second later two tokens came back, one of them owed to the last reservation
+    bucket.updated -= 1
+    assert bucket.reserve() == 0
+    assert bucket.tokens == pytest.approx(0, abs=0.01)
+
+    # Never more than the burst, however long the host was idle
+    bucket.updated -= 60
+    bucket.reserve()
+    assert bucket.tokens == pytest.approx(1, abs=0.01)
+
+
+def test_host_busy_when_the_wait_is_too_long(server, engine):
+    fetcher = engine(host_rate=1, host_burst=1, max_delay=0.5)
+    assert fetcher.fetch(server + '/a').status == 200
+
+    with pytest.raises(HostBusy) as error:
+        fetcher.fetch(server + '/b')
+    assert error.value.status_code == 429
+    assert error.value.retry_after == pytest.approx(1, abs=0.1)
+
+    # The rejected request gave its token back
+    stats = host_stats(fetcher, server)
+    assert stats['requests'] == 1
+    assert stats['tokens'] == pytest.approx(0, abs=0.1)
+
+
+def test_cancelled_waits_refund_their_tokens(server, engine):
+    fetcher = engine(host_rate=1, host_burst=1, max_delay=30)
+    assert fetcher.submit(server + '/a').result(timeout=5).status == 200
+
+    waiting = [fetcher.submit(server + '/b'), fetcher.submit(server + '/c')]
+    time.sleep(0.1)
+    for future in waiting:
+        future.cancel()
+    time.sleep(0.1)
+
+    stats = host_stats(fetcher, server)
+    assert stats['requests'] == 1
+    assert stats['waited_seconds'] == 0
+    # Back to what the bucket held before the two reservations
+    assert stats['tokens'] == pytest.approx(0, abs=0.1)
+    # Without the refunds the next token would be three seconds away
+    assert fetcher.submit(server + '/d', max_delay=1.5).result(timeout=5).status == 200
+
+
+def test_conditional_get_reuses_the_cached_record(server, engine, tmp_path):
+    fetcher = engine()
+    cache = PageCache(str(tmp_path))
+    url = server + '/product'
+    parsed = []
+
+    def parse(body):
+        parsed.append(body)
+        return {'name': 'Widget'}
+
+    def scrape(variant):
+        entry = cache.get('product', variant, url)
+        page = fetcher.fetch(url, cache.conditional_headers(entry, {}))
+        return cache.extract('product', variant, url, page, entry, parse)
+
+    assert scrape('amazon') == ({'name': 'Widget'}, 'miss')
+    assert scrape('amazon') == ({'name': 'Widget'}, 'not_modified')
+    assert len(parsed) == 1
+
+    # Another source profile does not reuse the record
+    assert scrape('ebay') == ({'name': 'Widget'}, 'miss')
+    assert len(parsed) == 2
+
+    stats = cache.stats()
+    assert stats['bytes_saved'] == len(BODY)
+    assert stats['kinds']['product']['not_modified'] == 1
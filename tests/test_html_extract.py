@@ -0,0 +1,95 @@
+import os
+
+import pytest
+
+import html_extract
+from html_extract import available_backends, bench, get_extractor, load_corpus
+
+PAGES = load_corpus(os.path.join(os.path.dirname(__file__), 'pages'))
+BACKENDS = available_backends()
+
+EXPECTED = {
+    'https://generic.example/headphones.html': (
+        {
+            'name': 'Noise Cancelling Wireless Headphones',
+            'price': 12499.0,
+            'description': 'Over-ear headphones with active noise cancelling. Up to 30 hours of battery & fast '
+                           'charging — 10 minutes for 5 hours. Bluetooth 5.3Multipoint',
+            'image_url': 'https://generic.example/img/headphones-1.jpg'
+        },
+        [
+            {'reviewer_name': 'Asha K.', 'rating': 5, 'review_date': '12 March 2024',
+             'review_text': 'Excellent noise cancelling, very comfortable.'},
+            {'reviewer_name': 'Rahul', 'rating': 3, 'review_date': '2 April 2024',
+             'review_text': 'Good sound but the app keeps disconnecting.'},
+            # A review without text is skipped; the alternative selectors still match
+            {'reviewer_name': 'Meera & Co', 'rating': 1, 'review_text': 'Stopped charging after a month.'}
+        ],
+        'https://generic.example/p/headphones/reviews?page=2'
+    ),
+    'https://amazon.example/echo.html': (
+        {
+            'name': 'Smart Speaker (4th Gen) with Premium Sound, Charcoal',
+            'price': 4499.0,
+            'description': 'Premium sound with clear vocals. Voice control for your smart home.',
+            'image_url': 'https://m.media-amazon.com/images/I/speaker.jpg'
+        },
+        [
+            {'reviewer_name': 'Kiran', 'rating': 5, 'review_date': 'Reviewed in India on 3 January 2024',
+             'review_text': 'Sounds great in a small room.'},
+            {'reviewer_name': 'Anonymous', 'rating': 2, 'review_date': 'Reviewed in India on 9 February 2024',
+             'review_text': 'Wi-Fi drops every few hours.'}
+        ],
+        'https://amazon.example/product-reviews/B0XYZ?pageNumber=2'
+    ),
+    'https://generic.example/no_reviews.html': (
+        {'name': 'Yoga Mat 6mm', 'description': 'Non-slip TPE mat with carry strap.'},
+        [],
+        None
+    )
+}
+
+
+def extract(backend, source, url, body):
+    extractor = get_extractor(source, backend)
+    reviews, next_url = extractor.review_page(body, url, 50)
+    return extractor.product(body, url), reviews, next_url
+
+
+def test_corpus_is_present():
+    assert {url for _, url, _ in PAGES} >= set(EXPECTED)
+    assert {source for source, _, _ in PAGES} == {'generic', 'amazon'}
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+@pytest.mark.parametrize('url', sorted(EXPECTED))
+def test_expected_records(backend, url):
+    source, _, body = next(page for page in PAGES if page[1] == url)
+    assert extract(backend, source, url, body) == EXPECTED[url]
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_backends_agree_on_every_page(backend):
+    # bs4 is the html.parser path the scraper used before the other backends
+    reference = 'bs4' if 'bs4' in BACKENDS else BACKENDS[-1]
+    for source, url, body in PAGES:
+        assert extract(backend, source, url, body) == extract(reference, source, url, body), url
+
+
+def test_bench_reports_no_mismatches():
+    results = bench(PAGES, BACKENDS, rounds=1)
+    assert set(results) == set(BACKENDS)
+    assert all(result['mismatches'] == 0 for result in results.values())
+    assert all(result['pages_per_second'] > 0 for result in results.values())
+
+
+def test_max_reviews_limits_each_selector():
+    source, url, body = next(page for page in PAGES if page[1] == 'https://generic.example/headphones.html')
+    for backend in BACKENDS:
+        assert [review['reviewer_name'] for review in get_extractor(source, backend).reviews(body, 2)] == ['Asha K.', 'Rahul']
+
+
+def test_extractor_version_follows_the_profile():
+    version = get_extractor('generic', BACKENDS[0]).version
+    assert version.startswith(f"{html_extract.EXTRACTOR_VERSION}-")
+    assert get_extractor('amazon', BACKENDS[0]).version != version
@@ -0,0 +1,141 @@
+import time
+
+import pytest
+from flask import Flask
+
+import metrics
+from metrics import Registry
+
+
+def sample(text, series):
+    """Value of one series line in Prometheus text output"""
+    for line in text.splitlines():
+        if line.startswith(series + ' '):
+            return float(line[len(series) + 1:])
+    raise AssertionError(f"{series} not in output")
+
+
+@pytest.fixture
+def remote(monkeypatch):
+    """Module-level pool state emptied for the test and restored afterwards"""
+    monkeypatch.setattr(metrics, '_pools', [])
+    monkeypatch.setattr(metrics, '_remote_pools', {})
+    monkeypatch.setattr(metrics, '_sql_buffer', None)
+
+
+def test_counter_and_gauge_lines():
+    registry = Registry()
+    requests = registry.counter('requests_total', 'Requests', ['route', 'status'])
+    in_flight = registry.gauge('in_flight', 'Requests in flight')
+    requests.inc(('/a', '200'))
+    requests.inc(('/a', '200'), 2)
+    requests.inc(('/b "x"\n', '500'))
+    in_flight.inc()
+    in_flight.inc()
+    in_flight.dec()
+
+    assert registry.render() == (
+        '# HELP requests_total Requests\n'
+        '# TYPE requests_total counter\n'
+        'requests_total{route="/a",status="200"} 3\n'
+        'requests_total{route="/b \\"x\\"\\n",status="500"} 1\n'
+        '# HELP in_flight Requests in flight\n'
+        '# TYPE in_flight gauge\n'
+        'in_flight 1\n'
+    )
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    duration = registry.histogram('duration_seconds', 'Duration', ['route'], buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 3):
+        duration.observe(('/a',), value)
+
+    text = registry.render()
+    assert '# TYPE duration_seconds histogram' in text
+    assert sample(text, 'duration_seconds_bucket{route="/a",le="0.1"}') == 2
+    assert sample(text, 'duration_seconds_bucket{route="/a",le="1"}') == 3
+    assert sample(text, 'duration_seconds_bucket{route="/a",le="+Inf"}') == 4
+    assert sample(text, 'duration_seconds_sum{route="/a"}') == pytest.approx(3.65)
+    assert sample(text, 'duration_seconds_count{route="/a"}') == 4
+
+
+def test_gauge_function_is_read_at_scrape_time():
+    registry = Registry()
+    values = {('a',): 1}
+    registry.gauge_function('queue_depth', 'Queue depth', ['queue'], lambda: values)
+    assert sample(registry.render(), 'queue_depth{queue="a"}') == 1
+    values[('a',)] = 5
+    assert sample(registry.render(), 'queue_depth{queue="a"}') == 5
+
+    # A failing source leaves just the header
+    registry.gauge_function('broken', 'Broken', [], lambda: 1 / 0)
+    assert registry.render().endswith('# HELP broken Broken\n# TYPE broken gauge\n')
+
+
+def test_registering_a_name_twice_reuses_the_metric():
+    registry = Registry()
+    assert registry.counter('c', 'C') is registry.counter('c', 'C')
+
+
+def test_worker_sql_timings_are_buffered_and_shipped(remote):
+    metrics.buffer_sql()
+    metrics.observe_sql('ml-test', 'select 1', time.perf_counter())
+    metrics.observe_sql('ml-test', b'UPDATE x SET y = 1', time.perf_counter(), failed=True)
+    timings = metrics.take_sql_timings()
+    assert [(labels, failed) for labels, _, failed in timings] == [
+        (('ml-test', 'SELECT'), False), (('ml-test', 'UPDATE'), True)]
+    assert metrics.take_sql_timings() == []
+
+    before = metrics.REGISTRY.render()
+    metrics.record_remote({'pid': 1, 'sql': [[list(labels), elapsed, failed] for labels, elapsed, failed in timings]})
+    after = metrics.REGISTRY.render()
+
+    count = 'db_query_duration_seconds_count{pool="ml-test",operation="SELECT"}'
+    assert sample(after, count) == (sample(before, count) if count in before else 0) + 1
+    assert sample(after, 'db_query_errors_total{pool="ml-test",operation="UPDATE"}') >= 1
+
+
+def test_remote_pool_counters_are_summed_over_workers(remote):
+    def report(pid, checkouts, in_use):
+        metrics.record_remote({'pid': pid, 'sql': [], 'pool': {
+            'name': 'ml-workers', 'in_use': in_use, 'checkouts': checkouts, 'timeouts': 0, 'reconnects': 1}})
+
+    report(101, checkouts=5, in_use=1)
+    report(102, checkouts=7, in_use=0)
+    # A worker's latest report replaces its previous one
+    report(101, checkouts=6, in_use=0)
+
+    text = metrics.REGISTRY.render()
+    assert sample(text, 'db_pool_connections{pool="ml-workers",field="checkouts"}') == 13
+    assert sample(text, 'db_pool_connections{pool="ml-workers",field="in_use"}') == 0
+    assert sample(text, 'db_pool_connections{pool="ml-workers",field="reconnects"}') == 2
+
+
+def test_instrumented_app_serves_metrics():
+    app = Flask(__name__)
+    metrics.instrument_app(app, 'metrics-test')
+
+    @app.route('/items/<int:item_id>')
+    def item(item_id):
+        return {'id': item_id}
+
+    @app.route('/fail')
+    def fail():
+        raise ValueError('boom')
+
+    client = app.test_client()
+    client.get('/items/1')
+    client.get('/items/2')
+    client.get('/fail')
+
+    response = client.get('/metrics')
+    assert response.mimetype == 'text/plain'
+    text = response.get_data(as_text=True)
+    assert sample(text, 'http_requests_total{service="metrics-test",method="GET",route="/items/<int:item_id>",status="200"}') == 2
+    assert sample(text, 'http_requests_total{service="metrics-test",method="GET",route="/fail",status="500"}') == 1
+    assert sample(text, 'http_request_exceptions_total{service="metrics-test",route="/fail",exception="ValueError"}') == 1
+    assert sample(text, 'http_request_duration_seconds_count{service="metrics-test",method="GET",route="/items/<int:item_id>"}') == 2
+    assert sample(text, 'http_requests_in_flight{service="metrics-test",route="/items/<int:item_id>"}') == 0
+    # /metrics itself is still in flight while it renders
+    assert sample(text, 'http_requests_in_flight{service="metrics-test",route="/metrics"}') == 1
@@ -0,0 +1,86 @@
+import pytest
+
+from fetch_engine import FetchError, FetchResult
+from page_cache import PageCache
+
+URL = 'https://shop.example/p/1'
+BODY = b'<h1>Widget</h1>'
+
+
+def page(status=200, body=BODY, etag='"v1"'):
+    return FetchResult(URL, status, {'ETag': etag} if etag else {}, body if status == 200 else b'', 0.01)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return PageCache(str(tmp_path))
+
+
+@pytest.fixture
+def parsed():
+    return []
+
+
+@pytest.fixture
+def parse(parsed):
+    def parse(body):
+        parsed.append(body)
+        return {'name': body.decode()}
+    return parse
+
+
+def test_outcomes(cache, parse, parsed):
+    assert cache.extract('product', 'v', URL, page(), None, parse) == ({'name': '<h1>Widget</h1>'}, 'miss')
+
+    entry = cache.get('product', 'v', URL)
+    assert cache.conditional_headers(entry, {'Accept': '*/*'}) == {'Accept': '*/*', 'If-None-Match': '"v1"'}
+    assert cache.extract('product', 'v', URL, page(304), entry, parse)[1] == 'not_modified'
+    assert cache.extract('product', 'v', URL, page(), entry, parse)[1] == 'unchanged'
+    assert cache.extract('product', 'v', URL, page(body=b'<h1>New</h1>'), entry, parse) == ({'name': '<h1>New</h1>'}, 'changed')
+    assert len(parsed) == 2
+
+    stats = cache.stats()['kinds']['product']
+    assert (stats['miss'], stats['not_modified'], stats['unchanged'], stats['changed']) == (1, 1, 1, 1)
+    assert stats['hit_rate'] == 0.5
+
+
+def test_unchanged_body_keeps_the_newest_validators(cache, parse):
+    cache.extract('product', 'v', URL, page(), None, parse)
+    entry = cache.get('product', 'v', URL)
+    cache.extract('product', 'v', URL, page(etag='"v2"'), entry, parse)
+    assert cache.get('product', 'v', URL)['etag'] == '"v2"'
+
+
+def test_entries_are_kept_per_variant(cache, parse):
+    cache.extract('product', 'amazon:1', URL, page(), None, parse)
+    assert cache.get('product', 'amazon:1', URL)['record'] == {'name': '<h1>Widget</h1>'}
+    assert cache.get('product', 'generic:1', URL) is None
+    assert cache.get('review', 'amazon:1', URL) is None
+
+
+def test_304_without_an_entry_fetches_the_page_again(cache, parse, parsed):
+    refetched = []
+
+    def refetch():
+        refetched.append(True)
+        return page()
+
+    record, outcome = cache.extract('product', 'v', URL, page(304), None, parse, refetch=refetch)
+    assert (record, outcome) == ({'name': '<h1>Widget</h1>'}, 'miss')
+    assert refetched == [True]
+    assert parsed == [BODY]
+    assert cache.get('product', 'v', URL)['size'] == len(BODY)
+
+
+def test_304_without_an_entry_never_parses_an_empty_body(cache, parse, parsed):
+    with pytest.raises(FetchError):
+        cache.extract('product', 'v', URL, page(304), None, parse)
+    with pytest.raises(FetchError):
+        cache.extract('product', 'v', URL, page(304), None, parse, refetch=lambda: page(304))
+    assert parsed == []
+    assert cache.get('product', 'v', URL) is None
+
+
+def test_error_status_raises(cache, parse):
+    with pytest.raises(FetchError):
+        cache.extract('product', 'v', URL, page(503, etag=None), None, parse)
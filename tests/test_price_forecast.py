@@ -0,0 +1,63 @@
+import random
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+from sklearn.linear_model import LinearRegression
+
+from price_forecast import FORECAST_DAYS, forecast_price_trends
+
+
+def per_product_fit(rows):
+    """What /predict_price_trend fits: one LinearRegression per product"""
+    fits = {}
+    for product_id in {row[0] for row in rows}:
+        points = sorted((row[2], float(row[1])) for row in rows if row[0] == product_id)
+        start = points[0][0]
+        days = np.array([[(date - start).days] for date, _ in points], dtype=float)
+        prices = np.array([price for _, price in points])
+        model = LinearRegression().fit(days, prices)
+        fits[product_id] = (model.coef_[0], model.predict([[days.max() + FORECAST_DAYS]])[0])
+    return fits
+
+
+def test_grouped_fit_matches_linear_regression():
+    rng = random.Random(7)
+    start = datetime(2024, 1, 1)
+    rows = []
+    for product_id in range(1, 21):
+        slope = rng.uniform(-2, 2)
+        for _ in range(rng.randint(3, 40)):
+            day = rng.randint(0, 180)
+            price = 100 + slope * day + rng.gauss(0, 5)
+            rows.append((product_id, round(price, 2), start + timedelta(days=day, hours=rng.randint(0, 23))))
+    rng.shuffle(rows)
+
+    forecasts = forecast_price_trends(rows)
+    for product_id, (slope, predicted) in per_product_fit(rows).items():
+        forecast = forecasts[product_id]
+        assert forecast['slope'] == pytest.approx(slope, abs=1e-4)
+        assert forecast['prediction'] == pytest.approx(predicted, abs=0.01)
+        expected_trend = 'increasing' if slope > 0.1 else 'decreasing' if slope < -0.1 else 'stable'
+        assert forecast['trend'] == expected_trend
+
+
+def test_products_with_too_few_prices():
+    day = datetime(2024, 1, 1)
+    rows = [(1, 10, day), (1, 11, day + timedelta(days=1)), (2, 5, day)]
+    assert forecast_price_trends(rows) == {
+        1: {'trend': 'insufficient_data', 'prediction': None},
+        2: {'trend': 'insufficient_data', 'prediction': None}
+    }
+
+
+def test_prices_on_a_single_day_are_stable():
+    day = datetime(2024, 1, 1)
+    forecast = forecast_price_trends([(1, price, day) for price in (10, 12, 14)])[1]
+    assert forecast['trend'] == 'stable'
+    assert forecast['slope'] == 0
+    assert forecast['prediction'] == 12
+
+
+def test_no_rows():
+    assert forecast_price_trends([]) == {}
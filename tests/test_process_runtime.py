@@ -0,0 +1,68 @@
+import threading
+import time
+
+import pytest
+
+from process_runtime import Lane, ProcessRuntime, RuntimeBusy, RuntimeUnavailable
+
+
+@pytest.fixture
+def lane():
+    lanes = []
+
+    def make(**kwargs):
+        lanes.append(Lane('test', **dict({'workers': 1, 'max_queue': 1, 'timeout': 10}, **kwargs)))
+        return lanes[-1]
+
+    yield make
+    for created in lanes:
+        created.shutdown()
+
+
+def test_lane_runs_tasks_in_a_worker(lane):
+    pool = lane()
+    assert pool.result(pool.submit(pow, 2, 10)) == 1024
+    assert pool.stats()['completed'] == 1
+    assert pool.stats()['pending'] == 0
+
+
+def test_full_lane_rejects_with_429(lane):
+    pool = lane(workers=1, max_queue=1)
+    running = [pool.submit(time.sleep, 1), pool.submit(time.sleep, 1)]
+
+    with pytest.raises(RuntimeBusy) as error:
+        pool.submit(pow, 2, 3)
+    assert error.value.status_code == 429
+    assert pool.stats()['rejected'] == 1
+
+    # Slots come back as tasks finish
+    for future in running:
+        pool.result(future)
+    assert pool.result(pool.submit(pow, 2, 3)) == 8
+
+
+def test_timeout_kills_the_worker_and_frees_its_slot(lane):
+    pool = lane(workers=1, max_queue=0, timeout=0.5)
+    pool.start()
+
+    with pytest.raises(RuntimeUnavailable) as error:
+        pool.result(pool.submit(time.sleep, 30))
+    assert error.value.status_code == 503
+
+    stats = pool.stats()
+    assert stats['timeouts'] == 1
+    assert stats['restarts'] == 1
+    assert stats['pending'] == 0
+    # The only slot was held by the hung task; a fresh pool serves the next one
+    assert pool.result(pool.submit(pow, 3, 2)) == 9
+
+
+def test_lane_without_workers_runs_inline():
+    runtime = ProcessRuntime()
+    runtime.add_lane('inline', workers=0)
+    caller = threading.get_ident()
+
+    assert runtime.run('inline', threading.get_ident) == caller
+    assert runtime.map('inline', sum, [[1, 2], [3]]) == [3, 3]
+    assert runtime.stats()['inline'] == {'workers': 0, 'inline': True}
+
@@ -0,0 +1,66 @@
+import io
+from decimal import Decimal
+
+import pytest
+
+from product_ingest import PRODUCT_FIELDS, BulkLoader, clean_row, read_csv, read_ndjson
+
+
+def field(values, name):
+    return values[PRODUCT_FIELDS.index(name)]
+
+
+def test_clean_row_normalises_values():
+    values = clean_row({'name': '  Widget ', 'price': '1,299.50', 'source': 'amazon', 'source_id': 42})
+    assert field(values, 'name') == 'Widget'
+    assert field(values, 'price') == Decimal('1299.50')
+    assert field(values, 'source_id') == '42'
+    assert field(values, 'brand') is None
+
+
+@pytest.mark.parametrize('row, message', [
+    ({'price': 10}, 'name is required'),
+    ({'name': ' '}, 'name is required'),
+    ({'name': 'Widget', 'price': 'cheap'}, 'invalid price'),
+    ({'name': 'Widget', 'price': -1}, 'invalid price'),
+    ({'name': 'Widget', 'price': 'NaN'}, 'invalid price'),
+    ({'name': 'Widget', 'source': 'amazon'}, 'source and source_id'),
+])
+def test_clean_row_rejects(row, message):
+    with pytest.raises(ValueError, match=message):
+        clean_row(row)
+
+
+def test_empty_price_is_null():
+    assert field(clean_row({'name': 'Widget', 'price': ''}), 'price') is None
+
+
+def test_dedupe_keeps_the_last_row_per_source_id():
+    loader = BulkLoader(None)
+    batch = [
+        (1, clean_row({'name': 'Old', 'source': 'amazon', 'source_id': '1'})),
+        (2, clean_row({'name': 'No source'})),
+        (3, clean_row({'name': 'New', 'source': 'amazon', 'source_id': '1'})),
+        (4, clean_row({'name': 'Other', 'source': 'ebay', 'source_id': '1'})),
+        (5, clean_row({'name': 'No source'})),
+    ]
+    assert [line_no for line_no, _ in loader._dedupe(batch)] == [2, 5, 3, 4]
+    assert loader.duplicates == 1
+
+
+def test_read_ndjson():
+    stream = io.BytesIO(b'{"name": "A"}\n\n[1]\n{broken\n{"name": "caf\xe9"}\n')
+    rows = list(read_ndjson(stream))
+    assert rows[0] == (1, {'name': 'A'})
+    assert rows[1] == (3, 'expected a JSON object')
+    assert rows[2][0] == 4 and rows[2][1].startswith('invalid JSON')
+    assert rows[3] == (5, 'invalid UTF-8')
+
+
+def test_read_csv():
+    stream = io.BytesIO(b'name,price,brand\nA,10,\n"Multi\nline",5,Acme\nB\xff,1,\n')
+    assert list(read_csv(stream)) == [
+        (2, {'name': 'A', 'price': '10'}),
+        (4, {'name': 'Multi\nline', 'price': '5', 'brand': 'Acme'}),
+        (5, 'invalid UTF-8')
+    ]
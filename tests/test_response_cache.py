@@ -0,0 +1,114 @@
+import pytest
+from flask import Flask, jsonify
+
+from response_cache import ResponseCache
+
+
+@pytest.fixture
+def app():
+    """Flask app with one cached view over a stubbed data version"""
+    app = Flask(__name__)
+    app.state = {'version': 1, 'calls': 0, 'value': 'a'}
+    cache = app.cache = ResponseCache(version_source=lambda: app.state['version'], version_check_interval=0)
+
+    @app.route('/items')
+    @cache.cached()
+    def items():
+        app.state['calls'] += 1
+        response = jsonify({'value': app.state['value']})
+        response.headers['X-Next-Cursor'] = 'abc'
+        return response
+
+    @app.route('/missing')
+    @cache.cached()
+    def missing():
+        app.state['calls'] += 1
+        return jsonify({'error': 'not found'}), 404
+
+    return app
+
+
+def test_repeated_requests_are_served_from_the_cache(app):
+    client = app.test_client()
+    first = client.get('/items')
+    second = client.get('/items')
+
+    assert first.status_code == second.status_code == 200
+    assert first.get_json() == second.get_json() == {'value': 'a'}
+    assert first.headers['ETag'] == second.headers['ETag']
+    assert second.headers['Cache-Control'] == 'no-cache'
+    assert second.headers['X-Next-Cursor'] == 'abc'
+    assert app.state['calls'] == 1
+    assert app.cache.stats()['hits'] == 1
+
+
+def test_matching_if_none_match_gets_a_304(app):
+    client = app.test_client()
+    etag = client.get('/items').headers['ETag']
+
+    response = client.get('/items', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.get_data() == b''
+    assert response.headers['ETag'] == etag
+    assert client.get('/items', headers={'If-None-Match': '"other"'}).status_code == 200
+    assert app.cache.stats()['not_modified'] == 1
+
+
+def test_query_strings_are_cached_separately(app):
+    client = app.test_client()
+    client.get('/items?page=1')
+    client.get('/items?page=2')
+    assert app.state['calls'] == 2
+
+
+def test_new_data_version_rebuilds_the_response(app):
+    client = app.test_client()
+    etag = client.get('/items').headers['ETag']
+
+    app.state['version'] = 2
+    app.state['value'] = 'b'
+    response = client.get('/items', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json() == {'value': 'b'}
+    assert response.headers['ETag'] != etag
+    assert app.state['calls'] == 2
+
+
+def test_unchanged_body_keeps_its_etag_across_versions(app):
+    client = app.test_client()
+    etag = client.get('/items').headers['ETag']
+
+    app.state['version'] = 2
+    assert client.get('/items', headers={'If-None-Match': etag}).status_code == 304
+    assert app.state['calls'] == 2
+
+
+def test_invalidate_drops_entries(app):
+    client = app.test_client()
+    client.get('/items')
+    app.cache.invalidate()
+    client.get('/items')
+    assert app.state['calls'] == 2
+    assert app.cache.stats()['version'] == [1, 1]
+
+
+def test_failing_version_source_falls_back_to_the_ttl(app):
+    client = app.test_client()
+    app.cache.version_source = lambda: 1 / 0
+    client.get('/items')
+    client.get('/items')
+    assert app.state['calls'] == 1
+
+    # Entries still expire
+    for entry in app.cache._entries.values():
+        entry.expires = 0
+    client.get('/items')
+    assert app.state['calls'] == 2
+
+
+def test_errors_are_not_cached(app):
+    client = app.test_client()
+    assert client.get('/missing').status_code == 404
+    assert client.get('/missing').status_code == 404
+    assert app.state['calls'] == 2
+    assert 'ETag' not in client.get('/missing').headers
@@ -0,0 +1,108 @@
+import pytest
+
+from review_ledger import ReviewLedger, review_hash, scan
+
+URL = 'https://shop.example/product/1/reviews'
+KEY = 'amazon:1'
+
+
+def review(number):
+    return {'reviewer_name': f"Reviewer {number}", 'review_text': f"Review number {number}"}
+
+
+def site(reviews, page_size=10):
+    """fetch_page over `reviews`, newest first; later changes to the list show up"""
+    def fetch_page(url):
+        page = int(url.rsplit('=', 1)[1]) if '=' in url else 1
+        start = (page - 1) * page_size
+        next_url = f"{URL}?page={page + 1}" if start + page_size < len(reviews) else None
+        return reviews[start:start + page_size], next_url
+    return fetch_page
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    return ReviewLedger(str(tmp_path))
+
+
+def run(ledger, fetch_page, max_reviews=20, max_pages=50, ack=True):
+    state = ledger.load(KEY)
+    new_reviews, summary = scan(fetch_page, URL, state, max_reviews, max_pages)
+    token = ledger.propose(KEY, state, new_reviews, summary)
+    if token and ack:
+        assert ledger.ack(KEY, token)
+    return new_reviews, summary, token
+
+
+def test_review_hash_ignores_case_and_whitespace():
+    assert review_hash({'reviewer_name': 'Ann', 'review_text': 'Great  product'}) == \
+        review_hash({'reviewer_name': 'ann ', 'review_text': 'great product', 'date': 'today'})
+    assert review_hash(review(1)) != review_hash(review(2))
+
+
+def test_truncated_runs_drain_the_backlog(ledger):
+    reviews = [review(number) for number in range(100, 0, -1)]
+    fetch_page = site(reviews)
+
+    returned = []
+    for _ in range(10):
+        new_reviews, summary, _ = run(ledger, fetch_page)
+        if not new_reviews:
+            break
+        returned.extend(new_reviews)
+    assert [item['review_text'] for item in returned] == [item['review_text'] for item in reviews]
+
+    state = ledger.load(KEY)
+    assert state['resume'] is None
+    assert state['high_water'] == review_hash(reviews[0])
+
+    # New reviews on top are found and the scan stops at the high-water mark
+    reviews[:0] = [review(number) for number in (103, 102, 101)]
+    new_reviews, summary, _ = run(ledger, fetch_page)
+    assert [item['review_text'] for item in new_reviews] == ['Review number 103', 'Review number 102', 'Review number 101']
+    assert summary['stopped'] == 'high_water'
+    assert summary['pages'] == 1
+
+
+def test_known_streak_ends_the_scan(ledger):
+    fetch_page = site([review(number) for number in range(30, 0, -1)])
+    run(ledger, fetch_page, max_reviews=100)
+
+    # Losing the high-water mark leaves the seen hashes to stop the scan
+    state = ledger.load(KEY)
+    state['high_water'] = None
+    new_reviews, summary = scan(fetch_page, URL, state, 100, 50, known_streak=5)
+    assert new_reviews == []
+    assert summary['stopped'] == 'known_streak'
+    assert summary['known_reviews'] == 5
+
+
+def test_pinned_review_does_not_stop_the_scan(ledger):
+    pinned = review(0)
+    reviews = [pinned] + [review(number) for number in range(10, 0, -1)]
+    fetch_page = site(reviews)
+    run(ledger, fetch_page)
+    assert ledger.load(KEY)['high_water'] == review_hash(pinned)
+
+    reviews.insert(1, review(11))
+    new_reviews, _, _ = run(ledger, fetch_page)
+    assert [item['review_text'] for item in new_reviews] == ['Review number 11']
+
+
+def test_unacknowledged_reviews_are_returned_again(ledger):
+    fetch_page = site([review(number) for number in range(5, 0, -1)])
+
+    first, _, first_token = run(ledger, fetch_page, ack=False)
+    again, _, second_token = run(ledger, fetch_page, ack=False)
+    assert len(first) == 5
+    assert [item['review_hash'] for item in again] == [item['review_hash'] for item in first]
+
+    # Only the latest proposal can be acknowledged, and acknowledging it twice is harmless
+    assert not ledger.ack(KEY, first_token)
+    assert ledger.ack(KEY, second_token)
+    assert ledger.ack(KEY, second_token)
+    assert not ledger.ack(KEY, first_token)
+
+    new_reviews, _, token = run(ledger, fetch_page)
+    assert new_reviews == []
+    assert token is None
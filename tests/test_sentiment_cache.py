@@ -0,0 +1,83 @@
+import pytest
+
+from sentiment_cache import SentimentCache, normalize_text, text_key
+
+RESULT = {'sentiment_score': 0.5, 'sentiment_label': 'positive', 'confidence': 0.5}
+
+
+@pytest.fixture
+def disk_path(tmp_path):
+    return str(tmp_path / 'sentiment.sqlite3')
+
+
+def test_normalized_copies_share_a_key():
+    assert normalize_text('  Great\tproduct \n\n really ') == 'Great product really'
+    # Composed and decomposed forms of the same character
+    assert text_key(normalize_text('caf\u00e9')) == text_key(normalize_text('cafe\u0301'))
+    assert normalize_text(None) == ''
+    # Case is kept: the scorers are case-sensitive
+    assert text_key(normalize_text('Good')) != text_key(normalize_text('good'))
+
+
+def test_hit_and_miss():
+    cache = SentimentCache()
+    assert cache.get('a') is None
+    cache.put('a', RESULT)
+    assert cache.get('a') == RESULT
+
+    stats = cache.stats()
+    assert (stats['misses'], stats['memory_hits'], stats['disk_entries']) == (1, 1, None)
+    assert stats['hit_rate'] == 0.5
+
+
+def test_lru_evicts_the_least_recently_used():
+    cache = SentimentCache(max_entries=2)
+    cache.put_many([('a', 1), ('b', 2)])
+    cache.get('a')
+    cache.put('c', 3)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert cache.stats()['evictions'] == 1
+
+
+def test_put_many_round_trips_through_the_disk_tier(disk_path):
+    items = [(f"key{i}", dict(RESULT, sentiment_score=i / 100)) for i in range(50)]
+    cache = SentimentCache(max_entries=10, disk_path=disk_path)
+    cache.put_many(items)
+    cache.put_many([])
+
+    assert cache.stats()['disk_entries'] == 50
+    # Evicted from memory, read back from SQLite
+    assert cache.get('key0') == items[0][1]
+    assert cache.stats()['disk_hits'] == 1
+    assert [cache.get(key) for key, _ in items] == [result for _, result in items]
+
+
+def test_entries_persist_across_instances(disk_path):
+    SentimentCache(disk_path=disk_path).put('a', RESULT)
+
+    cache = SentimentCache(disk_path=disk_path)
+    assert cache.get('a') == RESULT
+    assert cache.stats()['disk_hits'] == 1
+    # Now in memory as well
+    assert cache.get('a') == RESULT
+    assert cache.stats()['memory_hits'] == 1
+
+
+def test_put_replaces_an_entry(disk_path):
+    cache = SentimentCache(disk_path=disk_path)
+    cache.put('a', RESULT)
+    cache.put('a', dict(RESULT, sentiment_label='neutral'))
+    assert SentimentCache(disk_path=disk_path).get('a')['sentiment_label'] == 'neutral'
+
+
+def test_clear(disk_path):
+    cache = SentimentCache(disk_path=disk_path)
+    cache.put('a', RESULT)
+    cache.clear()
+
+    assert cache.get('a') is None
+    assert SentimentCache(disk_path=disk_path).get('a') is None
+    assert cache.stats()['disk_entries'] == 0
@@ -0,0 +1,124 @@
+import os
+import threading
+
+import pytest
+
+from transformer_sentiment import MicroBatcher, TransformerSentiment
+
+TEXTS = ['great product', 'the product is awful', 'good', 'bad bad bad', 'the', 'is it good or bad']
+VOCAB = ['[PAD]', '[UNK]', '[CLS]', '[SEP]', '[MASK]', 'great', 'good', 'bad', 'awful', 'product', 'the', 'is', 'it', 'or']
+
+
+@pytest.fixture(scope='module')
+def tiny_model(tmp_path_factory):
+    """Builds small random BERT classifiers in a local directory, no download needed"""
+    torch = pytest.importorskip('torch')
+    transformers = pytest.importorskip('transformers')
+
+    def build(labels, bias=None):
+        directory = str(tmp_path_factory.mktemp('model'))
+        vocab = os.path.join(directory, 'vocab.txt')
+        with open(vocab, 'w') as f:
+            f.write('\n'.join(VOCAB) + '\n')
+        transformers.BertTokenizer(vocab).save_pretrained(directory)
+
+        torch.manual_seed(0)
+        config = transformers.BertConfig(
+            vocab_size=len(VOCAB), hidden_size=16, num_hidden_layers=1, num_attention_heads=2,
+            intermediate_size=32, max_position_embeddings=64, initializer_range=0.5,
+            id2label=dict(enumerate(labels)), label2id={label: i for i, label in enumerate(labels)}
+        )
+        model = transformers.BertForSequenceClassification(config)
+        if bias is not None:
+            with torch.no_grad():
+                model.classifier.weight.zero_()
+                model.classifier.bias.copy_(torch.tensor(bias, dtype=torch.float))
+        model.save_pretrained(directory)
+        return directory
+
+    return build
+
+
+@pytest.mark.parametrize('labels, bias, expected', [
+    (['NEGATIVE', 'POSITIVE'], [-3, 3], 'positive'),
+    (['POSITIVE', 'NEGATIVE'], [-3, 3], 'negative'),
+    # Unnamed labels: the last class is positive
+    (['LABEL_0', 'LABEL_1'], [-3, 3], 'positive'),
+    (['negative', 'neutral', 'positive'], [0, 6, 0], 'neutral'),
+])
+def test_label_mapping(tiny_model, labels, bias, expected):
+    engine = TransformerSentiment(tiny_model(labels, bias))
+    results = engine.predict(TEXTS[:2])
+    assert [result['sentiment_label'] for result in results] == [expected, expected]
+    assert results[0]['confidence'] == pytest.approx(abs(results[0]['sentiment_score']), abs=0.01)
+
+
+def test_batches_keep_the_order_of_their_texts(tiny_model):
+    engine = TransformerSentiment(tiny_model(['NEGATIVE', 'POSITIVE']))
+    one_by_one = [engine.predict([text])[0]['confidence'] for text in TEXTS]
+    assert len({round(confidence, 4) for confidence in one_by_one}) > 1
+
+    # Padding the shorter texts of a batch does not change their scores
+    batched = [result['confidence'] for result in engine.predict(TEXTS)]
+    assert batched == pytest.approx(one_by_one, abs=1e-4)
+
+    batcher = MicroBatcher(engine.predict, max_batch_size=4, max_wait_ms=100)
+    futures = [batcher.submit(text) for text in TEXTS]
+    assert [future.result(timeout=30)['confidence'] for future in futures] == pytest.approx(one_by_one, abs=1e-4)
+    assert batcher.stats()['batches'] == 2
+
+
+def test_quantized_model(tiny_model):
+    torch = pytest.importorskip('torch')
+    directory = tiny_model(['NEGATIVE', 'POSITIVE'], [-1, 1])
+    engine = TransformerSentiment(directory, quantize=True, num_threads=1)
+
+    assert isinstance(engine.model.classifier, torch.ao.nn.quantized.dynamic.Linear)
+    assert torch.get_num_threads() == 1
+    expected = TransformerSentiment(directory).predict(TEXTS)
+    results = engine.predict(TEXTS)
+    assert [result['sentiment_label'] for result in results] == [result['sentiment_label'] for result in expected]
+    assert [result['confidence'] for result in results] == pytest.approx(
+        [result['confidence'] for result in expected], abs=0.05)
+
+
+def test_microbatcher_groups_concurrent_texts():
+    batches = []
+
+    def predict(texts):
+        batches.append(list(texts))
+        return [text.upper() for text in texts]
+
+    batcher = MicroBatcher(predict, max_batch_size=4, max_wait_ms=200)
+    futures = [batcher.submit(text) for text in ['a', 'b', 'c', 'd', 'e']]
+
+    assert [future.result(timeout=5) for future in futures] == ['A', 'B', 'C', 'D', 'E']
+    assert batches == [['a', 'b', 'c', 'd'], ['e']]
+    assert batcher.stats()['items'] == 5
+
+
+def test_microbatcher_fails_the_whole_batch():
+    def predict(texts):
+        raise ValueError('model failed')
+
+    batcher = MicroBatcher(predict, max_wait_ms=1)
+    with pytest.raises(ValueError):
+        batcher.submit('text').result(timeout=5)
+
+
+def test_microbatcher_result_times_out_behind_a_slow_batch():
+    release = threading.Event()
+
+    def predict(texts):
+        release.wait(5)
+        return ['done'] * len(texts)
+
+    batcher = MicroBatcher(predict, max_batch_size=1, max_wait_ms=1)
+    first = batcher.submit('slow')
+    queued = batcher.submit('waiting')
+    with pytest.raises(TimeoutError):
+        queued.result(timeout=0.2)
+
+    release.set()
+    assert first.result(timeout=5) == 'done'
+    assert queued.result(timeout=5) == 'done'
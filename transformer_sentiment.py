@@ -0,0 +1,130 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+# Same thresholds as the lexicon scorer in ml_service
+POSITIVE_THRESHOLD = 0.1
+NEGATIVE_THRESHOLD = -0.1
+
+
+class TransformerSentiment:
+    """CPU-only sequence-classification sentiment model.
+
+    `model_name` may be a Hugging Face model id or a local directory. With
+    `quantize=True` the Linear layers are converted to int8 with dynamic
+    quantization, which is usually 2-3x faster on CPU.
+    """
+
+    def __init__(self, model_name, num_threads=None, quantize=False, max_length=256):
+        import torch
+        from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+        self.torch = torch
+        self.model_name = model_name
+        self.quantize = quantize
+        self.max_length = max_length
+        self.num_threads = num_threads or max(1, min(4, os.cpu_count() or 1))
+
+        # Bound intra-op threads so several workers don't oversubscribe the CPU
+        torch.set_num_threads(self.num_threads)
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModelForSequenceClassification.from_pretrained(model_name)
+        model.eval()
+        if quantize:
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.model = model
+
+        labels = {i: str(label).lower() for i, label in model.config.id2label.items()}
+        self.positive_ids = [i for i, label in labels.items() if label.startswith('pos')]
+        self.negative_ids = [i for i, label in labels.items() if label.startswith('neg')]
+        if not self.positive_ids and not self.negative_ids:
+            # Unnamed labels: treat the last class as positive, the first as negative
+            self.negative_ids, self.positive_ids = [0], [len(labels) - 1]
+
+    def predict(self, texts):
+        with self.torch.inference_mode():
+            encoded = self.tokenizer(
+                list(texts),
+                padding=True,
+                truncation=True,
+                max_length=self.max_length,
+                return_tensors='pt'
+            )
+            probs = self.torch.softmax(self.model(**encoded).logits, dim=-1)
+
+        scores = probs[:, self.positive_ids].sum(dim=-1) - probs[:, self.negative_ids].sum(dim=-1)
+        return [self._result(float(score)) for score in scores]
+
+    @staticmethod
+    def _result(score):
+        if score > POSITIVE_THRESHOLD:
+            sentiment = 'positive'
+        elif score < NEGATIVE_THRESHOLD:
+            sentiment = 'negative'
+        else:
+            sentiment = 'neutral'
+        return {
+            'sentiment_score': round(score, 2),
+            'sentiment_label': sentiment,
+            'confidence': abs(score)
+        }
+
+
+class MicroBatcher:
+    """Collects concurrent single-text requests into batches for one model.
+
+    A batch is run once `max_batch_size` texts are waiting or `max_wait_ms`
+    has passed since the first one arrived, whichever comes first.
+    """
+
+    def __init__(self, predict, max_batch_size=32, max_wait_ms=10):
+        self.predict = predict
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self.batches = 0
+        self.items = 0
+        self._worker = threading.Thread(target=self._run, name='sentiment-microbatcher', daemon=True)
+        self._worker.start()
+
+    def submit(self, text):
+        future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def _run(self):
+        while True:
+            pending = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(pending) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    pending.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                results = self.predict([text for text, _ in pending])
+                for (_, future), result in zip(pending, results):
+                    future.set_result(result)
+            except Exception as e:
+                for _, future in pending:
+                    future.set_exception(e)
+
+            self.batches += 1
+            self.items += len(pending)
+
+    def stats(self):
+        return {
+            'batches': self.batches,
+            'items': self.items,
+            'avg_batch_size': round(self.items / self.batches, 2) if self.batches else 0,
+            'queued': self._queue.qsize(),
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000
+        }